@@ -3,6 +3,8 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+部署：gunicorn asgi:application -k uvicorn.workers.UvicornWorker（deploy_gunicorn.sh 中 SERVER_MODE=asgi）
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,6 +13,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+# 通过 ASGI 启动时轮询接口使用 async 视图（见 settings.ASYNC_POLLING_VIEWS）
+os.environ.setdefault('MES_SERVER_MODE', 'asgi')
 
 application = get_asgi_application()
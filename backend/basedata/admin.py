@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MaterialType,ProductCategory, CategoryParam, Product, ProductParamValue, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Company, Material, Unit, CategoryMaterialRule, CategoryMaterialRuleParam, ProductCategoryProcessCode
+from .models import ImportJob, MediaFileIndex, StoredBlob, MaterialType,ProductCategory, CategoryParam, Product, ProductParamValue, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Company, Material, Unit, CategoryMaterialRule, CategoryMaterialRuleParam, ProductCategoryProcessCode
 
 @admin.register(ProductCategory)
 class ProductCategoryAdmin(admin.ModelAdmin):
@@ -92,3 +92,21 @@ class CategoryMaterialRuleParamAdmin(admin.ModelAdmin):
 class MaterialTypeAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "code", "description")
     search_fields = ("name", "code")
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "original_name", "status", "processed_rows", "total_rows", "fail_count", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    search_fields = ("original_name",)
+
+@admin.register(MediaFileIndex)
+class MediaFileIndexAdmin(admin.ModelAdmin):
+    list_display = ("name", "exists", "size", "modified_at", "checked_at")
+    list_filter = ("exists",)
+    search_fields = ("name",)
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ("original_name", "name", "size", "refcount", "created_at", "updated_at")
+    search_fields = ("original_name", "sha256")
+    readonly_fields = ("sha256", "name", "size", "refcount")
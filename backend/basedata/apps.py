@@ -4,3 +4,11 @@ class BaseDataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'basedata'
     verbose_name = '基础数据'
+
+    def ready(self):
+        from .blob_storage import connect_blob_signals
+        from .import_jobs import start_workers_on_startup
+        from .reference_cache import connect_reference_cache_signals
+        connect_blob_signals()
+        connect_reference_cache_signals()
+        start_workers_on_startup()
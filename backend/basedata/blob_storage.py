@@ -0,0 +1,254 @@
+"""
+图纸/工艺PDF的内容寻址存储
+
+产品类图纸/工艺PDF、产品图纸、工艺流程代码PDF按内容 SHA-256 只存一份：
+- 文件保存在 blobs/<哈希前两位>/<哈希>.pdf，同样内容重复上传直接复用已有文件，不再产生 _随机后缀 / -时间戳 副本；
+- StoredBlob 记录每个文件的哈希、大小、首次上传时的文件名和被引用次数，可读文件名只保存在数据库中；
+- 引用次数随上述模型保存/删除自动增减（见 connect_blob_signals），引用为 0 且超过保留期的文件由
+  purge_unreferenced_blobs 删除；旧的 drawings/、process_pdfs/ 文件用 migrate_pdf_blobs 命令迁移。
+"""
+import datetime
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, FileField
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'blobs'
+BLOB_NAME_RE = re.compile(r'^blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.\w+)?$')
+# 引用为 0 的文件至少保留的时间（秒），避免删除刚上传、尚未保存到模型的文件
+BLOB_PURGE_GRACE_SECONDS = 3600
+
+
+def is_blob_name(name):
+    return bool(name and BLOB_NAME_RE.match(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """按内容哈希去重的文件系统存储；delete 不删除文件，文件的生命周期由引用次数管理"""
+
+    def get_available_name(self, name, max_length=None):
+        # 文件名由内容哈希决定，不需要为重名文件追加随机后缀
+        return name
+
+    def _save(self, name, content):
+        from .models import StoredBlob
+
+        tmp_dir = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            # 先刷新时间再检查文件：purge_unreferenced_blobs 加锁复查时跳过刚刷新的记录；
+            # 正在被删除的记录要等删除提交后才能更新，此时更新不到，按新文件重新写入
+            blob = None
+            if StoredBlob.objects.filter(sha256=sha256).update(updated_at=timezone.now()):
+                blob = StoredBlob.objects.filter(sha256=sha256).first()
+            blob_name = blob.name if blob else f'{BLOB_DIR}/{sha256[:2]}/{sha256}{os.path.splitext(name)[1].lower()}'
+            target = self.path(blob_name)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+                tmp_path = None
+                if self.file_permissions_mode is not None:
+                    os.chmod(target, self.file_permissions_mode)
+            else:
+                # 已有文件可能是事务回滚后留下的无记录文件，刷新修改时间，避免被当作孤儿文件清理
+                os.utime(target)
+        finally:
+            if tmp_path:
+                os.remove(tmp_path)
+
+        if blob is None:
+            # 外层事务回滚时记录随之撤销而文件留下，由 purge_unreferenced_blobs 按无记录文件清理
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(sha256=sha256, name=blob_name, size=size,
+                                              original_name=os.path.basename(name))
+            except IntegrityError:
+                # 并发上传了相同内容
+                pass
+        try:
+            from .media_index import record_media_files
+            record_media_files([blob_name])
+        except DatabaseError as e:
+            logger.warning(f"更新媒体文件索引失败: {blob_name}, {e}")
+        return blob_name
+
+    def delete(self, name):
+        if is_blob_name(name):
+            # 同一文件可能被多条记录引用，引用为 0 后由 purge_unreferenced_blobs 删除
+            return
+        # 迁移前的旧文件按普通文件删除
+        super().delete(name)
+        try:
+            from .media_index import _upsert
+            _upsert({name: {'exists': False, 'size': None, 'modified_at': None}})
+        except DatabaseError as e:
+            logger.warning(f"更新媒体文件索引失败: {name}, {e}")
+
+
+pdf_blob_storage = ContentAddressedStorage()
+
+
+def get_pdf_storage():
+    """供 FileField(storage=...) 使用"""
+    return pdf_blob_storage
+
+
+def blob_fields(model):
+    """模型中使用内容寻址存储的文件字段名"""
+    return [f.name for f in model._meta.fields
+            if isinstance(f, FileField) and isinstance(f.storage, ContentAddressedStorage)]
+
+
+def referencing_models():
+    """引用内容寻址文件的模型及字段 [(model, [field, ...])]（不含代理模型）"""
+    from django.apps import apps
+    result = []
+    for model in apps.get_models():
+        if model._meta.proxy:
+            continue
+        fields = blob_fields(model)
+        if fields:
+            result.append((model, fields))
+    return result
+
+
+def _adjust_refcounts(deltas):
+    from .models import StoredBlob
+    now = timezone.now()
+    for name, delta in deltas.items():
+        if delta and is_blob_name(name):
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + delta, updated_at=now)
+
+
+def _remember_blob_names(sender, instance, raw=False, **kwargs):
+    instance._blob_previous = {}
+    if instance.pk and not raw:
+        fields = blob_fields(sender)
+        instance._blob_previous = sender._base_manager.filter(pk=instance.pk).values(*fields).first() or {}
+
+
+def _update_refcounts_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_blob_previous', {})
+    deltas = {}
+    for field in blob_fields(sender):
+        old, new = previous.get(field) or '', getattr(instance, field).name or ''
+        if old != new:
+            deltas[old] = deltas.get(old, 0) - 1
+            deltas[new] = deltas.get(new, 0) + 1
+    _adjust_refcounts(deltas)
+    instance._blob_previous = {}
+
+
+def _update_refcounts_on_delete(sender, instance, **kwargs):
+    deltas = {}
+    for field in blob_fields(sender):
+        name = getattr(instance, field).name or ''
+        deltas[name] = deltas.get(name, 0) - 1
+    _adjust_refcounts(deltas)
+
+
+def connect_blob_signals():
+    """为引用内容寻址文件的模型（含代理模型）连接引用计数信号，在 AppConfig.ready 中调用"""
+    from django.apps import apps
+    for model in apps.get_models():
+        if blob_fields(model):
+            uid = f'blob_refcount_{model._meta.label_lower}'
+            pre_save.connect(_remember_blob_names, sender=model, dispatch_uid=f'{uid}_pre_save')
+            post_save.connect(_update_refcounts_on_save, sender=model, dispatch_uid=f'{uid}_post_save')
+            post_delete.connect(_update_refcounts_on_delete, sender=model, dispatch_uid=f'{uid}_post_delete')
+
+
+def recount_blob_references():
+    """按各模型当前引用重新计算引用次数，返回修正的文件数"""
+    from .models import StoredBlob
+    counts = {}
+    for model, fields in referencing_models():
+        for field in fields:
+            for name in model._base_manager.filter(**{f'{field}__startswith': f'{BLOB_DIR}/'}).values_list(field, flat=True):
+                counts[name] = counts.get(name, 0) + 1
+    fixed = 0
+    for pk, name, refcount in StoredBlob.objects.values_list('pk', 'name', 'refcount'):
+        if refcount != counts.get(name, 0):
+            StoredBlob.objects.filter(pk=pk).update(refcount=counts.get(name, 0))
+            fixed += 1
+    return fixed
+
+
+def _unrecorded_blob_files(cutoff):
+    """blobs/ 下没有 StoredBlob 记录且修改时间早于 cutoff 的文件（外层事务回滚、上传中断留下的文件）"""
+    from .models import StoredBlob
+    root = pdf_blob_storage.path(BLOB_DIR)
+    # 先取记录再扫描目录：扫描期间新写入的文件修改时间晚于 cutoff，不会被误判
+    recorded = set(StoredBlob.objects.values_list('name', flat=True))
+    names = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            name = f"{BLOB_DIR}/{os.path.relpath(path, root).replace(os.sep, '/')}"
+            try:
+                if name not in recorded and os.stat(path).st_mtime < cutoff.timestamp():
+                    names.append(name)
+            except FileNotFoundError:
+                continue
+    return sorted(names)
+
+
+def purge_unreferenced_blobs(grace_seconds=BLOB_PURGE_GRACE_SECONDS, dry_run=False):
+    """
+    删除引用为 0 且超过保留期的文件及其记录，以及超过保留期、没有记录的文件
+    :return: 删除（dry_run 时为将删除）的文件名列表
+    """
+    from .models import StoredBlob
+    cutoff = timezone.now() - datetime.timedelta(seconds=grace_seconds)
+    candidates = StoredBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff)
+    if dry_run:
+        return list(candidates.values_list('name', flat=True)) + _unrecorded_blob_files(cutoff)
+    purged = []
+    for pk in list(candidates.values_list('pk', flat=True)):
+        with transaction.atomic():
+            # 加锁后复查，期间可能被重新引用
+            blob = StoredBlob.objects.select_for_update().filter(pk=pk, refcount__lte=0, updated_at__lt=cutoff).first()
+            if blob is None:
+                continue
+            try:
+                os.remove(pdf_blob_storage.path(blob.name))
+            except FileNotFoundError:
+                pass
+            blob.delete()
+            purged.append(blob.name)
+    for name in _unrecorded_blob_files(cutoff):
+        path = pdf_blob_storage.path(name)
+        try:
+            # 删除前复查：期间被新上传复用的文件已刷新修改时间
+            if os.stat(path).st_mtime < cutoff.timestamp() and not StoredBlob.objects.filter(name=name).exists():
+                os.remove(path)
+                purged.append(name)
+        except FileNotFoundError:
+            continue
+    if purged:
+        try:
+            from .media_index import _upsert
+            _upsert({name: {'exists': False, 'size': None, 'modified_at': None} for name in purged})
+        except DatabaseError as e:
+            logger.warning(f"更新媒体文件索引失败: {e}")
+    return purged
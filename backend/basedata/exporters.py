@@ -0,0 +1,228 @@
+"""
+流式 Excel 导出
+
+与 importers 对应，各 export_* 输出的列与同类型导入文件一致，导出的文件可以直接修改后重新导入。
+使用 openpyxl 写入模式（Workbook(write_only=True)）逐行写入，行数据用 keyset_chunks 按排序键分页读取
+（values_list，不构造模型实例），关联数据每页一次批量查询，内存占用与总行数无关；
+生成的 xlsx 暂存在临时文件中，通过 StreamingHttpResponse 分块返回。
+"""
+import datetime
+import logging
+import tempfile
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from openpyxl import Workbook
+
+from .models import BOMItem, CategoryParam, ProductParamValue
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# 每次从数据库读取的行数
+EXPORT_CHUNK_SIZE = 2000
+# 响应分块大小（字节）
+EXPORT_STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class ExportSheet:
+    """
+    一个导出的工作表
+    :param title: 工作表名称
+    :param columns: 表头，与导入文件的列名一致
+    :param rows: 行的可迭代对象（惰性生成）
+    :param widths: 列宽，可选
+    """
+
+    def __init__(self, title, columns, rows, widths=None):
+        self.title = title
+        self.columns = columns
+        self.rows = rows
+        self.widths = widths or {}
+
+
+def _cell(value):
+    # openpyxl 不支持带时区的时间
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def write_workbook(sheets, output):
+    """把工作表逐行写入 output（文件对象），返回写入的总行数"""
+    wb = Workbook(write_only=True)
+    total = 0
+    for sheet in sheets:
+        ws = wb.create_sheet(sheet.title)
+        # 写入模式下列宽必须在写入第一行之前设置
+        for column, width in sheet.widths.items():
+            ws.column_dimensions[column].width = width
+        ws.append(sheet.columns)
+        for row in sheet.rows:
+            ws.append([_cell(value) for value in row])
+            total += 1
+    wb.save(output)
+    return total
+
+
+def _build(sheets, filename, output):
+    started = time.monotonic()
+    total = write_workbook(sheets, output)
+    logger.info(f"导出{filename}: {total}行, 耗时{time.monotonic() - started:.2f}秒")
+    output.seek(0)
+
+
+def _stream(sheets, filename):
+    with tempfile.TemporaryFile() as output:
+        _build(sheets, filename, output)
+        while block := output.read(EXPORT_STREAM_BLOCK_SIZE):
+            yield block
+
+
+async def _async_stream(sheets, filename):
+    # ASGI 下同步迭代器会被整体读入内存，改为在线程中生成、分块读取
+    with tempfile.TemporaryFile() as output:
+        await sync_to_async(_build)(sheets, filename, output)
+        read = sync_to_async(output.read, thread_sensitive=False)
+        while block := await read(EXPORT_STREAM_BLOCK_SIZE):
+            yield block
+
+
+def xlsx_response(sheets, filename):
+    """
+    流式返回 xlsx，工作簿在开始读取响应体时才生成
+    :param sheets: ExportSheet 列表
+    :param filename: 下载文件名（可以是中文）
+    """
+    stream = _async_stream if settings.ASYNC_POLLING_VIEWS else _stream
+    response = StreamingHttpResponse(stream(sheets, filename), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def keyset_chunks(queryset, keys, size=EXPORT_CHUNK_SIZE):
+    """
+    按排序键分页读取 values_list 行，每页一条查询
+    MySQL 驱动会把整个结果集读入客户端，iterator() 不能限制内存，这里按上一页最后一行的键值继续查询
+    :param queryset: values_list 查询集，前 len(keys) 列依次为排序键的值
+    :param keys: 排序字段，组合起来必须唯一，'-' 前缀表示降序
+    """
+    names = [key.lstrip('-') for key in keys]
+    queryset = queryset.order_by(*keys)
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            condition = Q()
+            for i, key in enumerate(keys):
+                lookup = 'lt' if key.startswith('-') else 'gt'
+                condition |= Q(**dict(zip(names[:i], last[:i])), **{f'{names[i]}__{lookup}': last[i]})
+            page = page.filter(condition)
+        chunk = list(page[:size])
+        if chunk:
+            yield chunk
+        if len(chunk) < size:
+            return
+        last = chunk[-1][:len(keys)]
+
+
+def export_category_params(categories):
+    """产品类及其参数项（一行一个产品类，参数项用逗号拼接）"""
+    categories = categories.prefetch_related(
+        Prefetch('params', queryset=CategoryParam.objects.order_by('name'))
+    ).order_by('code')
+
+    def rows():
+        for category in categories.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield [f"{category.code} - {category.display_name}", ', '.join(p.name for p in category.params.all())]
+
+    return ExportSheet('产品类参数', ['产品类', '参数项'], rows(), widths={'A': 30, 'B': 80})
+
+
+def _param_values(product_ids):
+    """
+    一次查询取出一批产品的参数值：{产品ID: [(参数项, 参数值), ...]}
+    按写入顺序排列，与导入文件中参数项的顺序一致（产品代码按该顺序拼接）
+    """
+    values = defaultdict(list)
+    for product_id, name, value in (ProductParamValue.objects.filter(product_id__in=product_ids)
+                                    .order_by('id').values_list('product_id', 'param__name', 'value')):
+        values[product_id].append((name, value))
+    return values
+
+
+def _product_chunks(products):
+    fields = ('code', 'id', 'name', 'category__code', 'price', 'unit__code')
+    for chunk in keyset_chunks(products.values_list(*fields), ['code']):
+        yield chunk, _param_values([row[1] for row in chunk])
+
+
+def export_products(products):
+    """产品，列与 import_products 一致：参数项/参数值用逗号拼接"""
+    def rows():
+        for chunk, values in _product_chunks(products):
+            for code, product_id, name, category_code, price, unit_code in chunk:
+                params = values.get(product_id, [])
+                yield [
+                    code,
+                    name,
+                    category_code,
+                    ','.join(item for item, _ in params),
+                    ','.join(value for _, value in params),
+                    price,
+                    unit_code,
+                ]
+
+    columns = ['code', 'name', 'category_code', 'param_items', 'param_values', 'price', 'unit_code']
+    return ExportSheet('产品', columns, rows(), widths={'A': 30, 'B': 30, 'D': 40, 'E': 40})
+
+
+def export_materials(materials):
+    """物料，列与 import_materials 一致：固定列之后每个参数项一列"""
+    fixed = ['code', 'name', 'price', 'category_code', 'unit_code']
+    param_names = [
+        name for name in CategoryParam.objects.filter(category__product__in=materials)
+        .order_by('name').values_list('name', flat=True).distinct()
+        if name not in fixed
+    ]
+
+    def rows():
+        for chunk, values in _product_chunks(materials):
+            for code, material_id, name, category_code, price, unit_code in chunk:
+                params = dict(values.get(material_id, []))
+                yield [code, name, price, category_code, unit_code, *(params.get(p) for p in param_names)]
+
+    return ExportSheet('物料', fixed + param_names, rows(), widths={'A': 30, 'B': 30})
+
+
+def export_boms(boms):
+    """BOM，列与 import_boms 一致：每个明细一行，按 产品代码/BOM名称/版本 分组"""
+    items = BOMItem.objects.filter(bom__in=boms).values_list(
+        'bom__product__code', 'bom__name', 'bom__version', 'id', 'material__code', 'quantity', 'remark',
+    )
+
+    def rows():
+        for chunk in keyset_chunks(items, ['bom__product__code', 'bom__name', 'bom__version', 'id']):
+            for product_code, name, version, _, material_code, quantity, remark in chunk:
+                yield [product_code, name, version, material_code, quantity, remark]
+
+    columns = ['product_code', 'name', 'version', 'material_code', 'quantity', 'remark']
+    return ExportSheet('BOM', columns, rows(), widths={'A': 30, 'B': 20, 'D': 30})
+
+
+def export_process_details(details):
+    """工艺流程明细，列与 import_process_details 一致（version 列仅供参考，导入时按代码匹配）"""
+    fields = ('process_code__code', 'process_code__version', 'step_no', 'step__name', 'machine_time', 'labor_time', 'process_content')
+
+    def rows():
+        for chunk in keyset_chunks(details.values_list(*fields), list(fields[:3])):
+            yield from chunk
+
+    columns = ['process_code', 'version', 'step_no', 'step', 'machine_time', 'labor_time', 'process_content']
+    return ExportSheet('工艺流程明细', columns, rows(), widths={'A': 30, 'G': 60})
@@ -0,0 +1,221 @@
+"""
+媒体文件垃圾回收
+
+一次遍历完成，耗时与文件数、引用记录数成线性关系：
+1. 遍历所有模型的全部 FileField，把被引用的文件路径收集到一个集合；
+2. 扫描各上传目录，未被引用的文件即孤儿文件；
+3. 孤儿文件中的时间戳备份（xxx-<数字>.pdf）按基础文件名分组到字典，每组默认保留最新一个，其余孤儿文件删除
+   （keep_unrecognized 时只删除备份和 _随机后缀 文件）；
+4. 分批删除并更新媒体文件索引；dry_run 时只生成报告。
+内容寻址存储（blobs/）按引用次数回收，不在扫描范围内，最后调用 purge_unreferenced_blobs 一并清理。
+管理命令 gc_media_files 与后台任务（ImportJob kind=file_gc）都调用 collect_garbage。
+"""
+import logging
+import os
+import re
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import FileField
+
+from .blob_storage import BLOB_DIR, BLOB_PURGE_GRACE_SECONDS, purge_unreferenced_blobs
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH_SIZE = 1000
+# 最近修改的文件可能是正在上传、尚未保存到模型的文件，默认不删除
+GC_MIN_AGE_SECONDS = 3600
+# 报告中列出的文件数上限
+GC_REPORT_LIMIT = 200
+
+BACKUP_RE = re.compile(r'^(.+)-\d+\.pdf$')
+RANDOM_SUFFIX_RE = re.compile(r'^(.+)_[a-zA-Z0-9]{7,}\.pdf$')
+
+
+def _file_fields():
+    """[(model, [FileField 名, ...])]，不含代理模型"""
+    result = []
+    for model in apps.get_models():
+        if model._meta.proxy:
+            continue
+        fields = [f for f in model._meta.fields if isinstance(f, FileField)]
+        if fields:
+            result.append((model, fields))
+    return result
+
+
+def upload_directories():
+    """所有 FileField 的上传目录（upload_to 的第一级目录），不含内容寻址存储目录"""
+    directories = set()
+    for _, fields in _file_fields():
+        for field in fields:
+            upload_to = field.upload_to if isinstance(field.upload_to, str) else ''
+            top = upload_to.strip('/').split('/')[0]
+            if top and top != BLOB_DIR:
+                directories.add(top)
+    return sorted(directories)
+
+
+def validate_directories(directories):
+    """
+    校验要扫描的目录：只允许 upload_directories() 中的上传目录（参数可能来自接口请求）
+    :return: 规范化后的目录列表，未指定时为全部上传目录
+    :raises ValueError: 目录不是上传目录，或解析后不在 MEDIA_ROOT 下
+    """
+    allowed = upload_directories()
+    if not directories:
+        return allowed
+    if isinstance(directories, str):
+        directories = [directories]
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    result = []
+    for directory in directories:
+        name = str(directory).strip().strip('/')
+        if name not in allowed:
+            raise ValueError(f'不允许清理的目录: {directory}（可选: {", ".join(allowed)}）')
+        # 上传目录本身可能是指向 MEDIA_ROOT 之外的符号链接
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) != root or path == root:
+            raise ValueError(f'目录不在媒体目录下: {directory}')
+        result.append(name)
+    return result
+
+
+def referenced_files():
+    """所有模型 FileField 引用的文件路径集合，每个模型一条查询"""
+    referenced = set()
+    for model, fields in _file_fields():
+        names = [f.name for f in fields]
+        for row in model._base_manager.values_list(*names).iterator(chunk_size=GC_BATCH_SIZE):
+            referenced.update(name for name in row if name)
+    return referenced
+
+
+def _scan(directories):
+    """扫描目录，返回 {相对路径: (修改时间, 大小)}"""
+    root = settings.MEDIA_ROOT
+    files = {}
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files[os.path.relpath(path, root).replace(os.sep, '/')] = (st.st_mtime, st.st_size)
+    return files
+
+
+def plan_garbage(directories=None, min_age=GC_MIN_AGE_SECONDS, keep_latest_backup=True, keep_unrecognized=False):
+    """
+    找出可删除的孤儿文件
+    :param keep_unrecognized: 只删除备份（-时间戳）和随机后缀（_xxxxxxx）文件，其他孤儿文件保留
+    :return: (待删除 [(路径, 大小)], 保留的孤儿文件 [路径], 扫描文件数, 被引用文件数)
+    :raises ValueError: 目录不合法，见 validate_directories
+    """
+    directories = validate_directories(directories)
+    referenced = referenced_files()
+    files = _scan(directories)
+    cutoff = time.time() - min_age
+
+    orphans = []
+    retained = []
+    backups = {}
+    for name, (mtime, size) in files.items():
+        if name in referenced or mtime > cutoff:
+            continue
+        directory, filename = os.path.split(name)
+        match = BACKUP_RE.match(filename)
+        random_suffix = RANDOM_SUFFIX_RE.match(filename)
+        if keep_latest_backup and match and not random_suffix:
+            backups.setdefault((directory, match.group(1)), []).append((filename, name, size))
+        elif keep_unrecognized and not match and not random_suffix:
+            retained.append(name)
+        else:
+            orphans.append((name, size))
+
+    for group in backups.values():
+        # 文件名中的时间戳越大越新，每组保留最新的一个
+        latest = max(group)
+        retained.append(latest[1])
+        orphans.extend((name, size) for filename, name, size in group if filename != latest[0])
+    orphans.sort()
+    return orphans, sorted(retained), len(files), len(referenced)
+
+
+def _mark_missing(names):
+    from .media_index import _upsert
+    try:
+        _upsert({name: {'exists': False, 'size': None, 'modified_at': None} for name in names})
+    except DatabaseError as e:
+        logger.warning(f"更新媒体文件索引失败: {e}")
+
+
+def collect_garbage(directories=None, dry_run=True, min_age=GC_MIN_AGE_SECONDS, keep_latest_backup=True,
+                    keep_unrecognized=False, purge_blobs=True, progress=None):
+    """
+    删除未被任何记录引用的媒体文件
+    :param directories: 相对 MEDIA_ROOT 的目录列表，只能是 FileField 的上传目录，默认全部
+    :param progress: 进度回调 progress(已处理, 总数, 失败信息列表)，后台任务用于写回进度
+    :return: 报告字典
+    """
+    started = time.monotonic()
+    # 内容寻址存储只按引用次数回收
+    directories = validate_directories(directories)
+    orphans, retained, scanned, referenced = plan_garbage(directories, min_age, keep_latest_backup, keep_unrecognized)
+
+    deleted = []
+    failures = []
+    if not dry_run:
+        for start in range(0, len(orphans), GC_BATCH_SIZE):
+            batch_deleted = []
+            for name, size in orphans[start:start + GC_BATCH_SIZE]:
+                try:
+                    os.remove(os.path.join(settings.MEDIA_ROOT, name))
+                    batch_deleted.append((name, size))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    failures.append(f'{name}: {e}')
+            _mark_missing([name for name, _ in batch_deleted])
+            deleted.extend(batch_deleted)
+            if progress is not None:
+                progress(min(start + GC_BATCH_SIZE, len(orphans)), len(orphans), failures)
+    else:
+        deleted = orphans
+
+    blobs = []
+    if purge_blobs:
+        blobs = purge_unreferenced_blobs(BLOB_PURGE_GRACE_SECONDS, dry_run=dry_run)
+
+    return {
+        'dry_run': dry_run,
+        'directories': directories,
+        'scanned_files': scanned,
+        'referenced_files': referenced,
+        'deleted_count': len(deleted),
+        'deleted_bytes': sum(size for _, size in deleted),
+        'deleted_files': [name for name, _ in deleted[:GC_REPORT_LIMIT]],
+        'retained_files': retained[:GC_REPORT_LIMIT],
+        'retained_count': len(retained),
+        'purged_blobs': blobs[:GC_REPORT_LIMIT],
+        'purged_blob_count': len(blobs),
+        'fail_msgs': failures,
+        'elapsed_seconds': round(time.monotonic() - started, 2),
+    }
+
+
+def run_file_gc_task(params, progress=None):
+    """后台任务入口（ImportJob kind=file_gc），返回 (结果, HTTP状态码)"""
+    report = collect_garbage(
+        directories=params.get('directories') or None,
+        dry_run=bool(params.get('dry_run', True)),
+        min_age=int(params.get('min_age', GC_MIN_AGE_SECONDS)),
+        keep_latest_backup=bool(params.get('keep_latest_backup', True)),
+        keep_unrecognized=bool(params.get('keep_unrecognized', False)),
+        progress=progress,
+    )
+    return report, 200
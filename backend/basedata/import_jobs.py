@@ -0,0 +1,256 @@
+"""
+后台导入任务队列
+
+任务存放在 ImportJob 表中，不依赖外部消息中间件。Web 服务进程启动时（BaseDataConfig.ready）
+即启动少量工作线程，重启前排队或执行中断的任务无需等待新任务提交就会被接手；
+通过条件更新（pending -> running）原子地领取任务，多个 gunicorn worker 之间不会重复执行。
+也可以用 `python manage.py run_import_jobs` 启动独立的工作进程。
+除导入外，TASKS 中的维护任务（如 file_gc 文件清理）也通过同一队列在后台执行，参数存放在 ImportJob.params。
+"""
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .file_gc import run_file_gc_task
+from .importers import IMPORTERS, ImportFileError, run_importer
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# 进度更新时最多写入的失败明细条数，完整列表在任务结束时写入
+LIVE_FAIL_MSGS_LIMIT = 500
+
+# 不需要上传文件的后台任务：kind -> fn(params, progress=None) -> (结果, HTTP状态码)
+TASKS = {
+    'file_gc': run_file_gc_task,
+}
+
+_wakeup = threading.Event()
+_threads_lock = threading.Lock()
+_threads = []
+_threads_pid = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _normalize_failures(failures):
+    """失败信息统一为字符串列表，import_categories 以 {行号: 信息} 字典返回"""
+    if not failures:
+        return []
+    if isinstance(failures, dict):
+        return [f'第{row}行: {msg}' for row, msg in failures.items()]
+    return [str(msg) for msg in failures]
+
+
+def _json_safe(data):
+    # 导入结果中可能混有 numpy 数值等类型
+    return json.loads(json.dumps(data, ensure_ascii=False, default=str))
+
+
+def enqueue_import_job(kind, file, user=None):
+    """保存上传文件并创建排队中的导入任务，立即返回任务对象"""
+    if kind not in IMPORTERS:
+        raise ValueError(f'不支持的导入类型: {kind}')
+    job = ImportJob(
+        kind=kind,
+        original_name=file.name,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    job.file.save(file.name, file, save=False)
+    job.save()
+    ensure_workers()
+    transaction.on_commit(_wakeup.set)
+    return job
+
+
+def enqueue_task(kind, params=None, user=None):
+    """创建排队中的后台维护任务（TASKS），立即返回任务对象"""
+    if kind not in TASKS:
+        raise ValueError(f'不支持的任务类型: {kind}')
+    job = ImportJob.objects.create(
+        kind=kind,
+        params=params or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    ensure_workers()
+    transaction.on_commit(_wakeup.set)
+    return job
+
+
+def requeue_stale_jobs():
+    """心跳超时的执行中任务（如工作进程被杀）重新排队"""
+    cutoff = timezone.now() - timedelta(seconds=_setting('IMPORT_JOB_STALE_SECONDS', 600))
+    return ImportJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(status='pending', worker='')
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # Windows 上 os.kill 会直接结束目标进程，无法探测，只能等心跳超时
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_orphaned_jobs():
+    """本机已退出的进程（重启、被杀）领取的执行中任务立即重新排队，不必等心跳超时"""
+    prefix = f"{socket.gethostname()}:"
+    orphaned = []
+    running = ImportJob.objects.filter(status='running', worker__startswith=prefix).values_list('id', 'worker')
+    for job_id, worker in running:
+        try:
+            pid = int(worker.split(':')[1])
+        except (IndexError, ValueError):
+            continue
+        if pid != os.getpid() and not _pid_alive(pid):
+            orphaned.append(job_id)
+    if not orphaned:
+        return 0
+    count = ImportJob.objects.filter(pk__in=orphaned, status='running').update(status='pending', worker='')
+    logger.info(f"已重新排队{count}个中断的导入任务")
+    return count
+
+
+def claim_next_job(worker_name):
+    """按创建顺序领取一个排队中的任务，条件更新保证同一任务只会被一个线程领取"""
+    requeue_stale_jobs()
+    candidates = ImportJob.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(pk=job_id, status='pending').update(
+            status='running', worker=worker_name, started_at=now, heartbeat_at=now,
+            processed_rows=0, fail_count=0, fail_msgs=[],
+        )
+        if claimed:
+            return ImportJob.objects.get(pk=job_id)
+    return None
+
+
+def _finish(job, status, **fields):
+    fields.update(status=status, finished_at=timezone.now(), heartbeat_at=timezone.now())
+    ImportJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_job(job):
+    """执行一个已领取的导入任务，进度按块写回任务表"""
+    def progress(processed, total, failures):
+        fail_msgs = _normalize_failures(failures)
+        ImportJob.objects.filter(pk=job.pk).update(
+            processed_rows=processed,
+            total_rows=total,
+            fail_count=len(fail_msgs),
+            fail_msgs=fail_msgs[:LIVE_FAIL_MSGS_LIMIT],
+            heartbeat_at=timezone.now(),
+        )
+
+    logger.info(f"开始执行导入任务 {job.kind}#{job.pk}: {job.original_name}")
+    try:
+        if job.kind in TASKS:
+            payload, status_code = TASKS[job.kind](job.params or {}, progress=progress)
+        else:
+            with job.file.open('rb') as fh:
+                payload, status_code = run_importer(job.kind, fh, progress=progress)
+    except ImportFileError as e:
+        _finish(job, 'failed', result=_json_safe(e.payload), result_status=400, error=str(e))
+    except Exception as e:
+        logger.error(f"导入任务 {job.kind}#{job.pk} 执行异常: {e}", exc_info=True)
+        _finish(job, 'failed', error=str(e))
+    else:
+        fail_msgs = _normalize_failures(payload.get('fail_msgs') or payload.get('errors'))
+        _finish(
+            job, 'completed',
+            result=_json_safe(payload),
+            result_status=status_code,
+            fail_count=len(fail_msgs),
+            fail_msgs=fail_msgs,
+        )
+        logger.info(f"导入任务 {job.kind}#{job.pk} 完成, 失败{len(fail_msgs)}行")
+    finally:
+        # 结果已落库，上传文件不再保留，避免 import_jobs/ 目录堆积
+        try:
+            job.file.delete(save=False)
+            ImportJob.objects.filter(pk=job.pk).update(file='')
+        except Exception as e:
+            logger.warning(f"删除导入任务文件失败 {job.kind}#{job.pk}: {e}")
+
+
+def work_once(worker_name):
+    """领取并执行一个任务，队列为空时返回 False"""
+    close_old_connections()
+    try:
+        job = claim_next_job(worker_name)
+        if job is None:
+            return False
+        run_job(job)
+        return True
+    finally:
+        close_old_connections()
+
+
+def _worker_loop(worker_name, recover=False):
+    poll_interval = _setting('IMPORT_JOB_POLL_INTERVAL', 2)
+    if recover:
+        try:
+            requeue_orphaned_jobs()
+        except Exception as e:
+            logger.error(f"重新排队中断的导入任务失败: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+    while True:
+        try:
+            if work_once(worker_name):
+                continue
+        except Exception as e:
+            logger.error(f"导入工作线程 {worker_name} 异常: {e}", exc_info=True)
+        _wakeup.wait(poll_interval)
+        _wakeup.clear()
+
+
+def ensure_workers():
+    """在当前进程中按 IMPORT_JOB_WORKERS 启动后台工作线程（每个进程只启动一次）"""
+    global _threads_pid
+    count = _setting('IMPORT_JOB_WORKERS', 2)
+    if count <= 0:
+        return
+    with _threads_lock:
+        pid = os.getpid()
+        # fork 出的子进程不会继承父进程的线程
+        if _threads_pid != pid:
+            _threads.clear()
+            _threads_pid = pid
+        if _threads:
+            return
+        for i in range(count):
+            name = f"{socket.gethostname()}:{pid}:import-{i}"
+            thread = threading.Thread(target=_worker_loop, args=(name, i == 0), name=name, daemon=True)
+            thread.start()
+            _threads.append(thread)
+        logger.info(f"进程{pid}已启动{count}个导入工作线程")
+
+
+def _is_server_process():
+    """gunicorn/uvicorn 等 Web 服务进程，或 runserver 自动重载的服务子进程"""
+    program = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if program in ('manage.py', 'django-admin'):
+        return sys.argv[1:2] == ['runserver'] and os.environ.get('RUN_MAIN') == 'true'
+    return program in ('gunicorn', 'uvicorn', 'daphne')
+
+
+def start_workers_on_startup():
+    """服务进程启动时启动工作线程；migrate、test 等管理命令和脚本不启动"""
+    if _is_server_process():
+        ensure_workers()
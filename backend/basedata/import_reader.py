@@ -0,0 +1,220 @@
+"""
+导入文件流式读取
+
+xlsx 使用 openpyxl 只读模式逐行读取，csv 使用 pandas 分块读取，
+都不会把整张表读入内存；每行包装为轻量的 ImportRow，代替 df.iterrows() 生成的 Series。
+空单元格统一为 None，整数值的浮点数转为 int（与 pandas.read_excel 一致）。
+"""
+import math
+from itertools import chain
+
+import pandas as pd
+
+# 每批读取的行数
+READ_BATCH_SIZE = 1000
+
+
+class ImportFileError(Exception):
+    """文件级错误（无法解析、缺少必填列），payload 直接作为 400 响应体返回"""
+
+    def __init__(self, payload):
+        super().__init__(payload.get('msg') or payload)
+        self.payload = payload
+
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, str):
+        return value if value != '' else None
+    if pd.isna(value):
+        return None
+    # numpy 标量转为 Python 原生类型
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _header_names(raw):
+    """表头处理与 pandas 一致：空表头为 Unnamed: N，重复表头追加 .1/.2"""
+    names = []
+    seen = {}
+    for i, name in enumerate(raw):
+        if name is None or (isinstance(name, float) and math.isnan(name)) or name == '':
+            name = f'Unnamed: {i}'
+        elif isinstance(name, float) and name.is_integer():
+            name = int(name)
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _fit(row, width):
+    if len(row) == width:
+        return row
+    if len(row) > width:
+        return row[:width]
+    return tuple(row) + (None,) * (width - len(row))
+
+
+class ImportRow:
+    """
+    导入文件中的一行
+    row['列名'] 取值（列不存在时 KeyError），row.get('列名', 默认值) 在列不存在或为空时返回默认值
+    row_no 为数据行序号（从1开始，即原 DataFrame 的 index+1）
+    """
+    __slots__ = ('row_no', 'values', '_index')
+
+    def __init__(self, row_no, values, index):
+        self.row_no = row_no
+        self.values = values
+        self._index = index
+
+    def __getitem__(self, col):
+        return self.values[self._index[col]]
+
+    def __contains__(self, col):
+        return col in self._index
+
+    def get(self, col, default=None):
+        pos = self._index.get(col)
+        if pos is None:
+            return default
+        value = self.values[pos]
+        return default if value is None else value
+
+    def __repr__(self):
+        return f'<ImportRow {self.row_no}: {dict(zip(self._index, self.values))}>'
+
+
+class ImportReader:
+    """
+    流式读取上传的导入文件
+    打开时只读取表头，rows()/batches() 逐行/逐批读取数据
+    """
+
+    def __init__(self, file, batch_size=READ_BATCH_SIZE):
+        self.file = file
+        self.batch_size = batch_size
+        self.columns = []
+        self.rows_read = 0
+        self._estimated_rows = 0
+        self._workbook = None
+        self._source = None
+        name = (getattr(file, 'name', '') or '').lower()
+        try:
+            if name.endswith('.csv'):
+                self._open_csv()
+            elif name.endswith('.xls'):
+                self._open_dataframe(pd.read_excel(file))
+            else:
+                self._open_xlsx()
+        except Exception as e:
+            self.close()
+            raise ImportFileError({'msg': f'文件解析失败: {e}'})
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    def _open_xlsx(self):
+        from openpyxl import load_workbook
+
+        self._workbook = load_workbook(self.file, read_only=True, data_only=True)
+        sheet = self._workbook.worksheets[0]
+        self._estimated_rows = max((sheet.max_row or 1) - 1, 0)
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        # 只读模式下行尾可能带有大量空列，按最后一个非空表头截断
+        width = len(header)
+        while width and header[width - 1] in (None, ''):
+            width -= 1
+        self.columns = _header_names(header[:width])
+        self._source = (_fit(row, width) for row in rows)
+
+    def _open_csv(self):
+        if hasattr(self.file, 'seek'):
+            # 逐块统计行数用于进度估算，不保留文件内容
+            for block in iter(lambda: self.file.read(1 << 20), b''):
+                if not block:
+                    break
+                self._estimated_rows += block.count(b'\n' if isinstance(block, bytes) else '\n')
+            self._estimated_rows = max(self._estimated_rows - 1, 0)
+            self.file.seek(0)
+        chunks = pd.read_csv(self.file, chunksize=self.batch_size)
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError('文件为空')
+        self.columns = list(first.columns)
+        self._source = self._iter_chunks(chain([first], chunks))
+
+    def _open_dataframe(self, df):
+        self.columns = list(df.columns)
+        self._estimated_rows = len(df)
+        self._source = self._iter_chunks([df])
+
+    @staticmethod
+    def _iter_chunks(chunks):
+        for chunk in chunks:
+            yield from chunk.itertuples(index=False, name=None)
+
+    @property
+    def total_rows(self):
+        """总行数：读取过程中为估算值，读完后为实际行数"""
+        if self._source is None:
+            return self.rows_read
+        return max(self._estimated_rows, self.rows_read)
+
+    def __contains__(self, col):
+        return col in self._index
+
+    def first_column(self, *aliases):
+        """按顺序返回第一个存在的列名（如 材质 列的 material_type/材质/material 别名）"""
+        return next((col for col in aliases if col in self._index), None)
+
+    def rows(self):
+        """逐行读取，跳过整行为空的行（行号仍按表格位置计算）"""
+        index = self._index
+        position = self.rows_read
+        for raw in self._source:
+            position += 1
+            values = tuple(_clean(v) for v in raw)
+            if all(v is None for v in values):
+                continue
+            self.rows_read = position
+            yield ImportRow(position, values, index)
+        self._source = None
+        self.close()
+
+    def batches(self, size=None):
+        size = size or self.batch_size
+        batch = []
+        for row in self.rows():
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def open_import_reader(file, batch_size=READ_BATCH_SIZE):
+    """打开上传的 CSV/Excel 文件，返回 ImportReader；无法解析时抛出 ImportFileError"""
+    return ImportReader(file, batch_size=batch_size)
@@ -0,0 +1,978 @@
+"""
+基础数据批量导入引擎
+
+按"整批解析 -> 一次性解析引用数据 -> 内存比对 -> 分块批量写入"的方式处理导入，
+避免逐行查询数据库。上传文件通过 import_reader 流式读取，返回结构与原逐行导入接口保持一致。
+"""
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .import_reader import ImportFileError, open_import_reader
+from .models import ProductCategory, CategoryParam, Product, ProductParamValue, Unit
+from .reference_cache import deferred_reference_invalidation, reference_list
+
+logger = logging.getLogger(__name__)
+
+# 每个事务块写入的行数
+IMPORT_CHUNK_SIZE = 1000
+# 逐行导入时上报进度的间隔行数
+PROGRESS_EVERY = 200
+# BOM导入每个事务写入的BOM个数
+BOM_GROUP_BATCH_SIZE = 200
+# BOMItem.quantity 为 max_digits=10, decimal_places=2
+BOM_QUANTITY_LIMIT = Decimal('1e8')
+# IN 查询每批的参数个数，避免超出数据库占位符上限
+QUERY_BATCH_SIZE = 2000
+
+
+def _batched(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _parse_price(value):
+    if isinstance(value, (int, float, str)) and value != '':
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return 0
+    return 0
+
+
+def _report_progress(progress, processed, total, failures, force=False):
+    """
+    每处理 PROGRESS_EVERY 行回调一次 progress(processed, total, failures)
+    failures 为当前的失败信息（列表或以行号为键的字典）
+    """
+    if progress is not None and (force or processed % PROGRESS_EVERY == 0 or processed == total):
+        progress(processed, total, failures)
+
+
+def _throughput(total_rows, started):
+    elapsed = time.monotonic() - started
+    return {
+        'elapsed': round(elapsed, 3),
+        'rows_per_sec': round(total_rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _load_categories_by_code(codes):
+    """按代码加载产品类，同代码多条时与 .filter(code=...).first() 一致取id最小的一条"""
+    categories = {}
+    for batch in _batched(codes, QUERY_BATCH_SIZE):
+        for category in ProductCategory.objects.filter(code__in=batch).order_by('id'):
+            categories.setdefault(category.code, category)
+    return categories
+
+
+def _load_units_by_code(codes):
+    codes = set(codes)
+    return {unit.code: unit for unit in reference_list('unit') if unit.code in codes}
+
+
+def _load_products_by_code(codes):
+    products = {}
+    for batch in _batched(codes, QUERY_BATCH_SIZE):
+        for product in Product.objects.filter(code__in=batch):
+            products[product.code] = product
+    return products
+
+
+def _ensure_category_params(wanted):
+    """
+    确保 (category_id, 参数名) 对应的参数项存在，缺失的批量创建
+    :param wanted: {category_id: 参数名的有序集合}（保持首次出现顺序）
+    :return: {(category_id, 参数名): CategoryParam}
+    """
+    category_ids = list(wanted.keys())
+    params = {}
+    for batch in _batched(category_ids, QUERY_BATCH_SIZE):
+        for param in CategoryParam.objects.filter(category_id__in=batch):
+            params[(param.category_id, param.name)] = param
+
+    missing = {}
+    for category_id, names in wanted.items():
+        for name in names:
+            if (category_id, name) not in params:
+                missing.setdefault(category_id, []).append(name)
+    if not missing:
+        return params
+
+    # bulk_create 不会调用 CategoryParam.save()，这里按原逻辑补齐 display_order
+    max_orders = dict(
+        CategoryParam.objects.filter(category_id__in=list(missing.keys()))
+        .values('category_id').annotate(max_order=Max('display_order'))
+        .values_list('category_id', 'max_order')
+    )
+    new_params = []
+    for category_id, names in missing.items():
+        order = max_orders.get(category_id) or 0
+        for name in names:
+            order += 1
+            new_params.append(CategoryParam(category_id=category_id, name=name, display_order=order))
+            logger.info(f"创建参数项: category_id={category_id}, name={name}")
+    CategoryParam.objects.bulk_create(new_params, batch_size=IMPORT_CHUNK_SIZE, ignore_conflicts=True)
+
+    # MySQL 的 bulk_create 不回填主键，重新查询一次
+    for batch in _batched(list(missing.keys()), QUERY_BATCH_SIZE):
+        for param in CategoryParam.objects.filter(category_id__in=batch):
+            params[(param.category_id, param.name)] = param
+    return params
+
+
+def _fold(value):
+    """与 MySQL 默认排序规则（不区分大小写、忽略尾部空格）近似的比较键"""
+    return str(value).rstrip().casefold()
+
+
+class ReferenceIndex:
+    """
+    参考数据的内存索引：按指定字段建立 值 -> 对象 的字典
+    同一值对应多条记录时与 .filter(...).first() 一致取id最小的一条
+    :param objects: 按主键排序的对象列表（reference_list）
+    """
+
+    def __init__(self, objects, fields):
+        self._exact = {field: {} for field in fields}
+        self._folded = {field: {} for field in fields}
+        for obj in objects:
+            for field in fields:
+                value = getattr(obj, field)
+                if value is None:
+                    continue
+                self._exact[field].setdefault(str(value), obj)
+                self._folded[field].setdefault(_fold(value), obj)
+
+    def get(self, field, value):
+        if value is None:
+            return None
+        obj = self._exact[field].get(str(value))
+        if obj is None:
+            obj = self._folded[field].get(_fold(value))
+        return obj
+
+
+class ReferenceResolver:
+    """
+    导入时解析 公司/单位/材质 引用，数据取自参考数据缓存，逐行查找为字典命中
+    查找顺序与原逐行查询一致：材质 id -> 名称 -> 代码，单位 名称 -> 代码，公司 名称
+    """
+
+    def __init__(self):
+        self.companies = ReferenceIndex(reference_list('company'), ['name'])
+        self.units = ReferenceIndex(reference_list('unit'), ['name', 'code'])
+        self.material_types = ReferenceIndex(reference_list('material_type'), ['id', 'name', 'code'])
+
+    def company(self, value):
+        return self.companies.get('name', value)
+
+    def unit(self, value):
+        return self.units.get('name', value) or self.units.get('code', value)
+
+    def material_type(self, value):
+        obj = None
+        try:
+            obj = self.material_types.get('id', int(value))
+        except (TypeError, ValueError):
+            pass
+        return obj or self.material_types.get('name', value) or self.material_types.get('code', value)
+
+
+def bulk_import_products(reader, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    批量导入产品（ProductViewSet.import_products）
+
+    按块流式读取，每块内产品类、单位、已存在产品、参数项各用一次查询解析（产品类/单位跨块缓存），
+    新增/更新通过 bulk_create/bulk_update 写入，每块一个事务。
+    :param reader: 已通过必填列校验的 ImportReader
+    :param progress: 进度回调，见 _report_progress
+    :return: 与原导入接口一致的结果字典，附加 elapsed / rows_per_sec
+    """
+    started = time.monotonic()
+    total_rows = 0
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+    skipped_count = 0
+    skipped_reasons = []
+    duplicate_codes = []
+    processed_data = {}
+    categories = {}
+    units = {}
+
+    logger.info(f"开始批量导入产品，预计{reader.total_rows}行数据")
+
+    has_unit = 'unit_code' in reader
+    for batch in reader.batches(chunk_size):
+        total_rows += len(batch)
+
+        # 解析原始行，收集本块需要解析的引用数据
+        parsed_rows = []
+        for row in batch:
+            try:
+                category_code = str(row['category_code']).strip()
+                unit_code = str(row['unit_code']).strip() if has_unit and row['unit_code'] is not None else None
+                raw_items = row['param_items']
+                raw_values = row['param_values']
+                param_items = str(raw_items).split(',') if raw_items is not None else []
+                param_values = str(raw_values).split(',') if raw_values is not None else []
+                price = _parse_price(row['price'])
+            except Exception as e:
+                fail_count += 1
+                fail_msgs.append(f'第{row.row_no}行: 处理失败: {str(e)}')
+                continue
+            parsed_rows.append((row.row_no, category_code, unit_code, param_items, param_values, price))
+
+        new_category_codes = {r[1] for r in parsed_rows} - categories.keys()
+        if new_category_codes:
+            loaded = _load_categories_by_code(new_category_codes)
+            categories.update({code: loaded.get(code) for code in new_category_codes})
+        new_unit_codes = {r[2] for r in parsed_rows if r[2]} - units.keys()
+        if new_unit_codes:
+            loaded = _load_units_by_code(new_unit_codes)
+            units.update({code: loaded.get(code) for code in new_unit_codes})
+
+        # 校验并构建待写入的产品
+        chunk = []
+        for row_no, category_code, unit_code, param_items, param_values, price in parsed_rows:
+            category = categories.get(category_code)
+            if not category:
+                fail_msgs.append(f'第{row_no}行: 找不到产品类别代码: {category_code}')
+                fail_count += 1
+                continue
+
+            unit = None
+            if unit_code:
+                unit = units.get(unit_code)
+                if not unit:
+                    fail_msgs.append(f'第{row_no}行: 找不到单位编码: {unit_code}')
+                    fail_count += 1
+                    continue
+
+            if len(param_items) != len(param_values):
+                fail_msgs.append(
+                    f'第{row_no}行: 参数项和参数值数量不匹配: {len(param_items)}个参数项, {len(param_values)}个参数值'
+                )
+                fail_count += 1
+                continue
+
+            product_code = category_code
+            product_name = category.display_name
+            params = {}
+            for item, value in zip(param_items, param_values):
+                value = value.strip()
+                product_code += f"-{value}"
+                product_name += f"-{value}"
+                # 同一行重复的参数项只保留第一个值（唯一约束 product+param）
+                params.setdefault(item.strip(), value)
+
+            if product_code in processed_data:
+                skipped_reasons.append(f'第{row_no}行: 产品代码在当前导入批次中重复: {product_code}')
+                skipped_count += 1
+                duplicate_codes.append(product_code)
+                continue
+
+            processed_data[product_code] = {"row": row_no, "action": None}
+            chunk.append((row_no, product_code, product_name, price, category, unit, params))
+
+        if chunk:
+            try:
+                _write_product_chunk(chunk, processed_data, chunk_size)
+            except Exception as e:
+                logger.error(f"产品批量写入失败(第{chunk[0][0]}~{chunk[-1][0]}行): {e}", exc_info=True)
+                for row_no, *_ in chunk:
+                    fail_msgs.append(f'第{row_no}行: 产品保存失败: {str(e)}')
+                fail_count += len(chunk)
+            else:
+                success_count += len(chunk)
+        _report_progress(progress, total_rows, reader.total_rows, fail_msgs, force=True)
+
+    stats = _throughput(total_rows, started)
+    logger.info(
+        f"产品导入完成: 总共{total_rows}行, 成功{success_count}行, 失败{fail_count}行, 跳过{skipped_count}行, "
+        f"耗时{stats['elapsed']}秒, {stats['rows_per_sec']}行/秒"
+    )
+
+    return {
+        'msg': '导入完成',
+        'total': total_rows,
+        'success': success_count,
+        'fail': fail_count,
+        'skipped': skipped_count,
+        'fail_msgs': fail_msgs,
+        'skipped_reasons': skipped_reasons,
+        'duplicate_codes': duplicate_codes,
+        'processed_data': processed_data,
+        **stats,
+    }
+
+
+def _write_product_chunk(chunk, processed_data, batch_size):
+    """在一个事务内写入一块产品及其参数值"""
+    existing_products = _load_products_by_code([row[1] for row in chunk])
+
+    wanted_params = {}
+    for _, _, _, _, category, _, params in chunk:
+        names = wanted_params.setdefault(category.id, {})
+        for name in params:
+            names.setdefault(name, None)
+    category_params = _ensure_category_params(wanted_params)
+
+    to_create = []
+    to_update = []
+    for row_no, product_code, product_name, price, category, unit, _ in chunk:
+        product = existing_products.get(product_code)
+        if product is None:
+            to_create.append(Product(
+                code=product_code, name=product_name, price=price,
+                category=category, unit=unit, is_material=False,
+            ))
+            processed_data[product_code]['action'] = "新增"
+        else:
+            product.name = product_name
+            product.price = price
+            product.category = category
+            product.unit = unit
+            product.is_material = False
+            to_update.append(product)
+            processed_data[product_code]['action'] = "更新"
+
+    with transaction.atomic():
+        if to_create:
+            Product.objects.bulk_create(to_create)
+        if to_update:
+            Product.objects.bulk_update(to_update, ['name', 'price', 'category', 'unit', 'is_material'])
+            ProductParamValue.objects.filter(product_id__in=[p.id for p in to_update]).delete()
+
+        product_ids = dict(
+            Product.objects.filter(code__in=[row[1] for row in chunk]).values_list('code', 'id')
+        )
+        param_values = [
+            ProductParamValue(
+                product_id=product_ids[product_code],
+                param=category_params[(category.id, name)],
+                value=value,
+            )
+            for _, product_code, _, _, category, _, params in chunk
+            for name, value in params.items()
+        ]
+        ProductParamValue.objects.bulk_create(param_values, batch_size=batch_size)
+
+
+def require_columns(reader, required_cols):
+    for col in required_cols:
+        if col not in reader:
+            raise ImportFileError({'msg': f'缺少字段: {col}'})
+
+
+def import_categories(reader, progress=None):
+    """导入产品类（ProductCategoryViewSet.import_categories）"""
+    required_cols = ['code', 'display_name', 'company']
+    missing_cols = [col for col in required_cols if col not in reader]
+    if missing_cols:
+        # 返回结构化的错误信息，方便前端解析
+        raise ImportFileError({"row_info": f"文件列配置错误，缺少必需字段: {', '.join(missing_cols)}"})
+
+    material_col = reader.first_column('material_type', '材质', 'material')
+    unit_col = reader.first_column('unit', '单位')
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs_dict = {}  # 使用字典记录详细错误，键为行号
+    resolver = ReferenceResolver()
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        current_row_index = row.row_no
+        row_errors = []
+        try:
+            company_name = row['company']
+            company = resolver.company(company_name)
+            if not company:
+                row_errors.append(f'找不到公司: {company_name}')
+
+            material_type_obj = None
+            if material_col and row[material_col] is not None:
+                val = row[material_col]
+                material_type_obj = resolver.material_type(val)
+                if not material_type_obj:
+                    row_errors.append(f'材质未找到: {val}')
+
+            unit_obj = None
+            if unit_col and row[unit_col] is not None:
+                unit_val = row[unit_col]
+                unit_obj = resolver.unit(unit_val)
+                if not unit_obj:
+                    row_errors.append(f'单位未找到: {unit_val}')
+
+            if row_errors:
+                fail_count += 1
+                fail_msgs_dict[current_row_index] = "; ".join(row_errors)
+            else:
+                ProductCategory.objects.update_or_create(
+                    code=row['code'],
+                    company=company,
+                    defaults={
+                        'display_name': row['display_name'],
+                        'material_type': material_type_obj,
+                        'unit': unit_obj,
+                    }
+                )
+                success_count += 1
+        except Exception as e:
+            fail_count += 1
+            logger.error(f"[IMPORT_CATEGORIES] 第{current_row_index}行处理失败: {e}", exc_info=True)
+            fail_msgs_dict[current_row_index] = f'未知错误: {str(e)}'
+        _report_progress(progress, processed, reader.total_rows, fail_msgs_dict)
+
+    logger.info(f"[IMPORT_CATEGORIES] 导入完成. 成功: {success_count}, 失败: {fail_count}")
+    if fail_msgs_dict:
+        return {
+            'msg': '导入过程中发生错误',
+            'success_count': success_count,
+            'fail_count': fail_count,
+            'errors': fail_msgs_dict,
+        }, 400
+
+    return {
+        'msg': '产品类别导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': [],
+    }, 200
+
+
+def import_category_params(reader, progress=None):
+    """导入产品类参数项（CategoryParamViewSet.import_category_params）"""
+    require_columns(reader, ['category_code', 'name'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            category = ProductCategory.objects.filter(code=row['category_code']).first()
+            if not category:
+                fail_msgs.append(f'第{row.row_no}行: 找不到产品类别代码: {row["category_code"]}')
+                fail_count += 1
+            else:
+                CategoryParam.objects.update_or_create(category=category, name=row['name'])
+                success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '类别参数导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_products(reader, progress=None):
+    """导入产品（ProductViewSet.import_products），见 bulk_import_products"""
+    require_columns(reader, ['category_code', 'param_items', 'param_values', 'price'])
+    return bulk_import_products(reader, progress=progress), 200
+
+
+def import_materials(reader, progress=None):
+    """导入物料（MaterialViewSet.import_materials）"""
+    required_cols = ['code', 'name', 'price', 'category_code']
+    require_columns(reader, required_cols)
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+    units = ReferenceIndex(reference_list('unit'), ['code'])
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            category = ProductCategory.objects.filter(code=row['category_code']).first()
+            if not category:
+                fail_msgs.append(f'第{row.row_no}行: 找不到物料类别代码: {row["category_code"]}')
+                fail_count += 1
+                _report_progress(progress, processed, reader.total_rows, fail_msgs)
+                continue
+
+            unit = None
+            if row.get('unit_code') is not None:
+                unit = units.get('code', row['unit_code'])
+                if not unit:
+                    fail_msgs.append(f'第{row.row_no}行: 找不到单位编码: {row["unit_code"]}')
+                    fail_count += 1
+                    _report_progress(progress, processed, reader.total_rows, fail_msgs)
+                    continue
+
+            price = float(row['price']) if isinstance(row['price'], (int, float, str)) else 0
+
+            # 名称为空时使用物料类别的显示名称
+            name = row['name']
+            if name is None:
+                name = category.display_name
+
+            product, created = Product.objects.update_or_create(
+                code=row['code'],
+                defaults={
+                    'name': name,
+                    'price': price,
+                    'category': category,
+                    'unit': unit,
+                    'is_material': True  # 确保是物料
+                }
+            )
+
+            # 其余列按参数项名称写入参数值
+            for col in reader.columns:
+                if col in required_cols or row[col] is None:
+                    continue
+                param = CategoryParam.objects.filter(category=category, name=col).first()
+                if param:
+                    ProductParamValue.objects.update_or_create(
+                        product=product,
+                        param=param,
+                        defaults={'value': str(row[col])}
+                    )
+
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_processes(reader, progress=None):
+    """导入工序（ProcessViewSet.import_processes）"""
+    from .models import Process
+
+    require_columns(reader, ['code', 'name'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            description = row.get('description', '')
+            Process.objects.update_or_create(
+                code=row['code'],
+                defaults={
+                    'name': row['name'],
+                    'description': description
+                }
+            )
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '工序导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_process_codes(reader, progress=None):
+    """导入工艺流程代码（ProcessCodeViewSet.import_process_codes）"""
+    from .models import ProcessCode
+
+    require_columns(reader, ['code', 'version'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            description = row.get('description', '')
+            ProcessCode.objects.update_or_create(
+                code=row['code'],
+                version=row['version'],
+                defaults={
+                    'description': description
+                }
+            )
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '工艺流程导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_process_details(reader, progress=None):
+    """导入工艺流程明细（ProcessDetailViewSet.import_process_details）"""
+    from .models import ProcessCode, ProcessDetail
+
+    require_columns(reader, ['process_code', 'step_no', 'step', 'machine_time', 'labor_time'])
+
+    success, fail = 0, 0
+    fail_msgs = []
+    steps = ReferenceIndex(reference_list('process'), ['name'])
+    with transaction.atomic():
+        for processed, row in enumerate(reader.rows(), start=1):
+            try:
+                process_code_obj = ProcessCode.objects.filter(code=row['process_code']).first()
+                step_obj = steps.get('name', row['step'])
+                if not process_code_obj or not step_obj:
+                    fail += 1
+                    fail_msgs.append(f"第{row.row_no + 1}行: 工艺流程代码或工序不存在")
+                else:
+                    process_content = row.get('process_content', '')
+                    ProcessDetail.objects.update_or_create(
+                        process_code=process_code_obj,
+                        step_no=row['step_no'],
+                        defaults={
+                            'step': step_obj,
+                            'machine_time': row['machine_time'],
+                            'labor_time': row['labor_time'],
+                            'process_content': process_content,
+                        }
+                    )
+                    success += 1
+            except Exception as e:
+                fail += 1
+                fail_msgs.append(f"第{row.row_no + 1}行: {e}")
+            _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    msg = f"导入完成，成功{success}条，失败{fail}条。"
+    if fail:
+        msg += ' 错误: ' + '; '.join(fail_msgs[:5])
+    return {'msg': msg, 'success': success, 'fail': fail, 'fail_msgs': fail_msgs}, 200
+
+
+def _load_bom_products(codes, is_material):
+    """按代码加载产品或物料，同代码多条时与 .filter(...).first() 一致取id最小的一条"""
+    products = {}
+    for batch in _batched(codes, QUERY_BATCH_SIZE):
+        for product in Product.objects.filter(code__in=batch, is_material=is_material).order_by('id'):
+            products.setdefault(product.code, product)
+    return products
+
+
+def _parse_bom_quantity(value):
+    if value is None:
+        raise ValueError('用量不能为空')
+    quantity = Decimal(str(float(value))) if isinstance(value, (int, float, str)) else Decimal(0)
+    if not quantity.is_finite() or abs(quantity) >= BOM_QUANTITY_LIMIT:
+        raise ValueError(f'用量超出范围: {value}')
+    return quantity.quantize(Decimal('0.01'))
+
+
+def _write_bom_groups(groups):
+    """
+    在一个事务内写入一批BOM：表头批量新增/更新，明细一次删除 + 一次批量创建
+    :param groups: [(product, bom_name, version, [(material, quantity, remark), ...]), ...]
+    :return: (新增BOM数, 更新BOM数)
+    """
+    from .models import BOM, BOMItem
+
+    product_ids = {product.id for product, *_ in groups}
+    existing = {}
+    for batch in _batched(product_ids, QUERY_BATCH_SIZE):
+        for bom in BOM.objects.filter(product_id__in=batch):
+            existing[(bom.product_id, bom.name, bom.version)] = bom
+
+    # 与原逐个 update_or_create 一致：新建BOM没有任何有效明细时不保留，已有BOM仍会清空明细
+    to_create = [
+        BOM(product=product, name=bom_name, version=version)
+        for product, bom_name, version, items in groups
+        if items and (product.id, bom_name, version) not in existing
+    ]
+    existing_ids = [existing[key].id for key in
+                    ((product.id, bom_name, version) for product, bom_name, version, _ in groups) if key in existing]
+
+    with transaction.atomic():
+        if existing_ids:
+            BOM.objects.filter(id__in=existing_ids).update(updated_at=timezone.now())
+            BOMItem.objects.filter(bom_id__in=existing_ids).delete()
+        if to_create:
+            BOM.objects.bulk_create(to_create)
+            # MySQL 的 bulk_create 不回填主键，重新查询一次
+            for bom in BOM.objects.filter(product_id__in=[bom.product_id for bom in to_create]):
+                existing.setdefault((bom.product_id, bom.name, bom.version), bom)
+
+        BOMItem.objects.bulk_create([
+            BOMItem(bom_id=existing[(product.id, bom_name, version)].id, material=material, quantity=quantity, remark=remark)
+            for product, bom_name, version, items in groups
+            for material, quantity, remark in items
+        ], batch_size=IMPORT_CHUNK_SIZE)
+    return len(to_create), len(existing_ids)
+
+
+def import_boms(reader, progress=None):
+    """
+    导入BOM（BOMViewSet.import_boms），按 产品代码/BOM名称/版本 分组
+
+    产品和物料各用一次查询预取，每 BOM_GROUP_BATCH_SIZE 个BOM一个事务批量写入；
+    某批写入失败时逐个BOM重试，只有出错的BOM记为失败
+    """
+    require_columns(reader, ['product_code', 'name', 'version', 'material_code', 'quantity'])
+
+    started = time.monotonic()
+    total_rows = 0
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+    created_count = 0
+    updated_count = 0
+
+    groups = {}
+    for row in reader.rows():
+        total_rows += 1
+        key = (row['product_code'], row['name'], row['version'])
+        if None in key:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: 产品代码、BOM名称、版本不能为空')
+            continue
+        groups.setdefault(key, []).append(row)
+
+    products = _load_bom_products({str(key[0]) for key in groups}, is_material=False)
+    materials = _load_bom_products(
+        {str(row['material_code']) for rows in groups.values() for row in rows if row['material_code'] is not None},
+        is_material=True,
+    )
+
+    # 校验并整理每个BOM的明细
+    valid_groups = []
+    for (product_code, bom_name, bom_version), rows in groups.items():
+        product = products.get(str(product_code))
+        if not product:
+            fail_count += len(rows)
+            fail_msgs.append(f'产品代码不存在或不是产品: {product_code}')
+            continue
+
+        items = []
+        seen_materials = set()
+        for row in rows:
+            material_code = row['material_code']
+            material = materials.get(str(material_code)) if material_code is not None else None
+            if not material:
+                fail_count += 1
+                fail_msgs.append(f'物料代码不存在或不是物料: {material_code}')
+                continue
+            if material.id in seen_materials:
+                fail_count += 1
+                fail_msgs.append(f'BOM明细创建失败: {material_code} - 同一BOM中物料重复')
+                continue
+            try:
+                quantity = _parse_bom_quantity(row['quantity'])
+            except Exception as e:
+                fail_count += 1
+                fail_msgs.append(f'BOM明细创建失败: {material_code} - {str(e)}')
+                continue
+            seen_materials.add(material.id)
+            items.append((material, quantity, str(row.get('remark', ''))))
+        valid_groups.append((product, str(bom_name), str(bom_version), items))
+
+    processed = total_rows - sum(len(items) for *_, items in valid_groups)
+    for batch in _batched(valid_groups, BOM_GROUP_BATCH_SIZE):
+        try:
+            created, updated = _write_bom_groups(batch)
+        except Exception as e:
+            logger.warning(f"BOM批量写入失败，逐个重试: {e}")
+            created = updated = 0
+            for group in batch:
+                product, bom_name, version, items = group
+                try:
+                    group_created, group_updated = _write_bom_groups([group])
+                except Exception as e:
+                    logger.error(f"BOM写入失败 {product.code}/{bom_name}/{version}: {e}", exc_info=True)
+                    fail_count += len(items)
+                    fail_msgs.append(f'BOM创建失败: {product.code}/{bom_name}/{version} - {str(e)}')
+                else:
+                    created += group_created
+                    updated += group_updated
+                    success_count += len(items)
+        else:
+            success_count += sum(len(items) for *_, items in batch)
+        created_count += created
+        updated_count += updated
+        processed += sum(len(items) for *_, items in batch)
+        _report_progress(progress, processed, reader.total_rows, fail_msgs, force=True)
+
+    stats = _throughput(total_rows, started)
+    logger.info(
+        f"BOM导入完成: {len(groups)}个BOM(新增{created_count}, 更新{updated_count}), "
+        f"明细成功{success_count}行, 失败{fail_count}行, 耗时{stats['elapsed']}秒"
+    )
+    return {
+        'msg': 'BOM导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+        'boms_created': created_count,
+        'boms_updated': updated_count,
+        **stats,
+    }, 200
+
+
+def import_units(reader, progress=None):
+    """导入单位（UnitViewSet.import_units）"""
+    require_columns(reader, ['code', 'name'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            Unit.objects.update_or_create(
+                code=row['code'],
+                defaults={
+                    'name': row['name'],
+                    'description': row.get('description', '')
+                }
+            )
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '单位导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_category_process_codes(reader, progress=None):
+    """导入产品类-工艺流程关联（ProductCategoryProcessCodeViewSet.import_category_process_codes）"""
+    from .models import ProcessCode, ProductCategoryProcessCode
+
+    require_columns(reader, ['category_code', 'process_code', 'version'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            category = ProductCategory.objects.filter(code=row['category_code']).first()
+            process_code = None
+            if not category:
+                fail_msgs.append(f'第{row.row_no}行: 找不到产品类代码: {row["category_code"]}')
+                fail_count += 1
+            else:
+                process_code = ProcessCode.objects.filter(code=row['process_code'], version=row['version']).first()
+                if not process_code:
+                    fail_msgs.append(f'第{row.row_no}行: 找不到工艺流程代码: {row["process_code"]} 版本: {row["version"]}')
+                    fail_count += 1
+
+            if category and process_code:
+                is_default = False
+                if row.get('is_default') is not None:
+                    is_default = str(row['is_default']).lower() in ['true', '1', 'yes', 'y', '是', '默认']
+
+                # 设置为默认时，取消该产品类下的其他默认设置
+                if is_default:
+                    ProductCategoryProcessCode.objects.filter(
+                        category=category,
+                        is_default=True
+                    ).update(is_default=False)
+
+                ProductCategoryProcessCode.objects.update_or_create(
+                    category=category,
+                    process_code=process_code,
+                    defaults={'is_default': is_default}
+                )
+                success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '产品类工艺流程关联导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+def import_material_types(reader, progress=None):
+    """导入材质（MaterialTypeViewSet.import_material_types）"""
+    from .models import MaterialType
+
+    require_columns(reader, ['code', 'name'])
+
+    success_count = 0
+    fail_count = 0
+    fail_msgs = []
+
+    for processed, row in enumerate(reader.rows(), start=1):
+        try:
+            MaterialType.objects.update_or_create(
+                code=row['code'],
+                defaults={
+                    'name': row['name'],
+                    'description': row.get('description', '')
+                }
+            )
+            success_count += 1
+        except Exception as e:
+            fail_count += 1
+            fail_msgs.append(f'第{row.row_no}行: {str(e)}')
+        _report_progress(progress, processed, reader.total_rows, fail_msgs)
+
+    return {
+        'msg': '材质类型导入完成',
+        'success': success_count,
+        'fail': fail_count,
+        'fail_msgs': fail_msgs,
+    }, 200
+
+
+# 导入类型 -> 导入函数，供同步接口与后台导入任务共用
+IMPORTERS = {
+    'categories': import_categories,
+    'category_params': import_category_params,
+    'products': import_products,
+    'materials': import_materials,
+    'processes': import_processes,
+    'process_codes': import_process_codes,
+    'process_details': import_process_details,
+    'boms': import_boms,
+    'units': import_units,
+    'category_process_codes': import_category_process_codes,
+    'material_types': import_material_types,
+}
+
+
+def run_importer(kind, file, progress=None):
+    """
+    读取上传文件并执行对应类型的导入
+    :return: (响应数据, HTTP状态码)；文件级错误抛出 ImportFileError
+    """
+    # 逐行写入单位/工序/材质时只在导入结束后使参考数据缓存失效一次
+    with open_import_reader(file) as reader, deferred_reference_invalidation():
+        payload, status_code = IMPORTERS[kind](reader, progress=progress)
+        # 读取中的总行数为估算值，结束时按实际行数补报一次
+        if progress is not None:
+            progress(reader.rows_read, reader.rows_read, payload.get('fail_msgs') or payload.get('errors') or [])
+    return payload, status_code
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from basedata.file_gc import GC_MIN_AGE_SECONDS, collect_garbage
+
+
+class Command(BaseCommand):
+    help = '删除未被任何记录引用的媒体文件（一次扫描，替代各 cleanup_* 命令）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directories', nargs='*', help='上传目录（相对 MEDIA_ROOT，如 drawings），默认所有上传目录')
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='只列出将删除的文件')
+        parser.add_argument('--min-age', type=int, default=GC_MIN_AGE_SECONDS, dest='min_age',
+                            help='最近修改时间在此秒数内的文件不删除')
+        parser.add_argument('--all-backups', action='store_true', dest='all_backups',
+                            help='未引用的 -时间戳 备份全部删除，不保留最新一个')
+        parser.add_argument('--keep-unrecognized', action='store_true', dest='keep_unrecognized',
+                            help='只删除备份和 _随机后缀 文件')
+        parser.add_argument('--no-blobs', action='store_true', dest='no_blobs', help='不清理内容寻址存储')
+
+    def handle(self, *args, **options):
+        def progress(done, total, failures):
+            self.stdout.write(f'已处理 {done}/{total}')
+
+        try:
+            report = collect_garbage(
+                directories=options['directories'] or None,
+                dry_run=options['dry_run'],
+                min_age=options['min_age'],
+                keep_latest_backup=not options['all_backups'],
+                keep_unrecognized=options['keep_unrecognized'],
+                purge_blobs=not options['no_blobs'],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name in report['deleted_files'][:50]:
+            self.stdout.write(name)
+        for msg in report['fail_msgs']:
+            self.stderr.write(msg)
+        action = '将删除' if options['dry_run'] else '已删除'
+        self.stdout.write(self.style.SUCCESS(
+            f"扫描 {report['scanned_files']} 个文件（{', '.join(report['directories'])}），"
+            f"{action} {report['deleted_count']} 个（{report['deleted_bytes']} 字节），"
+            f"保留未引用文件 {report['retained_count']} 个，内容寻址文件 {report['purged_blob_count']} 个，"
+            f"耗时 {report['elapsed_seconds']} 秒"
+        ))
@@ -0,0 +1,61 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from basedata.blob_storage import is_blob_name, pdf_blob_storage, recount_blob_references, referencing_models
+
+
+class Command(BaseCommand):
+    help = '将图纸/工艺PDF迁移到内容寻址存储（blobs/），相同内容只保留一份，并重算引用次数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='只统计不迁移')
+        parser.add_argument('--keep-originals', action='store_true', dest='keep_originals', help='迁移后保留原文件')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        migrated = {}
+        missing = []
+        rows = 0
+        for model, fields in referencing_models():
+            for field in fields:
+                legacy = (model._base_manager.exclude(**{f'{field}__startswith': 'blobs/'})
+                          .exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                          .values_list('pk', field))
+                for pk, name in legacy.iterator():
+                    path = pdf_blob_storage.path(name)
+                    if name not in migrated:
+                        if not os.path.isfile(path):
+                            missing.append(f'{model._meta.verbose_name} {pk} {field}: {name}')
+                            continue
+                        if dry_run:
+                            migrated[name] = None
+                        else:
+                            with open(path, 'rb') as f:
+                                # 以原文件名保存，可读文件名记录到 StoredBlob.original_name
+                                migrated[name] = pdf_blob_storage.save(os.path.basename(name), File(f))
+                    if not dry_run:
+                        # 直接更新字段，引用次数在最后统一重算
+                        model._base_manager.filter(pk=pk).update(**{field: migrated[name]})
+                    rows += 1
+
+        blobs = {name for name in migrated.values() if name}
+        self.stdout.write(f"引用记录 {rows} 条, 原文件 {len(migrated)} 个, 去重后 {len(blobs)} 个, 缺失 {len(missing)} 个")
+        for line in missing[:50]:
+            self.stdout.write(self.style.WARNING(f'文件缺失: {line}'))
+        if dry_run:
+            return
+
+        fixed = recount_blob_references()
+        removed = 0
+        if not options['keep_originals']:
+            for name in migrated:
+                if is_blob_name(name):
+                    continue
+                try:
+                    os.remove(pdf_blob_storage.path(name))
+                    removed += 1
+                except OSError as e:
+                    self.stdout.write(self.style.WARNING(f'删除原文件失败: {name}, {e}'))
+        self.stdout.write(self.style.SUCCESS(f'迁移完成: 修正引用次数 {fixed} 个, 删除原文件 {removed} 个'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from basedata.blob_storage import BLOB_PURGE_GRACE_SECONDS, purge_unreferenced_blobs, recount_blob_references
+
+
+class Command(BaseCommand):
+    help = '删除内容寻址存储中不再被引用或没有记录的图纸/工艺PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='只列出将删除的文件')
+        parser.add_argument('--recount', action='store_true', dest='recount', help='删除前按当前引用重算引用次数')
+        parser.add_argument('--grace', type=int, default=BLOB_PURGE_GRACE_SECONDS, dest='grace',
+                            help='引用为 0 或没有记录的文件至少保留的秒数')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(f"修正引用次数 {recount_blob_references()} 个")
+        names = purge_unreferenced_blobs(options['grace'], dry_run=options['dry_run'])
+        for name in names[:50]:
+            self.stdout.write(name)
+        action = '将删除' if options['dry_run'] else '已删除'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(names)} 个文件'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from basedata.media_index import reconcile_media_index
+
+
+class Command(BaseCommand):
+    help = '扫描媒体目录，修正媒体文件索引（新文件写入索引，已删除的文件标记为不存在）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directories', nargs='*', help='相对 MEDIA_ROOT 的子目录，如 drawings process_pdfs；默认扫描整个媒体目录')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = reconcile_media_index(options['directories'] or None)
+        self.stdout.write(self.style.SUCCESS(
+            f"索引完成: 文件 {stats['files']} 个, 标记为不存在 {stats['marked_missing']} 个, "
+            f"耗时 {time.monotonic() - started:.1f} 秒"
+        ))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import socket
+import os
+import time
+import logging
+
+from basedata.import_jobs import requeue_orphaned_jobs, work_once
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = '以独立进程执行后台导入任务队列（ImportJob），适合与Web进程分开部署'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            dest='once',
+            help='执行完当前排队的任务后退出',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            dest='poll_interval',
+            type=float,
+            default=getattr(settings, 'IMPORT_JOB_POLL_INTERVAL', 2),
+            help='队列为空时的轮询间隔秒数（默认：2）',
+        )
+
+    def handle(self, *args, **options):
+        once = options['once']
+        poll_interval = options['poll_interval']
+        worker_name = f"{socket.gethostname()}:{os.getpid()}:command"
+
+        self.stdout.write(f'导入任务工作进程已启动: {worker_name}')
+        logger.info(f'导入任务工作进程已启动: {worker_name}')
+
+        requeue_orphaned_jobs()
+        executed = 0
+        while True:
+            if work_once(worker_name):
+                executed += 1
+                continue
+            if once:
+                break
+            time.sleep(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS(f'执行完成! 共处理{executed}个导入任务'))
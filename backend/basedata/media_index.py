@@ -0,0 +1,136 @@
+"""
+媒体文件索引
+
+图纸等文件放在 NFS 共享目录上，逐个 os.path.exists 很慢。MediaFileIndex 记录每个已存储文件是否存在、大小和修改时间：
+- 通过存储后端（IndexedFileSystemStorage）上传/删除文件时同步更新索引；
+- 序列化器按页批量查询索引（lookup_media_files），索引中没有的文件才访问一次文件系统并补录；
+- reconcile_media_index 扫描媒体目录修正索引（管理命令 reconcile_media_index），用于清理脚本等绕过存储后端的改动。
+"""
+import datetime
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MediaFileIndex
+
+logger = logging.getLogger(__name__)
+
+# bulk_create / IN 查询每批的行数
+INDEX_BATCH_SIZE = 1000
+
+
+def _stat_media_file(name):
+    """访问文件系统，返回索引字段"""
+    try:
+        st = os.stat(os.path.join(settings.MEDIA_ROOT, name))
+    except OSError:
+        return {'exists': False, 'size': None, 'modified_at': None}
+    return {
+        'exists': True,
+        'size': st.st_size,
+        'modified_at': datetime.datetime.fromtimestamp(st.st_mtime, tz=datetime.timezone.utc),
+    }
+
+
+def _upsert(entries):
+    """按文件路径批量写入/更新索引，entries 为 {name: 字段字典}"""
+    now = timezone.now()
+    rows = [MediaFileIndex(name=name, checked_at=now, **fields) for name, fields in entries.items()]
+    # MySQL 使用 ON DUPLICATE KEY UPDATE，不支持（也不能传入）冲突字段；SQLite/PostgreSQL 必须指定
+    conflict_target = {'unique_fields': ['name']} if connection.features.supports_update_conflicts_with_target else {}
+    MediaFileIndex.objects.bulk_create(
+        rows, batch_size=INDEX_BATCH_SIZE, update_conflicts=True,
+        update_fields=['exists', 'size', 'modified_at', 'checked_at'], **conflict_target,
+    )
+
+
+def record_media_files(names):
+    """访问文件系统并更新指定文件的索引，返回 {name: 是否存在}"""
+    entries = {name: _stat_media_file(name) for name in set(names) if name}
+    if entries:
+        _upsert(entries)
+    return {name: fields['exists'] for name, fields in entries.items()}
+
+
+def lookup_media_files(names):
+    """
+    批量查询文件是否存在，一次查询索引；索引中没有的文件访问文件系统后补录
+    :return: {name: 是否存在}
+    """
+    names = [name for name in set(names) if name]
+    found = {}
+    for start in range(0, len(names), INDEX_BATCH_SIZE):
+        found.update(MediaFileIndex.objects.filter(name__in=names[start:start + INDEX_BATCH_SIZE])
+                     .values_list('name', 'exists'))
+    missing = [name for name in names if name not in found]
+    if missing:
+        try:
+            found.update(record_media_files(missing))
+        except DatabaseError as e:
+            # 补录失败不影响查询结果，下次再补录
+            logger.warning(f"补录媒体文件索引失败: {e}")
+            found.update({name: _stat_media_file(name)['exists'] for name in missing})
+    return found
+
+
+def reconcile_media_index(directories=None):
+    """
+    扫描媒体目录修正索引：目录中的文件写入/更新，索引中有但已不存在的文件标记为不存在
+    :param directories: 相对 MEDIA_ROOT 的子目录列表，默认整个 MEDIA_ROOT
+    :return: 统计字典
+    """
+    root = settings.MEDIA_ROOT
+    prefixes = [d.strip('/') for d in directories] if directories else ['']
+    on_disk = {}
+    for prefix in prefixes:
+        for dirpath, _, filenames in os.walk(os.path.join(root, prefix)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                on_disk[name] = {
+                    'exists': True,
+                    'size': st.st_size,
+                    'modified_at': datetime.datetime.fromtimestamp(st.st_mtime, tz=datetime.timezone.utc),
+                }
+
+    indexed = MediaFileIndex.objects.filter(exists=True)
+    if directories:
+        condition = Q()
+        for prefix in prefixes:
+            condition |= Q(name__startswith=f'{prefix}/')
+        indexed = indexed.filter(condition)
+    gone = [pk for pk, name in indexed.values_list('pk', 'name') if name not in on_disk]
+    for start in range(0, len(gone), INDEX_BATCH_SIZE):
+        MediaFileIndex.objects.filter(pk__in=gone[start:start + INDEX_BATCH_SIZE]).update(
+            exists=False, size=None, modified_at=None, checked_at=timezone.now()
+        )
+    _upsert(on_disk)
+    return {'files': len(on_disk), 'marked_missing': len(gone)}
+
+
+class IndexedFileSystemStorage(FileSystemStorage):
+    """上传/删除文件时同步更新媒体文件索引的文件系统存储；索引写入失败不影响文件操作"""
+
+    def _save(self, name, content):
+        name = super()._save(name, content)
+        try:
+            record_media_files([name])
+        except DatabaseError as e:
+            logger.warning(f"更新媒体文件索引失败: {name}, {e}")
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        try:
+            _upsert({name: {'exists': False, 'size': None, 'modified_at': None}})
+        except DatabaseError as e:
+            logger.warning(f"更新媒体文件索引失败: {name}, {e}")
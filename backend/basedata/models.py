@@ -4,6 +4,7 @@ from django.conf import settings
 from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 from django.utils import timezone
 from django.db.models import Max
+from .blob_storage import get_pdf_storage
 
 class Company(models.Model):
     name = models.CharField(max_length=100, verbose_name="公司名称")
@@ -37,8 +38,8 @@ class ProductCategory(models.Model):
     code = models.CharField(max_length=20, verbose_name="产品类代码")
     display_name = models.CharField(max_length=40, verbose_name="产品类名称")
     unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="默认单位")
-    drawing_pdf = models.FileField(upload_to='drawings/', null=True, blank=True, verbose_name="图纸PDF")
-    process_pdf = models.FileField(upload_to='drawings/', null=True, blank=True, verbose_name="工艺PDF")
+    drawing_pdf = models.FileField(upload_to='drawings/', storage=get_pdf_storage, null=True, blank=True, verbose_name="图纸PDF")
+    process_pdf = models.FileField(upload_to='drawings/', storage=get_pdf_storage, null=True, blank=True, verbose_name="工艺PDF")
     material_type = models.ForeignKey(MaterialType, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="材质")  # 新增
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
 
@@ -76,7 +77,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="价格")
     category = models.ForeignKey(ProductCategory, on_delete=models.CASCADE, verbose_name="所属产品类")
     unit = models.ForeignKey(Unit, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="单位")
-    drawing_pdf = models.FileField(upload_to='drawings/', null=True, blank=True, verbose_name="图纸PDF")
+    drawing_pdf = models.FileField(upload_to='drawings/', storage=get_pdf_storage, null=True, blank=True, verbose_name="图纸PDF")
     is_material = models.BooleanField(default=False, verbose_name="是否物料")
     material_type = models.ForeignKey(MaterialType, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="材质")  # 新增
     def __str__(self):
@@ -111,7 +112,7 @@ class ProcessCode(models.Model):
     code = models.CharField(max_length=100, verbose_name="工艺流程代码")
     description = models.CharField(max_length=200, blank=True, verbose_name="说明")
     version = models.CharField(max_length=20, verbose_name="版本")
-    process_pdf = models.FileField(upload_to='process_pdfs/', null=True, blank=True, verbose_name="工艺PDF")
+    process_pdf = models.FileField(upload_to='process_pdfs/', storage=get_pdf_storage, null=True, blank=True, verbose_name="工艺PDF")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
     class Meta:
@@ -240,4 +241,82 @@ class ProductAttachment(models.Model):
         ordering = ['-uploaded_at']
 
     def __str__(self):
-        return f'{self.filename} for {self.product.name}' 
\ No newline at end of file
+        return f'{self.filename} for {self.product.name}' 
+
+class ImportJob(models.Model):
+    """后台导入任务，上传文件后排队，由本地工作线程从数据库队列中领取执行；也用于不需要文件的维护任务（如文件清理）"""
+    STATUS_CHOICES = [
+        ('pending', '排队中'),
+        ('running', '执行中'),
+        ('completed', '已完成'),
+        ('failed', '失败'),
+    ]
+    kind = models.CharField(max_length=50, verbose_name="导入类型")
+    file = models.FileField(upload_to='import_jobs/', null=True, blank=True, verbose_name="导入文件")
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="原始文件名")
+    params = models.JSONField(default=dict, blank=True, verbose_name="任务参数")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True, verbose_name="状态")
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="总行数")
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name="已处理行数")
+    fail_count = models.PositiveIntegerField(default=0, verbose_name="失败行数")
+    fail_msgs = models.JSONField(default=list, blank=True, verbose_name="失败明细")
+    result = models.JSONField(null=True, blank=True, verbose_name="导入结果")
+    result_status = models.PositiveIntegerField(null=True, blank=True, verbose_name="结果状态码")
+    error = models.TextField(blank=True, verbose_name="错误信息")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="执行线程")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="创建人")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="心跳时间")
+
+    class Meta:
+        verbose_name = '导入任务'
+        verbose_name_plural = '导入任务'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind}#{self.pk} ({self.get_status_display()})"
+
+    @property
+    def rows_per_sec(self):
+        """按已处理行数和执行时长计算吞吐"""
+        if not self.started_at or not self.processed_rows:
+            return None
+        end = self.finished_at or timezone.now()
+        elapsed = (end - self.started_at).total_seconds()
+        return round(self.processed_rows / elapsed, 1) if elapsed > 0 else None
+
+
+class MediaFileIndex(models.Model):
+    """媒体文件索引：记录已存储文件是否存在及大小、修改时间，序列化器据此生成文件链接，无需逐个访问文件系统"""
+    name = models.CharField(max_length=255, unique=True, verbose_name="文件路径")
+    exists = models.BooleanField(default=True, verbose_name="是否存在")
+    size = models.BigIntegerField(null=True, blank=True, verbose_name="文件大小")
+    modified_at = models.DateTimeField(null=True, blank=True, verbose_name="修改时间")
+    checked_at = models.DateTimeField(auto_now=True, verbose_name="检查时间")
+
+    class Meta:
+        verbose_name = '媒体文件索引'
+        verbose_name_plural = '媒体文件索引'
+
+    def __str__(self):
+        return self.name
+
+
+class StoredBlob(models.Model):
+    """内容寻址存储的文件：同一内容只存一份，按引用次数回收（见 blob_storage.py）"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="SHA-256")
+    name = models.CharField(max_length=255, unique=True, verbose_name="存储路径")
+    size = models.BigIntegerField(default=0, verbose_name="文件大小")
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="原始文件名")
+    refcount = models.IntegerField(default=0, db_index=True, verbose_name="引用次数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        verbose_name = '存储文件'
+        verbose_name_plural = '存储文件'
+
+    def __str__(self):
+        return f"{self.original_name or self.name} ({self.refcount})"
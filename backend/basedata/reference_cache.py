@@ -0,0 +1,222 @@
+"""
+参考数据缓存（单位、工序、材质、公司）
+
+这几张表每周只改几次，但每个请求、每行导入都要查询。缓存分两级：
+- 进程内存：整表按主键排序的对象列表和 主键 -> 对象 字典，命中时不访问数据库和共享缓存；
+- 共享缓存（settings.CACHES，同一主机各 gunicorn 进程共用）：保存每张表的版本号和按版本号存放的整表数据。
+进程内存最多每 REFERENCE_CACHE_CHECK_SECONDS 秒比对一次共享缓存中的版本号，版本号变化才重新加载，
+因此任一进程（接口增删改、导入）写入后，其他进程在约 1 秒内看到新数据。
+写入通过模型信号在事务提交后更新版本号（见 connect_reference_cache_signals）；
+绕过信号的批量写入需调用 invalidate_reference_cache。
+缓存的对象在多个请求间共享，只能读取，修改请从数据库重新查询。
+"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.filters import SearchFilter
+from rest_framework.response import Response
+
+REFERENCE_CACHE_TIMEOUT = getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 86400)
+REFERENCE_CACHE_CHECK_SECONDS = getattr(settings, 'REFERENCE_CACHE_CHECK_SECONDS', 1)
+
+_VERSION_KEY = 'refdata:version:{kind}'
+_DATA_KEY = 'refdata:data:{kind}:{version}'
+
+# kind -> _Entry
+_memo = {}
+_deferred = threading.local()
+# 模型 -> kind，connect_reference_cache_signals 时填充
+_KIND_BY_MODEL = {}
+
+
+class _Entry:
+    __slots__ = ('version', 'checked_at', 'rows', 'by_id')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.rows = rows
+        self.by_id = {obj.pk: obj for obj in rows}
+
+
+def reference_models():
+    """缓存的参考数据表：kind -> 模型"""
+    from .models import Company, MaterialType, Process, Unit
+    return {
+        'unit': Unit,
+        'process': Process,
+        'material_type': MaterialType,
+        'company': Company,
+    }
+
+
+def _current_version(kind):
+    key = _VERSION_KEY.format(kind=kind)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _entry(kind):
+    entry = _memo.get(kind)
+    if entry is not None and time.monotonic() - entry.checked_at < REFERENCE_CACHE_CHECK_SECONDS:
+        return entry
+    version = _current_version(kind)
+    if entry is not None and entry.version == version:
+        entry.checked_at = time.monotonic()
+        return entry
+    data_key = _DATA_KEY.format(kind=kind, version=version)
+    rows = cache.get(data_key)
+    if rows is None:
+        rows = list(reference_models()[kind]._base_manager.order_by('pk'))
+        cache.set(data_key, rows, REFERENCE_CACHE_TIMEOUT)
+    entry = _Entry(version, rows)
+    _memo[kind] = entry
+    return entry
+
+
+def reference_list(kind):
+    """整表对象列表（按主键排序），只读"""
+    return _entry(kind).rows
+
+
+def get_reference(kind, pk):
+    """按主键取缓存对象，不存在返回 None"""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    return _entry(kind).by_id.get(pk)
+
+
+def _bump(kinds):
+    for kind in kinds:
+        cache.set(_VERSION_KEY.format(kind=kind), uuid.uuid4().hex, None)
+        _memo.pop(kind, None)
+
+
+def invalidate_reference_cache(*kinds):
+    """参考数据变更后调用（默认全部），在事务提交后更新版本号"""
+    kinds = set(kinds or reference_models())
+    pending = getattr(_deferred, 'kinds', None)
+    if pending is not None:
+        pending.update(kinds)
+        return
+    # 本进程立即丢弃旧数据，避免同一请求/导入内读到写入前的对象
+    for kind in kinds:
+        _memo.pop(kind, None)
+    transaction.on_commit(lambda: _bump(kinds))
+
+
+@contextmanager
+def deferred_reference_invalidation():
+    """逐行导入时合并为一次失效：块内的变更在退出时统一更新版本号"""
+    if getattr(_deferred, 'kinds', None) is not None:
+        yield
+        return
+    _deferred.kinds = set()
+    try:
+        yield
+    finally:
+        kinds, _deferred.kinds = _deferred.kinds, None
+        if kinds:
+            invalidate_reference_cache(*kinds)
+
+
+def _on_reference_change(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    kind = _KIND_BY_MODEL.get(sender)
+    if kind:
+        invalidate_reference_cache(kind)
+
+
+def connect_reference_cache_signals():
+    """在 AppConfig.ready 中调用"""
+    for kind, model in reference_models().items():
+        _KIND_BY_MODEL[model] = kind
+        uid = f'reference_cache_{kind}'
+        post_save.connect(_on_reference_change, sender=model, dispatch_uid=f'{uid}_post_save')
+        post_delete.connect(_on_reference_change, sender=model, dispatch_uid=f'{uid}_post_delete')
+
+
+class CachedReferenceViewSetMixin:
+    """
+    参考数据视图集：列表（含 search 参数）和详情直接从缓存返回，其他查询参数（ordering、过滤字段）仍查询数据库
+    子类设置 reference_kind
+    """
+    reference_kind = None
+
+    def _cache_query_params(self):
+        allowed = {'format'}
+        paginator = self.paginator
+        if paginator is not None:
+            allowed.update(filter(None, [getattr(paginator, 'page_query_param', None),
+                                         getattr(paginator, 'page_size_query_param', None)]))
+        if getattr(self, 'search_fields', None):
+            allowed.add('search')
+        return allowed
+
+    def _cached_objects(self):
+        if not set(self.request.query_params) <= self._cache_query_params():
+            return None
+        objects = list(reference_list(self.reference_kind))
+        # 与视图集查询集的排序一致
+        ordering = list(self.queryset.query.order_by) or list(self.queryset.model._meta.ordering)
+        for field in reversed(ordering):
+            name = field.lstrip('-')
+            objects.sort(key=lambda obj: (getattr(obj, name) is None, getattr(obj, name) or ''),
+                         reverse=field.startswith('-'))
+        search = self.request.query_params.get('search')
+        if search:
+            terms = [term.casefold() for term in SearchFilter().get_search_terms(self.request)]
+            objects = [
+                obj for obj in objects
+                if all(any(term in str(getattr(obj, f) or '').casefold() for f in self.search_fields) for term in terms)
+            ]
+        return objects
+
+    def list(self, request, *args, **kwargs):
+        objects = self._cached_objects()
+        if objects is None:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(objects)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(objects, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        obj = get_reference(self.reference_kind, kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if obj is None:
+            return super().retrieve(request, *args, **kwargs)
+        self.check_object_permissions(request, obj)
+        return Response(self.get_serializer(obj).data)
+
+
+class CachedReferenceNestedMixin:
+    """
+    嵌套序列化器按外键ID从缓存取对象，不触发外键查询；已 select_related 的外键直接使用
+    子类设置 reference_kind
+    """
+    reference_kind = None
+
+    def get_attribute(self, instance):
+        if len(self.source_attrs) == 1:
+            field = getattr(type(instance), self.source_attrs[0], None)
+            field = getattr(field, 'field', None)
+            if field is not None and field.many_to_one and not field.is_cached(instance):
+                pk = getattr(instance, field.attname)
+                if pk is None:
+                    return None
+                obj = get_reference(self.reference_kind, pk)
+                if obj is not None:
+                    return obj
+        return super().get_attribute(instance)
@@ -1,22 +1,29 @@
-import os
-from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
-from .models import MaterialType,ProductCategory, CategoryParam, Product,ProductAttachment, ProductParamValue, Company, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Customer, Material, Unit, ProductCategoryProcessCode, CategoryMaterialRule, CategoryMaterialRuleParam
+from .models import ImportJob, MaterialType,ProductCategory, CategoryParam, Product,ProductAttachment, ProductParamValue, Company, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Customer, Material, Unit, ProductCategoryProcessCode, CategoryMaterialRule, CategoryMaterialRuleParam
 from utils.tools import convert_image_to_pdf
+from .media_index import lookup_media_files
+from .reference_cache import CachedReferenceNestedMixin
 
 # Define Nested Serializers First
-class CompanyNestedSerializer(serializers.ModelSerializer):
+# 嵌套的公司/单位/材质从参考数据缓存读取，不触发外键查询
+class CompanyNestedSerializer(CachedReferenceNestedMixin, serializers.ModelSerializer):
+    reference_kind = 'company'
+
     class Meta:
         model = Company
         fields = ['id', 'name', 'code']
 
-class UnitNestedSerializer(serializers.ModelSerializer):
+class UnitNestedSerializer(CachedReferenceNestedMixin, serializers.ModelSerializer):
+    reference_kind = 'unit'
+
     class Meta:
         model = Unit
         fields = ['id', 'name', 'code']
 
-class MaterialTypeNestedSerializer(serializers.ModelSerializer):
+class MaterialTypeNestedSerializer(CachedReferenceNestedMixin, serializers.ModelSerializer):
+    reference_kind = 'material_type'
+
     class Meta:
         model = MaterialType
         fields = ['id', 'name', 'code']
@@ -262,18 +269,30 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'code', 'name', 'price', 'category', 'category_display_name', 'unit', 'unit_name', 'param_values', 'drawing_pdf', 'drawing_pdf_url', 'is_material', 'material_type','attachments']
 
+    def _drawing_exists(self, name):
+        """查询媒体文件索引判断图纸是否存在；列表序列化时首次调用即批量查询整页产品及产品类的图纸"""
+        known = self.context.setdefault('_drawing_pdf_exists', {})
+        if name not in known:
+            names = {name}
+            products = getattr(self.parent, 'instance', None)
+            if products is not None and not isinstance(products, Product):
+                for product in products:
+                    names.add(product.drawing_pdf.name)
+                    if product.category_id:
+                        names.add(product.category.drawing_pdf.name)
+            known.update(lookup_media_files(names - set(known)))
+        return known.get(name, False)
+
     def get_drawing_pdf(self, obj):
         request = self.context.get('request') if hasattr(self, 'context') else None
         if obj.drawing_pdf and hasattr(obj.drawing_pdf, 'url') and obj.drawing_pdf.name:
-            file_path = os.path.join(settings.MEDIA_ROOT, obj.drawing_pdf.name)
-            if os.path.exists(file_path):
+            if self._drawing_exists(obj.drawing_pdf.name):
                 url = obj.drawing_pdf.url
                 if request and not url.startswith('http'):
                     return request.build_absolute_uri(url)
                 return url
         if obj.category and obj.category.drawing_pdf and hasattr(obj.category.drawing_pdf, 'url') and obj.category.drawing_pdf.name:
-            file_path = os.path.join(settings.MEDIA_ROOT, obj.category.drawing_pdf.name)
-            if os.path.exists(file_path):
+            if self._drawing_exists(obj.category.drawing_pdf.name):
                 url = obj.category.drawing_pdf.url
                 if request and not url.startswith('http'):
                     return request.build_absolute_uri(url)
@@ -434,3 +453,15 @@ class CategoryMaterialRuleSerializer(serializers.ModelSerializer):
                  'target_category', 'target_category_name', 'target_category_code',
                  'created_at', 'updated_at', 'param_expressions']
 
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    rows_per_sec = serializers.FloatField(read_only=True)
+    created_by_name = serializers.CharField(source='created_by.username', read_only=True, allow_null=True)
+
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'kind', 'original_name', 'params', 'status', 'status_display', 'total_rows', 'processed_rows',
+                  'rows_per_sec', 'fail_count', 'fail_msgs', 'result', 'result_status', 'error',
+                  'created_by', 'created_by_name', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
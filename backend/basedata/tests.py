@@ -1,3 +1,650 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import time
+import urllib.parse
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from utils.authentication import IsAdminUser
+
+from .blob_storage import purge_unreferenced_blobs
+from .file_gc import GC_MIN_AGE_SECONDS, collect_garbage
+from .media_index import reconcile_media_index
+from . import reference_cache
+from .models import (
+    CategoryParam, Company, ImportJob, Material, MaterialType, MediaFileIndex, Product, ProductCategory, ProductParamValue, StoredBlob, Unit,
+)
+
+
+class DrawingPdfIndexTests(TestCase):
+    """产品列表按媒体文件索引判断图纸是否存在，不逐个访问文件系统"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        company = Company.objects.create(name='测试公司', code='T')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        category.drawing_pdf.save('C1-T-图纸.pdf', ContentFile(b'%PDF-1.4 C1'))
+        self.category = category
+        for i in range(5):
+            product = Product.objects.create(code=f'P{i}', name=f'产品{i}', price=1, category=category)
+            if i % 2:
+                product.drawing_pdf.save(f'P{i}-图纸.pdf', ContentFile(f'%PDF-1.4 P{i}'.encode()))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('u', password='x'))
+
+    def test_upload_indexes_and_list_skips_filesystem(self):
+        self.assertEqual(MediaFileIndex.objects.filter(exists=True).count(), 3)
+        with mock.patch('basedata.media_index.os.stat', side_effect=AssertionError('不应访问文件系统')):
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        urls = {p['code']: p['drawing_pdf_url'] for p in response.data['results']}
+        self.assertTrue(urls['P1'].endswith(Product.objects.get(code='P1').drawing_pdf.url))
+        self.assertTrue(urls['P0'].endswith(self.category.drawing_pdf.url))
+
+    def test_upsert_omits_conflict_target_on_mysql(self):
+        from django.db import connection
+        from .media_index import _upsert
+
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(MediaFileIndex.objects, 'bulk_create') as bulk_create:
+            _upsert({'drawings/a.pdf': {'exists': True, 'size': 1, 'modified_at': None}})
+        self.assertNotIn('unique_fields', bulk_create.call_args.kwargs)
+        self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+
+    def test_lookup_falls_back_to_filesystem_when_index_write_fails(self):
+        from django.db import DatabaseError
+        from .media_index import lookup_media_files
+
+        name = Product.objects.get(code='P1').drawing_pdf.name
+        MediaFileIndex.objects.all().delete()
+        with mock.patch('basedata.media_index._upsert', side_effect=DatabaseError('not supported')):
+            self.assertEqual(lookup_media_files([name, 'drawings/none.pdf']), {name: True, 'drawings/none.pdf': False})
+
+    def test_reconcile_marks_removed_files(self):
+        name = Product.objects.get(code='P1').drawing_pdf.name
+        os.remove(os.path.join(self.media_root, name))
+        stats = reconcile_media_index(['blobs'])
+        self.assertEqual(stats, {'files': 2, 'marked_missing': 1})
+        self.assertFalse(MediaFileIndex.objects.get(name=name).exists)
+        response = self.client.get('/api/products/')
+        urls = {p['code']: p['drawing_pdf_url'] for p in response.data['results']}
+        self.assertTrue(urls['P1'].endswith(self.category.drawing_pdf.url))
+
+
+class PdfViewTests(TestCase):
+    """图纸PDF在线查看：Range 分段读取、ETag/Last-Modified 条件请求、越界范围 416"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, PDF_X_ACCEL_REDIRECT_PREFIX='')
+        override.enable()
+        self.addCleanup(override.disable)
+        os.makedirs(os.path.join(self.media_root, 'drawings'))
+        self.content = b'%PDF-1.4\n' + bytes(range(256)) * 1000
+        with open(os.path.join(self.media_root, 'drawings', 'C1-T-图纸.pdf'), 'wb') as f:
+            f.write(self.content)
+
+    def get(self, path='drawings/C1-T-图纸.pdf', **headers):
+        from django.test import RequestFactory
+        from utils.tools import pdf_view
+        return pdf_view(RequestFactory().get('/attachment/', **headers), path)
+
+    def body(self, response):
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return content
+
+    def test_full_file_and_conditional_requests(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.body(response), self.content)
+
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_ranges(self):
+        size = len(self.content)
+        response = self.get(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{size}')
+        self.assertEqual(self.body(response), self.content[100:200])
+
+        response = self.get(HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.body(response), self.content[-10:])
+        response = self.get(HTTP_RANGE=f'bytes={size - 5}-')
+        self.assertEqual(response['Content-Length'], '5')
+        self.body(response)
+
+        response = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+        # 多段 Range 不支持，If-Range 不匹配时返回完整文件
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,5-6'}, {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"stale"'}):
+            response = self.get(**headers)
+            self.assertEqual(response.status_code, 200)
+            self.body(response)
+
+    def test_rejects_missing_and_outside_files(self):
+        from django.http import Http404
+        with open(os.path.join(self.media_root, 'outside.pdf'), 'wb') as f:
+            f.write(self.content)
+        for path in ('drawings/none.pdf', '../outside.pdf', 'drawings/../../outside.pdf'):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+    @override_settings(PDF_X_ACCEL_REDIRECT_PREFIX='/protected/')
+    def test_x_accel_redirect(self):
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/drawings/' + urllib.parse.quote('C1-T-图纸.pdf'))
+        self.assertEqual(response.content, b'')
+
+
+class PdfBlobStorageTests(TestCase):
+    """图纸按内容只存一份，引用次数随模型保存/删除增减"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.category = ProductCategory.objects.create(
+            company=Company.objects.create(name='测试公司', code='T'), code='C1', display_name='轴'
+        )
+
+    def test_duplicate_uploads_share_one_blob(self):
+        products = [Product.objects.create(code=f'P{i}', name='轴', price=1, category=self.category) for i in range(3)]
+        for product in products:
+            product.drawing_pdf.save(f'{product.code}-图纸.pdf', ContentFile(b'%PDF-1.4 same'))
+        names = {p.drawing_pdf.name for p in products}
+        self.assertEqual(len(names), 1)
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.name, blob.original_name, blob.refcount), (names.pop(), 'P0-图纸.pdf', 3))
+
+        products[0].drawing_pdf.save('P0-图纸.pdf', ContentFile(b'%PDF-1.4 new'))
+        products[1].delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        Material.objects.filter(pk=products[2].pk).get().delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 0)
+        self.assertEqual(purge_unreferenced_blobs(grace_seconds=0), [blob.name])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, blob.name)))
+
+    def test_rolled_back_uploads_purged_unless_reused(self):
+        from django.db import transaction
+
+        product = Product.objects.create(code='P1', name='轴', price=1, category=self.category)
+        names = []
+        for content in (b'%PDF-1.4 reused', b'%PDF-1.4 orphan'):
+            with self.assertRaises(ValueError), transaction.atomic():
+                product.drawing_pdf.save('P1-图纸.pdf', ContentFile(content))
+                raise ValueError('回滚')
+            names.append(product.drawing_pdf.name)
+        reused, orphan = names
+        # 回滚后文件留下而记录撤销；保留期内不清理
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(purge_unreferenced_blobs(), [])
+
+        old = time.time() - 2 * 3600
+        for name in names:
+            os.utime(os.path.join(self.media_root, name), (old, old))
+        # 同样内容重新上传时复用文件并刷新修改时间，不会被当作无记录文件删除
+        product.refresh_from_db()
+        product.drawing_pdf.save('P1-图纸.pdf', ContentFile(b'%PDF-1.4 reused'))
+        self.assertEqual(product.drawing_pdf.name, reused)
+        self.assertGreater(os.stat(os.path.join(self.media_root, reused)).st_mtime, old)
+        self.assertEqual(purge_unreferenced_blobs(), [orphan])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, orphan)))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, reused)))
+
+    def test_purge_skips_blob_reused_before_lock(self):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        storage = Product.drawing_pdf.field.storage
+        name = storage.save('a.pdf', ContentFile(b'%PDF-1.4 same'))
+        StoredBlob.objects.filter(name=name).update(updated_at=timezone.now() - timedelta(hours=2))
+        # 上传先刷新记录时间再检查文件，清理加锁复查时跳过该记录
+        self.assertEqual(storage.save('b.pdf', ContentFile(b'%PDF-1.4 same')), name)
+        self.assertEqual(purge_unreferenced_blobs(), [])
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+
+class FileGarbageCollectorTests(TestCase):
+    """孤儿文件清理：一次扫描，保留被引用文件和每组最新备份"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        drawings = os.path.join(self.media_root, 'drawings')
+        os.makedirs(drawings)
+        old = time.time() - 2 * GC_MIN_AGE_SECONDS
+        for name in ['C1-1.pdf', 'C1-2.pdf', 'C1-3.pdf', 'C1_abcdefg.pdf', 'other.pdf', 'ref.pdf', 'fresh_abcdefg.pdf']:
+            path = os.path.join(drawings, name)
+            with open(path, 'wb') as f:
+                f.write(b'%PDF-1.4')
+            if not name.startswith('fresh'):
+                os.utime(path, (old, old))
+        company = Company.objects.create(name='测试公司', code='T')
+        ProductCategory.objects.create(company=company, code='C1', display_name='轴', drawing_pdf='drawings/ref.pdf')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', password='x', is_staff=True))
+
+    def test_cleanup_files_keeps_referenced_and_latest_backup(self):
+        response = self.client.post('/api/product-categories/cleanup-files/', {'dry_run': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted_files'], ['C1-1.pdf', 'C1-2.pdf', 'C1_abcdefg.pdf'])
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'drawings'))), 7)
+
+        report = collect_garbage(['drawings'], dry_run=False)
+        self.assertEqual(report['deleted_files'], ['drawings/C1-1.pdf', 'drawings/C1-2.pdf',
+                                                   'drawings/C1_abcdefg.pdf', 'drawings/other.pdf'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'drawings'))),
+                         ['C1-3.pdf', 'fresh_abcdefg.pdf', 'ref.pdf'])
+        self.assertFalse(MediaFileIndex.objects.get(name='drawings/other.pdf').exists)
+
+    def test_rejects_directories_outside_uploads_and_non_admin(self):
+        for directories in (['..'], ['drawings/..'], [self.media_root], ['/etc'], ['blobs']):
+            with self.assertRaises(ValueError):
+                collect_garbage(directories, dry_run=True, min_age=0)
+            response = self.client.post('/api/import-jobs/', {
+                'kind': 'file_gc', 'params': {'directories': directories, 'dry_run': False},
+            }, format='json')
+            self.assertEqual(response.status_code, 400, directories)
+        self.assertFalse(ImportJob.objects.exists())
+
+        # 非管理员被拒绝（异常处理器把权限错误统一返回为 400）
+        self.client.force_authenticate(User.objects.create_user('u', password='x'))
+        for url, data in [('/api/import-jobs/', {'kind': 'file_gc', 'params': {'dry_run': False}}),
+                          ('/api/product-categories/cleanup-files/', {'dry_run': '0'})]:
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(str(IsAdminUser.message), str(response.data))
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'drawings'))), 7)
+
+
+@override_settings(IMPORT_JOB_WORKERS=0)
+class ImportJobQueueTests(TestCase):
+    """后台导入队列：提交立即返回，任务只被领取一次，心跳超时的任务重新排队"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('importer', password='x'))
+
+    def test_submit_claim_and_run(self):
+        from .import_jobs import claim_next_job, run_job
+
+        upload = SimpleUploadedFile('units.csv', 'code,name\nPCS,件\nKG,千克\n,无编码\n'.encode('utf-8'))
+        response = self.client.post('/api/import-jobs/', {'kind': 'units', 'file': upload})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertFalse(Unit.objects.exists())
+
+        job = claim_next_job('w1')
+        self.assertEqual((job.pk, job.status, job.worker), (response.data['id'], 'running', 'w1'))
+        self.assertIsNone(claim_next_job('w2'))
+
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result_status, job.processed_rows), ('completed', 200, 3))
+        self.assertEqual(sorted(Unit.objects.values_list('code', flat=True)), ['KG', 'PCS'])
+        # 结果落库后删除上传文件
+        self.assertFalse(job.file)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'import_jobs')), [])
+
+    def test_stale_running_job_requeued(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .import_jobs import claim_next_job
+
+        job = ImportJob.objects.create(kind='units', status='running', worker='dead',
+                                       heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(claim_next_job('w1').pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.worker, 'w1')
+
+    def test_orphaned_jobs_requeued_and_workers_started_by_server(self):
+        import socket
+        import sys
+        from django.utils import timezone
+        from . import import_jobs
+
+        host = socket.gethostname()
+        dead = ImportJob.objects.create(kind='units', status='running', worker=f'{host}:999999:import-0',
+                                        heartbeat_at=timezone.now())
+        own = ImportJob.objects.create(kind='units', status='running', worker=f'{host}:{os.getpid()}:import-0',
+                                       heartbeat_at=timezone.now())
+        with mock.patch.object(import_jobs, '_pid_alive', return_value=False):
+            self.assertEqual(import_jobs.requeue_orphaned_jobs(), 1)
+        self.assertEqual(ImportJob.objects.get(pk=dead.pk).status, 'pending')
+        self.assertEqual(ImportJob.objects.get(pk=own.pk).status, 'running')
+
+        # 只有服务进程启动工作线程，管理命令不启动
+        for argv, started in ([['manage.py', 'migrate'], False], [['manage.py', 'runserver'], False],
+                              [['/srv/venv/bin/gunicorn', 'wsgi:application'], True]):
+            with mock.patch.object(sys, 'argv', argv), mock.patch.object(import_jobs, 'ensure_workers') as ensure:
+                import_jobs.start_workers_on_startup()
+            self.assertEqual(ensure.called, started, argv)
+
+    def test_unknown_kind_rejected(self):
+        response = self.client.post('/api/import-jobs/', {'kind': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ImportReaderTests(TestCase):
+    """导入文件逐行读取：表头和空值处理与 pandas 一致，行号按表格位置"""
+
+    def _xlsx(self, rows):
+        from openpyxl import Workbook
+        wb = Workbook()
+        for row in rows:
+            wb.active.append(row)
+        output = io.BytesIO()
+        wb.save(output)
+        return SimpleUploadedFile('data.xlsx', output.getvalue())
+
+    def test_xlsx_rows(self):
+        from .import_reader import open_import_reader
+
+        upload = self._xlsx([
+            ['code', 'qty', None, 'code', 'price', None],
+            ['A', 2.0, 'x', 'B', 1.5],
+            [None, None, None, None, None],
+            ['', 3, None, None, None, None],
+        ])
+        with open_import_reader(upload) as reader:
+            self.assertEqual(reader.columns, ['code', 'qty', 'Unnamed: 2', 'code.1', 'price'])
+            self.assertIsNotNone(reader.first_column('material', 'price'))
+            rows = list(reader.rows())
+        self.assertEqual([row.row_no for row in rows], [1, 3])
+        self.assertEqual(rows[0].values, ('A', 2, 'x', 'B', 1.5))
+        self.assertIsInstance(rows[0]['qty'], int)
+        self.assertIsNone(rows[1]['code'])
+        self.assertEqual(rows[1].get('code', '-'), '-')
+        self.assertEqual(reader.total_rows, 3)
+
+    def test_csv_batches(self):
+        from .import_reader import open_import_reader
+
+        content = 'code,name\n' + ''.join(f'C{i},名称{i}\n' for i in range(5))
+        with open_import_reader(SimpleUploadedFile('data.csv', content.encode('utf-8')), batch_size=2) as reader:
+            self.assertEqual(reader.total_rows, 5)
+            batches = list(reader.batches())
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[-1][0]['name'], '名称4')
+        self.assertEqual(batches[-1][0].row_no, 5)
+
+    def test_unreadable_file(self):
+        from .import_reader import ImportFileError, open_import_reader
+
+        with self.assertRaises(ImportFileError) as ctx:
+            open_import_reader(SimpleUploadedFile('data.xlsx', b'not a workbook'))
+        self.assertIn('文件解析失败', ctx.exception.payload['msg'])
+
+
+class ReferenceCacheTests(TestCase):
+    """单位/公司等参考数据缓存：缓存命中时不查询数据库，写入后版本号失效"""
+
+    def setUp(self):
+        cache.clear()
+        reference_cache._memo.clear()
+        self.addCleanup(reference_cache._memo.clear)
+        self.company = Company.objects.create(name='测试公司', code='T')
+        self.unit = Unit.objects.create(code='PCS', name='件')
+        for i in range(3):
+            ProductCategory.objects.create(company=self.company, unit=self.unit, code=f'C{i}', display_name='轴')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('u', password='x'))
+
+    def test_lists_served_from_cache_and_invalidated_on_write(self):
+        self.client.get('/api/units/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/units/', {'search': 'pc'})
+        self.assertEqual([u['code'] for u in response.data['results']], ['PCS'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/units/', {'code': 'KG', 'name': '千克'})
+        version = cache.get('refdata:version:unit')
+        response = self.client.get('/api/units/')
+        self.assertEqual([u['code'] for u in response.data['results']], ['KG', 'PCS'])
+        # 其他进程在下一次版本比对时看到新版本号
+        self.assertEqual(reference_cache._memo['unit'].version, version)
+
+    def test_nested_references_do_not_join(self):
+        self.client.get('/api/product-categories/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/product-categories/')
+        first = response.data['results'][0]
+        self.assertEqual((first['company']['name'], first['unit']['code']), ('测试公司', 'PCS'))
+
+
+class ExportTests(TestCase):
+    """流式导出：查询数不随行数增长，导出文件可直接重新导入"""
+
+    def setUp(self):
+        company = Company.objects.create(name='测试公司')
+        self.unit = Unit.objects.create(code='PCS', name='件')
+        for i in range(5):
+            category = ProductCategory.objects.create(company=company, code=f'C{i}', display_name=f'轴{i}')
+            length = CategoryParam.objects.create(category=category, name='长度')
+            diameter = CategoryParam.objects.create(category=category, name='直径')
+            for j in range(3):
+                product = Product.objects.create(
+                    code=f'C{i}-{j}-{j * 2}', name=f'轴{i}-{j}-{j * 2}', price=j, category=category, unit=self.unit,
+                )
+                ProductParamValue.objects.create(product=product, param=length, value=str(j))
+                ProductParamValue.objects.create(product=product, param=diameter, value=str(j * 2))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('u', password='x'))
+
+    def _rows(self, response):
+        from openpyxl import load_workbook
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        return list(load_workbook(io.BytesIO(content), read_only=True).active.values)
+
+    def test_export_params_query_count(self):
+        response = self.client.get('/api/product-categories/export-params/')
+        with self.assertNumQueries(2):
+            rows = self._rows(response)
+        self.assertEqual(rows[0], ('产品类', '参数项'))
+        self.assertEqual(rows[1], ('C0 - 轴0', '直径, 长度'))
+        self.assertEqual(len(rows), 6)
+
+    def test_exported_products_reimport(self):
+        response = self.client.get('/api/products/export/')
+        with self.assertNumQueries(2):
+            content = b''.join(response.streaming_content)
+        exported = sorted(Product.objects.values_list('code', 'name', 'price'))
+        Product.objects.all().delete()
+
+        upload = SimpleUploadedFile('products.xlsx', content)
+        response = self.client.post('/api/products/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.data['success'], 15, response.data)
+        self.assertEqual(sorted(Product.objects.values_list('code', 'name', 'price')), exported)
+        self.assertEqual(Product.objects.filter(unit=self.unit).count(), 15)
+
+
+class ImportTests(TestCase):
+    """导入接口：行级失败不影响其他行，结果与逐行导入一致"""
+
+    def setUp(self):
+        cache.clear()
+        reference_cache._memo.clear()
+        self.addCleanup(reference_cache._memo.clear)
+        company = Company.objects.create(name='测试公司')
+        self.unit = Unit.objects.create(code='PCS', name='件')
+        self.category = ProductCategory.objects.create(company=company, code='M1', display_name='圆钢')
+        CategoryParam.objects.create(category=self.category, name='直径')
+
+    def _import(self, kind, content, name='import.csv'):
+        from .importers import run_importer
+        payload, status_code = run_importer(kind, SimpleUploadedFile(name, content.encode('utf-8')))
+        self.assertEqual(status_code, 200, payload)
+        return payload
+
+    def test_import_materials_with_unit_and_params(self):
+        payload = self._import('materials', (
+            'code,name,price,category_code,unit_code,直径\n'
+            'M1-20,圆钢20,1.5,M1,PCS,20\n'
+            'M1-30,,2,M1,,30\n'
+            'M1-40,圆钢40,2,M1,KG,40\n'
+            'X-1,未知,1,NOPE,PCS,1\n'
+        ))
+        self.assertEqual((payload['success'], payload['fail']), (2, 2), payload['fail_msgs'])
+        self.assertIn('找不到单位编码: KG', payload['fail_msgs'][0])
+        self.assertIn('找不到物料类别代码: NOPE', payload['fail_msgs'][1])
+        material = Product.objects.get(code='M1-20')
+        self.assertTrue(material.is_material)
+        self.assertEqual(material.unit, self.unit)
+        self.assertEqual(material.param_values.get().value, '20')
+        # 名称为空时使用类别名称
+        self.assertEqual(Product.objects.get(code='M1-30').name, '圆钢')
+        self.assertIsNone(Product.objects.get(code='M1-30').unit)
+
+    def test_bulk_import_products_creates_updates_and_reports_rows(self):
+        from .importers import bulk_import_products
+        from .import_reader import open_import_reader
+
+        Product.objects.create(code='M1-10-L', name='旧名称', price=1, category=self.category)
+        content = (
+            'category_code,param_items,param_values,price,unit_code\n'
+            'M1,"直径,长度","10,L",2.5,PCS\n'
+            'M1,"直径,长度","20,L",3,\n'
+            'M1,"直径,长度","20,L",4,\n'
+            'M1,直径,"30,L",1,\n'
+            'NOPE,直径,1,1,\n'
+            'M1,直径,40,1,KG\n'
+        )
+        # 块大小 2：跨块的重复代码和引用缓存也要正确
+        with open_import_reader(SimpleUploadedFile('p.csv', content.encode('utf-8'))) as reader:
+            payload = bulk_import_products(reader, chunk_size=2)
+        self.assertEqual((payload['total'], payload['success'], payload['fail'], payload['skipped']), (6, 2, 3, 1))
+        self.assertEqual(payload['duplicate_codes'], ['M1-20-L'])
+        self.assertEqual(payload['processed_data']['M1-10-L']['action'], '更新')
+        self.assertEqual(payload['processed_data']['M1-20-L']['action'], '新增')
+        self.assertEqual([m.split(':')[0] for m in payload['fail_msgs']], ['第4行', '第5行', '第6行'])
+
+        product = Product.objects.get(code='M1-10-L')
+        self.assertEqual((product.name, product.price, product.unit), ('圆钢-10-L', 2.5, self.unit))
+        self.assertEqual(dict(product.param_values.values_list('param__name', 'value')), {'直径': '10', '长度': 'L'})
+        # 缺失的参数项自动创建
+        self.assertTrue(CategoryParam.objects.filter(category=self.category, name='长度').exists())
+        self.assertEqual(Product.objects.get(code='M1-20-L').price, 3)
+
+    def test_import_categories_resolves_references_in_memory(self):
+        from .importers import run_importer
+
+        steel = MaterialType.objects.create(name='45钢', code='S45')
+        MaterialType.objects.create(name='铝', code='AL')
+        content = (
+            'code,display_name,company,材质,单位\n'
+            f'C1,轴,测试公司,{steel.pk},件\n'
+            'C2,套,测试公司,铝,pcs\n'
+            'C3,盘,测试公司,s45 ,\n'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            payload = self._import('categories', content)
+        # 公司/单位/材质整表各查询一次，逐行解析不再查库
+        for table in ('basedata_company', 'basedata_unit', 'basedata_materialtype'):
+            self.assertEqual(sum(f'FROM {connection.ops.quote_name(table)}' in q['sql'] for q in queries), 1, table)
+        self.assertEqual(payload['success'], 3)
+        categories = {c.code: c for c in ProductCategory.objects.select_related('material_type', 'unit')}
+        self.assertEqual((categories['C1'].material_type, categories['C1'].unit), (steel, self.unit))
+        self.assertEqual((categories['C2'].material_type.code, categories['C2'].unit), ('AL', self.unit))
+        self.assertEqual((categories['C3'].material_type, categories['C3'].unit), (steel, None))
+
+        payload, status_code = run_importer('categories', SimpleUploadedFile('c.csv', (
+            'code,display_name,company,材质,单位\n'
+            'C4,轴,没有的公司,铜,吨\n'
+        ).encode('utf-8')))
+        self.assertEqual(status_code, 400)
+        self.assertEqual(payload['errors'], {1: '找不到公司: 没有的公司; 材质未找到: 铜; 单位未找到: 吨'})
+
+    def test_import_boms_groups_rows_and_replaces_items(self):
+        from .models import BOM, BOMItem
+
+        product = Product.objects.create(code='P1', name='轴', price=1, category=self.category)
+        Product.objects.create(code='P2', name='套', price=1, category=self.category)
+        steel, bolt, old = (Product.objects.create(code=code, name=code, price=1, category=self.category, is_material=True)
+                            for code in ('M-ST', 'M-BT', 'M-OLD'))
+        bom = BOM.objects.create(product=product, name='标准', version='1')
+        BOMItem.objects.create(bom=bom, material=old, quantity=1)
+
+        payload = self._import('boms', (
+            'product_code,name,version,material_code,quantity,remark\n'
+            'P1,标准,1,M-ST,1.255,下料\n'
+            'P1,标准,1,M-BT,4,\n'
+            'P1,标准,1,M-ST,2,\n'
+            'P2,标准,1,M-ST,abc,\n'
+            'P2,标准,1,P1,1,\n'
+            'NOPE,标准,1,M-ST,1,\n'
+            'P2,新版,2,M-BT,1e9,\n'
+            'P2,新版,2,M-ST,3,\n'
+        ))
+        self.assertEqual((payload['success'], payload['fail']), (3, 5), payload['fail_msgs'])
+        self.assertEqual((payload['boms_created'], payload['boms_updated']), (1, 1))
+        self.assertEqual(
+            sorted(BOMItem.objects.filter(bom=bom).values_list('material__code', 'quantity', 'remark')),
+            [('M-BT', 4, ''), ('M-ST', Decimal('1.26'), '下料')],
+        )
+        # P2/标准/1 没有任何有效明细，不创建空BOM
+        self.assertEqual(
+            sorted(BOM.objects.values_list('product__code', 'name', 'version')),
+            [('P1', '标准', '1'), ('P2', '新版', '2')],
+        )
+
+    def test_import_boms_isolates_failing_bom(self):
+        from . import importers
+
+        for code in ('P1', 'P2'):
+            Product.objects.create(code=code, name=code, price=1, category=self.category)
+        Product.objects.create(code='M-ST', name='M-ST', price=1, category=self.category, is_material=True)
+        write = importers._write_bom_groups
+
+        def failing(groups):
+            if any(product.code == 'P2' for product, *_ in groups):
+                raise ValueError('写入失败')
+            return write(groups)
+
+        with mock.patch.object(importers, '_write_bom_groups', failing):
+            payload = self._import('boms', (
+                'product_code,name,version,material_code,quantity\n'
+                'P1,标准,1,M-ST,1\n'
+                'P2,标准,1,M-ST,1\n'
+            ))
+        # 整批失败后逐个BOM重试，只有出错的BOM记为失败
+        self.assertEqual((payload['success'], payload['fail'], payload['boms_created']), (1, 1, 1))
+        self.assertIn('P2/标准/1', payload['fail_msgs'][0])
@@ -5,7 +5,7 @@ from django.contrib.auth import authenticate
 from django.views.decorators.http import require_GET
 import json
 from rest_framework.routers import DefaultRouter
-from .views import ProductCategoryViewSet, CategoryParamViewSet, ProductViewSet,ProductAttachmentViewSet, ProductParamValueViewSet, CompanyViewSet, ProcessViewSet, ProcessCodeViewSet, ProductProcessCodeViewSet, ProcessDetailViewSet, BOMViewSet, BOMItemViewSet, CustomerViewSet, MaterialViewSet, UnitViewSet, ProductCategoryProcessCodeViewSet, CategoryMaterialRuleViewSet, CategoryMaterialRuleParamViewSet, MaterialTypeViewSet, generate_material_api
+from .views import ProductCategoryViewSet, CategoryParamViewSet, ProductViewSet,ProductAttachmentViewSet, ProductParamValueViewSet, CompanyViewSet, ProcessViewSet, ProcessCodeViewSet, ProductProcessCodeViewSet, ProcessDetailViewSet, BOMViewSet, BOMItemViewSet, CustomerViewSet, MaterialViewSet, UnitViewSet, ProductCategoryProcessCodeViewSet, CategoryMaterialRuleViewSet, CategoryMaterialRuleParamViewSet, MaterialTypeViewSet, ImportJobViewSet, generate_material_api
 
 router = DefaultRouter()
 
@@ -28,6 +28,7 @@ router.register(r'category-material-rules', CategoryMaterialRuleViewSet)
 router.register(r'category-material-rule-params', CategoryMaterialRuleParamViewSet)
 router.register(r'material-types', MaterialTypeViewSet)
 router.register(r'product-attachments', ProductAttachmentViewSet)
+router.register(r'import-jobs', ImportJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
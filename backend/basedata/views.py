@@ -9,30 +9,50 @@ from django.db import transaction
 from rest_framework.response import Response
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import ProductAttachment,ProductCategory, CategoryParam, Product, ProductParamValue, Company, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Customer, Material, Unit, ProductCategoryProcessCode, CategoryMaterialRule, CategoryMaterialRuleParam, MaterialType
-from .serializers import ProductCategorySerializer, CategoryParamSerializer, ProductAttachmentSerializer,ProductSerializer, ProductParamValueSerializer, CompanySerializer, ProcessSerializer, ProcessCodeSerializer, ProductProcessCodeSerializer, ProcessDetailSerializer, BOMSerializer, BOMItemSerializer, CustomerSerializer, MaterialSerializer, UnitSerializer, ProductCategoryProcessCodeSerializer, CategoryMaterialRuleSerializer, CategoryMaterialRuleParamSerializer, MaterialTypeSerializer
+from .models import ImportJob, ProductAttachment,ProductCategory, CategoryParam, Product, ProductParamValue, Company, Process, ProcessCode, ProductProcessCode, ProcessDetail, BOM, BOMItem, Customer, Material, Unit, ProductCategoryProcessCode, CategoryMaterialRule, CategoryMaterialRuleParam, MaterialType
+from .serializers import ImportJobSerializer, ProductCategorySerializer, CategoryParamSerializer, ProductAttachmentSerializer,ProductSerializer, ProductParamValueSerializer, CompanySerializer, ProcessSerializer, ProcessCodeSerializer, ProductProcessCodeSerializer, ProcessDetailSerializer, BOMSerializer, BOMItemSerializer, CustomerSerializer, MaterialSerializer, UnitSerializer, ProductCategoryProcessCodeSerializer, CategoryMaterialRuleSerializer, CategoryMaterialRuleParamSerializer, MaterialTypeSerializer
 from rest_framework import viewsets
 from django.core.files.storage import default_storage
 import os
 import re
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from openpyxl import Workbook
-import io
 import logging
+from utils.authentication import IsAdminUser
 from utils.tools import convert_image_to_pdf
 import traceback
+from .reference_cache import CachedReferenceViewSetMixin
+from .importers import IMPORTERS, ImportFileError, run_importer
+from .exporters import xlsx_response, export_boms, export_category_params, export_materials, export_process_details, export_products
+from .file_gc import run_file_gc_task, validate_directories
+from .import_jobs import TASKS, enqueue_import_job, enqueue_task
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
+def run_import(request, kind):
+    """
+    各 import_* 接口的公共入口
+    默认同步导入并返回结果；带 async=1（查询参数或表单字段）时保存文件并创建后台导入任务，
+    立即返回任务ID，进度通过 /api/import-jobs/<id>/ 查询
+    """
+    file = request.FILES.get('file')
+    if not file:
+        return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
+    async_flag = request.query_params.get('async') or request.data.get('async')
+    if str(async_flag).lower() in ['1', 'true', 'yes']:
+        job = enqueue_import_job(kind, file, request.user)
+        return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    try:
+        payload, status_code = run_importer(kind, file)
+    except ImportFileError as e:
+        return Response(e.payload, status=status.HTTP_400_BAD_REQUEST)
+    return Response(payload, status=status_code)
+
 class ProductCategoryViewSet(viewsets.ModelViewSet):
-    queryset = ProductCategory.objects.select_related(
-        'company', 
-        'unit', 
-        'material_type'
-    ).all().order_by('code')
+    # 公司/单位/材质由嵌套序列化器从参考数据缓存读取，不再 JOIN
+    queryset = ProductCategory.objects.all().order_by('code')
     serializer_class = ProductCategorySerializer
     permission_classes = [IsAuthenticated]
     filterset_fields = ['company', 'code']
@@ -69,307 +89,37 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='export-params')
     def export_params(self, request):
         """导出产品类和对应的参数项到Excel"""
-        # 创建工作簿
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "产品类参数"
-
-        # 设置表头
-        ws.append(["产品类", "参数项"])
-
-        # 获取所有产品类
-        categories = ProductCategory.objects.all().order_by('code')
-
-        # 对每个产品类，获取其所有参数项并用逗号拼接
-        for category in categories:
-            params = CategoryParam.objects.filter(category=category).order_by('name')
-            param_names = ', '.join([param.name for param in params])
-            category_name = f"{category.code} - {category.display_name}"
-            ws.append([category_name, param_names])
-
-        # 设置列宽
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 80
-
-        # 保存到内存缓冲区
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        # 创建HTTP响应
-        response = HttpResponse(
-            buffer.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename=产品类参数列表.xlsx'
-
-        return response
+        return xlsx_response([export_category_params(ProductCategory.objects.all())], '产品类参数列表.xlsx')
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_categories(self, request):
-        print("[IMPORT_CATEGORIES] Starting import process...")
-        file = request.FILES.get('file')
-        if not file:
-            print("[IMPORT_CATEGORIES] Error: No file uploaded.")
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
+        return run_import(request, 'categories')
 
-        print(f"[IMPORT_CATEGORIES] Received file: {file.name}")
-
-        try:
-            if file.name.endswith('.csv'):
-                print("[IMPORT_CATEGORIES] Reading CSV file...")
-                df = pd.read_csv(file)
-            else:
-                print("[IMPORT_CATEGORIES] Reading Excel file...")
-                df = pd.read_excel(file)
-            print(f"[IMPORT_CATEGORIES] File read successfully. Columns: {df.columns.tolist()}")
-        except Exception as e:
-            print(f"[IMPORT_CATEGORIES] Error parsing file: {e}")
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['code', 'display_name', 'company']
-        print(f"[IMPORT_CATEGORIES] Required columns: {required_cols}")
-
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            print(f"[IMPORT_CATEGORIES] Error: Missing required columns: {missing_cols}")
-            # 返回结构化的错误信息，方便前端解析
-            error_detail = {f"row_info": f"文件列配置错误，缺少必需字段: {', '.join(missing_cols)}"}
-            return Response(error_detail, status=status.HTTP_400_BAD_REQUEST)
-
-        material_col_options = ['material_type', '材质', 'material']
-        unit_col_options = ['unit', '单位']
-
-        material_col = None
-        for col in material_col_options:
-            if col in df.columns:
-                material_col = col
-                print(f"[IMPORT_CATEGORIES] Found material column: '{material_col}'")
-                break
-        if not material_col:
-            print("[IMPORT_CATEGORIES] Warning: No material column found among options:", material_col_options)
-
-        unit_col = None
-        for col in unit_col_options:
-            if col in df.columns:
-                unit_col = col
-                print(f"[IMPORT_CATEGORIES] Found unit column: '{unit_col}'")
-                break
-        if not unit_col:
-            print("[IMPORT_CATEGORIES] Warning: No unit column found among options:", unit_col_options)
-
-        from .models import Company, MaterialType, Unit
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs_dict = {} # 使用字典记录详细错误，键为行号
-
-        print(f"[IMPORT_CATEGORIES] Starting row processing. Total rows: {len(df)}")
-        for index, row in df.iterrows():
-            current_row_index = index + 1 # 1-based index for user messages
-            print(f"[IMPORT_CATEGORIES] --- Processing row {current_row_index} ---")
-            row_errors = []
-            try:
-                row_data_str = ", ".join([f"{k}:'{v}'" for k, v in row.items()])
-                print(f"[IMPORT_CATEGORIES] Row {current_row_index} data: {row_data_str}")
-
-                company_name = row['company']
-                company = Company.objects.filter(name=company_name).first()
-                if not company:
-                    msg = f'找不到公司: {company_name}'
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index} Error: {msg}")
-                    row_errors.append(msg)
-                else:
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found company '{company.name}' (ID: {company.id}) for value '{company_name}'")
-
-                material_type_obj = None # Renamed to avoid conflict with model name
-                if material_col and material_col in row and not pd.isna(row[material_col]):
-                    val = row[material_col]
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Attempting to find MaterialType for value '{val}' from column '{material_col}'")
-                    try:
-                        material_type_obj = MaterialType.objects.filter(id=int(val)).first()
-                        if material_type_obj:
-                             print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by ID: '{material_type_obj.name}' (ID: {material_type_obj.id})")
-                    except ValueError: # Not an integer, try by name then code
-                        material_type_obj = MaterialType.objects.filter(name=str(val)).first()
-                        if material_type_obj:
-                            print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by name: '{material_type_obj.name}' (ID: {material_type_obj.id})")
-                        else:
-                            material_type_obj = MaterialType.objects.filter(code=str(val)).first() # TRY BY CODE
-                            if material_type_obj:
-                                print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by CODE: '{material_type_obj.name}' (ID: {material_type_obj.id})")
-                    except Exception: # Other exceptions during ID lookup, try by name then code
-                        material_type_obj = MaterialType.objects.filter(name=str(val)).first()
-                        if material_type_obj:
-                            print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by name (after ID lookup exception): '{material_type_obj.name}' (ID: {material_type_obj.id})")
-                        else:
-                            material_type_obj = MaterialType.objects.filter(code=str(val)).first() # TRY BY CODE
-                            if material_type_obj:
-                                print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by CODE (after ID lookup exception): '{material_type_obj.name}' (ID: {material_type_obj.id})")
-                    
-                    # Fallback if previous attempts (e.g. direct name lookup from non-int val) didn't catch it
-                    if not material_type_obj:
-                       # This might be redundant if the ValueError path already covered it, but ensures code lookup if name lookup was the first non-ID path
-                       material_type_obj = MaterialType.objects.filter(name=str(val)).first() 
-                       if not material_type_obj:
-                            material_type_obj = MaterialType.objects.filter(code=str(val)).first() # FINAL TRY BY CODE
-                            if material_type_obj:
-                                print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found MaterialType by CODE (fallback): '{material_type_obj.name}' (ID: {material_type_obj.id})")
-
-                    if not material_type_obj:
-                        msg = f'材质未找到: {val}'
-                        print(f"[IMPORT_CATEGORIES] Row {current_row_index} Error: {msg}")
-                        row_errors.append(msg)
-                elif material_col and (material_col not in row or pd.isna(row[material_col])):
-                    # If material_col is expected (e.g., from template) but missing or NaN, it's an error if you want to make it mandatory
-                    # For now, let's assume it's optional if not provided or NaN, so no error here, material_type_obj remains None.
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Material column '{material_col}' is present but value is NaN or missing. Treating as optional.")
-                elif not material_col:
-                     print(f"[IMPORT_CATEGORIES] Row {current_row_index}: No material column specified in input file.")
-
-                unit_obj = None
-                if unit_col and unit_col in row and not pd.isna(row[unit_col]):
-                    unit_val = row[unit_col]
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Attempting to find Unit for value '{unit_val}' from column '{unit_col}'")
-                    unit_obj = Unit.objects.filter(name=str(unit_val)).first()
-                    if not unit_obj:
-                        unit_obj = Unit.objects.filter(code=str(unit_val)).first()
-                        if unit_obj:
-                           print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found Unit by code: '{unit_obj.name}' (ID: {unit_obj.id})")
-                    elif unit_obj:
-                        print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Found Unit by name: '{unit_obj.name}' (ID: {unit_obj.id})")
-
-                    if not unit_obj:
-                        msg = f'单位未找到: {unit_val}'
-                        print(f"[IMPORT_CATEGORIES] Row {current_row_index} Error: {msg}")
-                        row_errors.append(msg)
-                elif unit_col and (unit_col not in row or pd.isna(row[unit_col])):
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Unit column '{unit_col}' is present but value is NaN or missing. Treating as optional.")
-                elif not unit_col:
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index}: No unit column specified in input file.")
-
-                # If there were any errors finding related objects, skip this row
-                if row_errors:
-                    fail_count += 1
-                    fail_msgs_dict[current_row_index] = "; ".join(row_errors)
-                    print(f"[IMPORT_CATEGORIES] Row {current_row_index} failed due to errors: {fail_msgs_dict[current_row_index]}")
-                    continue
-
-                defaults = {
-                    'display_name': row['display_name'],
-                    'material_type': material_type_obj,
-                    'unit': unit_obj
-                }
-                print(f"[IMPORT_CATEGORIES] Row {current_row_index}: Defaults for update_or_create: { {k: (v.id if hasattr(v, 'id') and v is not None else v) for k, v in defaults.items()} }")
-
-                category, created = ProductCategory.objects.update_or_create(
-                    code=row['code'],
-                    company=company, # company must exist from previous check
-                    defaults=defaults
-                )
-                status_str = "created" if created else "updated"
-                print(f"[IMPORT_CATEGORIES] Row {current_row_index}: ProductCategory {status_str} successfully: Code='{category.code}', ID='{category.id}'")
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                error_message = f'未知错误: {str(e)}'
-                print(f"[IMPORT_CATEGORIES] Row {current_row_index} Error: {error_message}")
-                print(f"[IMPORT_CATEGORIES] Row {current_row_index} Traceback: {traceback.format_exc()}")
-                fail_msgs_dict[current_row_index] = error_message
-
-        print(f"[IMPORT_CATEGORIES] Import process finished. Success: {success_count}, Fail: {fail_count}")
-        if fail_msgs_dict:
-            print(f"[IMPORT_CATEGORIES] Failure details: {fail_msgs_dict}")
-            # If there are failures, return 400 with structured error details
-            return Response({
-                'msg': '导入过程中发生错误',
-                'success_count': success_count,
-                'fail_count': fail_count,
-                'errors': fail_msgs_dict # Send dict of errors
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        return Response({
-            'msg': '产品类别导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': [] # Keep consistent with previous success response structure
-        })
-
-    @action(detail=False, methods=['post'], url_path='cleanup-files')
+    @action(detail=False, methods=['post'], url_path='cleanup-files', permission_classes=[IsAdminUser])
     def cleanup_files(self, request):
-        """清理drawings文件夹中的冗余文件"""
+        """
+        清理drawings文件夹中的冗余文件：删除未被任何记录引用的 _随机后缀 文件和旧的 -时间戳 备份（每组保留最新一个）
+        参数：dry_run=1 只返回将删除的文件；async=1 提交后台任务（file_gc）立即返回任务信息
+        """
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        params = {'directories': ['drawings'], 'dry_run': dry_run, 'keep_unrecognized': True}
+        if str(request.data.get('async', '')).lower() in ('1', 'true'):
+            job = enqueue_task('file_gc', params, request.user)
+            return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
         try:
-            # 获取所有有效的文件路径
-            valid_files = set()
-            for category in ProductCategory.objects.all():
-                if category.drawing_pdf:
-                    valid_files.add(category.drawing_pdf.name)
-                if category.process_pdf:
-                    valid_files.add(category.process_pdf.name)
-
-            # 列出drawings目录下的所有文件
-            all_files = []
-            try:
-                all_files = default_storage.listdir('drawings')[1]
-            except Exception as e:
-                return Response({'error': f'无法列出drawings目录下的文件: {str(e)}'}, status=400)
-
-            # 找出所有正在使用的文件并保留备份文件
-            deleted_files = []
-            retained_files = []
-
-            # 使用正则表达式识别备份文件模式
-            backup_pattern = re.compile(r'^(.+)-\d+\.pdf$')
-            random_suffix_pattern = re.compile(r'^(.+)_[a-zA-Z0-9]{7,}\.pdf$')
-
-            # 收集所有基础文件名（无时间戳）
-            base_filenames = {}
-            for filepath in valid_files:
-                if filepath.startswith('drawings/'):
-                    filename = os.path.basename(filepath)
-                    base_name = filename.rsplit('.', 1)[0]
-                    base_filenames[base_name] = filename
-
-            for file in all_files:
-                full_path = f'drawings/{file}'
-
-                # 保留当前正在使用的文件
-                if full_path in valid_files:
-                    retained_files.append(file)
-                    continue
-
-                # 检查是否是备份文件
-                backup_match = backup_pattern.match(file)
-                random_suffix_match = random_suffix_pattern.match(file)
-
-                if backup_match:
-                    base_name = backup_match.group(1)
-                    # 只保留最新的一个备份文件（按文件名排序）
-                    files_with_same_base = [f for f in all_files if f.startswith(base_name+'-') and f.endswith('.pdf')]
-                    files_with_same_base.sort(reverse=True)  # 按时间戳降序排序
-
-                    if len(files_with_same_base) > 1 and file != files_with_same_base[0]:
-                        default_storage.delete(full_path)
-                        deleted_files.append(file)
-                    else:
-                        retained_files.append(file)
-                elif random_suffix_match:
-                    # 删除带有随机后缀的文件
-                    base_name = random_suffix_match.group(1)
-                    default_storage.delete(full_path)
-                    deleted_files.append(file)
-                else:
-                    # 其他不可识别的文件，保留
-                    retained_files.append(file)
-
-            return Response({
-                'success': True,
-                'deleted_files': deleted_files,
-                'retained_files': retained_files,
-                'message': f'成功清理了 {len(deleted_files)} 个冗余文件，保留了 {len(retained_files)} 个文件。'
-            })
+            report, _ = run_file_gc_task(params)
         except Exception as e:
             return Response({'error': str(e)}, status=500)
+        verb = '将清理' if dry_run else '成功清理了'
+        return Response({
+            'success': True,
+            'dry_run': dry_run,
+            'deleted_files': [os.path.basename(name) for name in report['deleted_files']],
+            'retained_files': [os.path.basename(name) for name in report['retained_files']],
+            'deleted_count': report['deleted_count'],
+            'elapsed_seconds': report['elapsed_seconds'],
+            'message': f"{verb} {report['deleted_count']} 个冗余文件，保留了 {report['retained_count']} 个未引用的文件。"
+        })
 
     @action(detail=True, methods=['post'])
     def upload_drawing(self, request, pk=None):
@@ -484,54 +234,7 @@ class CategoryParamViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_category_params(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['category_code', 'name']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        from .models import ProductCategory
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Get category by code instead of name
-                category = ProductCategory.objects.filter(code=row['category_code']).first()
-                if not category:
-                    fail_msgs.append(f'第{index+1}行: 找不到产品类别代码: {row["category_code"]}')
-                    fail_count += 1
-                    continue
-
-                # Create or update param
-                param, created = CategoryParam.objects.update_or_create(
-                    category=category,
-                    name=row['name']
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '类别参数导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        return run_import(request, 'category_params')
 
 class ProductAttachmentViewSet(viewsets.ModelViewSet):
     queryset = ProductAttachment.objects.all()
@@ -565,7 +268,7 @@ class ProductAttachmentViewSet(viewsets.ModelViewSet):
     #     serializer = self.get_serializer(queryset, many=True)
     #     return Response(serializer.data) 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.filter(is_material=False)
+    queryset = Product.objects.filter(is_material=False).select_related('category', 'unit')
     serializer_class = ProductSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter]
@@ -660,185 +363,12 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_products(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-        required_cols = ['category_code', 'param_items', 'param_values', 'price']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-        from .models import ProductCategory, ProductParamValue, Unit
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-        skipped_count = 0
-        skipped_reasons = []
-        duplicate_codes = []
-        total_rows = len(df)
-        processed_data = {}  # 记录处理过的产品代码和原因
-
-        print(f"开始导入产品，总共{total_rows}行数据")
-
-        for index, row in df.iterrows():
-            try:
-                print(f"处理第{index+1}行数据")
-
-                # Get category by code
-                category_code = str(row['category_code']).strip()
-                category = ProductCategory.objects.filter(code=category_code).first()
-                if not category:
-                    error_msg = f'第{index+1}行: 找不到产品类别代码: {category_code}'
-                    print(error_msg)
-                    fail_msgs.append(error_msg)
-                    fail_count += 1
-                    continue
-
-                # Get unit by code if provided
-                unit = None
-                if 'unit_code' in df.columns and not pd.isna(row['unit_code']):
-                    unit_code = str(row['unit_code']).strip()
-                    unit = Unit.objects.filter(code=unit_code).first()
-                    if not unit:
-                        error_msg = f'第{index+1}行: 找不到单位编码: {unit_code}'
-                        print(error_msg)
-                        fail_msgs.append(error_msg)
-                        fail_count += 1
-                        continue
-
-                # 处理参数项和参数值
-                param_items = row['param_items'].split(',') if not pd.isna(row['param_items']) else []
-                param_values = row['param_values'].split(',') if not pd.isna(row['param_values']) else []
-
-                if len(param_items) != len(param_values):
-                    error_msg = f'第{index+1}行: 参数项和参数值数量不匹配: {len(param_items)}个参数项, {len(param_values)}个参数值'
-                    print(error_msg)
-                    fail_msgs.append(error_msg)
-                    fail_count += 1
-                    continue
-
-                # 构建产品代码和名称
-                product_code = category_code
-                product_name = category.display_name
-
-                for i in range(len(param_items)):
-                    param_item = param_items[i].strip()
-                    param_value = param_values[i].strip()
-                    product_code += f"-{param_value}"
-                    product_name += f"-{param_value}"
-
-                # 检查产品代码是否已经存在于数据库中
-                existing_product = Product.objects.filter(code=product_code).first()
-
-                # 检查产品代码是否已经在当前导入批次中处理过了
-                if product_code in processed_data:
-                    skipped_reason = f'第{index+1}行: 产品代码在当前导入批次中重复: {product_code}'
-                    print(skipped_reason)
-                    skipped_reasons.append(skipped_reason)
-                    skipped_count += 1
-                    duplicate_codes.append(product_code)
-                    continue
-
-                processed_data[product_code] = {"row": index+1, "action": "新增" if not existing_product else "更新"}
-
-                # 创建或更新产品
-                is_update = False
-                if existing_product:
-                    is_update = True
-                    product = existing_product
-
-                # 获取价格
-                price = 0
-                try:
-                    price = float(row['price']) if isinstance(row['price'], (int, float, str)) and row['price'] != '' else 0
-                except (ValueError, TypeError) as e:
-                    price = 0
-                    print(f"第{index+1}行价格解析错误: {e}, 使用默认值0")
+        return run_import(request, 'products')
 
-                # 创建或更新产品记录
-                try:
-                    product, created = Product.objects.update_or_create(
-                        code=product_code,
-                        defaults={
-                            'name': product_name,
-                            'price': price,
-                            'category': category,
-                            'unit': unit,
-                            'is_material': False
-                        }
-                    )
-
-                    if created:
-                        print(f"第{index+1}行: 创建产品成功: {product_code}")
-                    else:
-                        print(f"第{index+1}行: 更新产品成功: {product_code}")
-
-                    # 如果是更新操作，先删除现有的参数值
-                    if not created:
-                        deleted_count = ProductParamValue.objects.filter(product=product).delete()[0]
-                        print(f"第{index+1}行: 删除了{deleted_count}个旧参数值")
-
-                    # 保存参数值
-                    param_success_count = 0
-                    for i in range(len(param_items)):
-                        param_name = param_items[i].strip()
-                        param_value = param_values[i].strip()
-
-                        # 查找或创建参数项
-                        param, param_created = CategoryParam.objects.get_or_create(
-                            category=category,
-                            name=param_name
-                        )
-
-                        if param_created:
-                            print(f"第{index+1}行: 创建参数项: {param_name}")
-
-                        # 创建参数值
-                        try:
-                            param_value_obj = ProductParamValue.objects.create(
-                                product=product,
-                                param=param,
-                                value=param_value
-                            )
-                            param_success_count += 1
-                        except Exception as param_error:
-                            print(f"第{index+1}行: 参数值 '{param_name}:{param_value}' 保存失败: {str(param_error)}")
-
-                    print(f"第{index+1}行: 成功保存{param_success_count}/{len(param_items)}个参数值")
-
-                    success_count += 1
-                except Exception as product_error:
-                    error_msg = f'第{index+1}行: 产品保存失败: {str(product_error)}'
-                    print(error_msg)
-                    fail_msgs.append(error_msg)
-                    fail_count += 1
-
-            except Exception as e:
-                error_msg = f'第{index+1}行: 处理失败: {str(e)}'
-                print(error_msg)
-                fail_count += 1
-                fail_msgs.append(error_msg)
-
-        print(f"导入完成: 总共{total_rows}行, 成功{success_count}行, 失败{fail_count}行, 跳过{skipped_count}行")
-
-        return Response({
-            'msg': '导入完成',
-            'total': total_rows,
-            'success': success_count,
-            'fail': fail_count,
-            'skipped': skipped_count,
-            'fail_msgs': fail_msgs,
-            'skipped_reasons': skipped_reasons,
-            'duplicate_codes': duplicate_codes,
-            'processed_data': processed_data
-        })
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_products(self, request):
+        """按当前搜索条件导出产品，格式与导入文件一致"""
+        return xlsx_response([export_products(self.filter_queryset(self.get_queryset()))], '产品列表.xlsx')
 
 class ProductParamValueViewSet(viewsets.ModelViewSet):
     queryset = ProductParamValue.objects.all()
@@ -882,8 +412,9 @@ class CompanySerializer(serializers.ModelSerializer):
         model = Company
         fields = ['id', 'name', 'code', 'address', 'contact', 'phone']
 
-class CompanyViewSet(viewsets.ModelViewSet):
+class CompanyViewSet(CachedReferenceViewSetMixin, viewsets.ModelViewSet):
     queryset = Company.objects.all()
+    reference_kind = 'company'
     serializer_class = CompanySerializer
 
 class CustomerViewSet(viewsets.ModelViewSet):
@@ -997,91 +528,16 @@ class MaterialViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_materials(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-        required_cols = ['code', 'name', 'price', 'category_code']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-        from .models import ProductCategory, ProductParamValue, Unit
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Get category by code instead of name
-                category = ProductCategory.objects.filter(code=row['category_code']).first()
-                if not category:
-                    fail_msgs.append(f'第{index+1}行: 找不到物料类别代码: {row["category_code"]}')
-                    fail_count += 1
-                    continue
-
-                # Get unit by code if provided
-                unit = None
-                if 'unit_code' in df.columns and not pd.isna(row['unit_code']):
-                    unit = Unit.objects.filter(code=row['unit_code']).first()
-                    if not unit:
-                        fail_msgs.append(f'第{index+1}行: 找不到单位编码: {row["unit_code"]}')
-                    fail_count += 1
-                    continue
+        return run_import(request, 'materials')
 
-                # Create or update material
-                price = float(row['price']) if isinstance(row['price'], (int, float, str)) else 0
-
-                # If name is empty, use category's display_name
-                name = row['name']
-                if pd.isna(name) or name == '':
-                    name = category.display_name
-
-                product, created = Product.objects.update_or_create(
-                    code=row['code'],
-                    defaults={
-                        'name': name,
-                        'price': price,
-                        'category': category,
-                        'unit': unit,
-                        'is_material': True  # 确保是物料
-                    }
-                )
-
-                # Process param values if included
-                for col in df.columns:
-                    if col in required_cols or pd.isna(row[col]):
-                        continue
-                    # Find param by name
-                    param = CategoryParam.objects.filter(category=category, name=col).first()
-                    if param:
-                        # Create or update parameter value
-                        ProductParamValue.objects.update_or_create(
-                            product=product,
-                            param=param,
-                            defaults={'value': str(row[col])}
-                        )
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_materials(self, request):
+        """按当前搜索条件导出物料，格式与导入文件一致"""
+        return xlsx_response([export_materials(self.filter_queryset(self.get_queryset()))], '物料列表.xlsx')
 
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
-
-class ProcessViewSet(viewsets.ModelViewSet):
+class ProcessViewSet(CachedReferenceViewSetMixin, viewsets.ModelViewSet):
     queryset = Process.objects.all()
+    reference_kind = 'process'
     serializer_class = ProcessSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter]
@@ -1089,49 +545,7 @@ class ProcessViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_processes(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['code', 'name']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Create or update process
-                description = row.get('description', '') if 'description' in row and not pd.isna(row['description']) else ''
-                process, created = Process.objects.update_or_create(
-                    code=row['code'],
-                    defaults={
-                        'name': row['name'],
-                        'description': description
-                    }
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '工序导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        return run_import(request, 'processes')
 
 class ProcessCodeViewSet(viewsets.ModelViewSet):
     queryset = ProcessCode.objects.all()
@@ -1143,49 +557,7 @@ class ProcessCodeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_process_codes(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['code', 'version']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Create or update process code
-                description = row.get('description', '') if 'description' in row and not pd.isna(row['description']) else ''
-                process_code, created = ProcessCode.objects.update_or_create(
-                    code=row['code'],
-                    version=row['version'],
-                    defaults={
-                        'description': description
-                    }
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '工艺流程导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        return run_import(request, 'process_codes')
 
 def replace_process_content_params(content, param_values: dict):
     """
@@ -1338,56 +710,12 @@ class ProcessDetailViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_process_details(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-        required_cols = ['process_code', 'step_no', 'step', 'machine_time', 'labor_time']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-        success, fail = 0, 0
-        fail_msgs = []
-        from .models import ProcessCode, Process, ProcessDetail
-        with transaction.atomic():
-            for idx, row in df.iterrows():
-                try:
-                    process_code_obj = ProcessCode.objects.filter(code=row['process_code']).first()
-                    step_obj = Process.objects.filter(name=row['step']).first()
-                    if not process_code_obj or not step_obj:
-                        fail += 1
-                        fail_msgs.append(f"第{idx+2}行: 工艺流程代码或工序不存在")
-                        continue
-                    
-                    # 获取工序内容和所需设备（如果存在）
-                    process_content = row.get('process_content', '') if 'process_content' in df.columns and not pd.isna(row.get('process_content')) else ''
-                    remark = row.get('remark', '') if 'remark' in df.columns and not pd.isna(row['remark']) else ''
-                    
-                    ProcessDetail.objects.update_or_create(
-                        process_code=process_code_obj,
-                        step_no=row['step_no'],
-                        defaults={
-                            'step': step_obj,
-                            'machine_time': row['machine_time'],
-                            'labor_time': row['labor_time'],
-                            'process_content': process_content,
-                            'remark': remark
-                        }
-                    )
-                    success += 1
-                except Exception as e:
-                    fail += 1
-                    fail_msgs.append(f"第{idx+2}行: {e}")
-        msg = f"导入完成，成功{success}条，失败{fail}条。"
-        if fail:
-            msg += ' 错误: ' + '; '.join(fail_msgs[:5])
-        return Response({'msg': msg})
+        return run_import(request, 'process_details')
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_process_details(self, request):
+        """按当前过滤条件导出工艺流程明细，格式与导入文件一致"""
+        return xlsx_response([export_process_details(self.filter_queryset(self.get_queryset()))], '工艺流程明细.xlsx')
 
 class BOMViewSet(viewsets.ModelViewSet):
     queryset = BOM.objects.all()
@@ -1399,91 +727,12 @@ class BOMViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_boms(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['product_code', 'name', 'version', 'material_code', 'quantity']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
+        return run_import(request, 'boms')
 
-        # Group by product, name, and version to create BOMs and their items
-        grouped = df.groupby(['product_code', 'name', 'version'])
-
-        for (product_code, bom_name, bom_version), group in grouped:
-            try:
-                # Find product
-                product = Product.objects.filter(code=product_code, is_material=False).first()
-                if not product:
-                    fail_count += len(group)
-                    fail_msgs.append(f'产品代码不存在或不是产品: {product_code}')
-                    continue
-
-                # Create or update BOM
-                bom, created = BOM.objects.update_or_create(
-                    product=product,
-                    name=bom_name,
-                    version=bom_version
-                )
-
-                # If updating, clear existing items
-                if not created:
-                    BOMItem.objects.filter(bom=bom).delete()
-
-                # Add BOM items
-                item_success = 0
-                for _, row in group.iterrows():
-                    try:
-                        # Find material
-                        material = Product.objects.filter(code=row['material_code'], is_material=True).first()
-                        if not material:
-                            fail_count += 1
-                            fail_msgs.append(f'物料代码不存在或不是物料: {row["material_code"]}')
-                            continue
-
-                        # Create BOM item
-                        quantity = float(row['quantity']) if isinstance(row['quantity'], (int, float, str)) else 0
-                        remark = row.get('remark', '') if 'remark' in row and not pd.isna(row['remark']) else ''
-
-                        BOMItem.objects.create(
-                            bom=bom,
-                            material=material,
-                            quantity=quantity,
-                            remark=remark
-                        )
-
-                        item_success += 1
-                        success_count += 1
-                    except Exception as e:
-                        fail_count += 1
-                        fail_msgs.append(f'BOM明细创建失败: {row["material_code"]} - {str(e)}')
-
-                # If no items were added successfully, delete the BOM
-                if item_success == 0 and created:
-                    bom.delete()
-
-            except Exception as e:
-                fail_count += len(group)
-                fail_msgs.append(f'BOM创建失败: {product_code}/{bom_name}/{bom_version} - {str(e)}')
-
-        return Response({
-            'msg': 'BOM导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_boms(self, request):
+        """按当前过滤条件导出BOM明细，格式与导入文件一致"""
+        return xlsx_response([export_boms(self.filter_queryset(self.get_queryset()))], 'BOM列表.xlsx')
 
 class BOMItemViewSet(viewsets.ModelViewSet):
     queryset = BOMItem.objects.all()
@@ -1500,8 +749,9 @@ class BOMItemViewSet(viewsets.ModelViewSet):
                 queryset = queryset.none()
         return queryset
 
-class UnitViewSet(viewsets.ModelViewSet):
+class UnitViewSet(CachedReferenceViewSetMixin, viewsets.ModelViewSet):
     queryset = Unit.objects.all().order_by('code')
+    reference_kind = 'unit'
     serializer_class = UnitSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter]
@@ -1509,48 +759,7 @@ class UnitViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_units(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['code', 'name']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Create or update unit
-                unit, created = Unit.objects.update_or_create(
-                    code=row['code'],
-                    defaults={
-                        'name': row['name'],
-                        'description': row.get('description', '')
-                    }
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '单位导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        return run_import(request, 'units')
 
 class ProductCategoryProcessCodeViewSet(viewsets.ModelViewSet):
     queryset = ProductCategoryProcessCode.objects.all()
@@ -1603,75 +812,7 @@ class ProductCategoryProcessCodeViewSet(viewsets.ModelViewSet):
         
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_category_process_codes(self, request):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        required_cols = ['category_code', 'process_code', 'version']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        from .models import ProductCategory, ProcessCode
-
-        for index, row in df.iterrows():
-            try:
-                # 查找产品类
-                category = ProductCategory.objects.filter(code=row['category_code']).first()
-                if not category:
-                    fail_msgs.append(f'第{index+1}行: 找不到产品类代码: {row["category_code"]}')
-                    fail_count += 1
-                    continue
-
-                # 查找工艺流程代码
-                process_code = ProcessCode.objects.filter(code=row['process_code'], version=row['version']).first()
-                if not process_code:
-                    fail_msgs.append(f'第{index+1}行: 找不到工艺流程代码: {row["process_code"]} 版本: {row["version"]}')
-                    fail_count += 1
-                    continue
-
-                # 判断是否为默认
-                is_default = False
-                if 'is_default' in df.columns and not pd.isna(row['is_default']):
-                    is_default_value = str(row['is_default']).lower()
-                    is_default = is_default_value in ['true', '1', 'yes', 'y', '是', '默认']
-
-                # 如果设置为默认，则取消该产品类下的其他默认设置
-                if is_default:
-                    ProductCategoryProcessCode.objects.filter(
-                        category=category,
-                        is_default=True
-                    ).update(is_default=False)
-
-                # 创建或更新关联
-                obj, created = ProductCategoryProcessCode.objects.update_or_create(
-                    category=category,
-                    process_code=process_code,
-                    defaults={'is_default': is_default}
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '产品类工艺流程关联导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        return run_import(request, 'category_process_codes')
 
 class CategoryMaterialRuleViewSet(viewsets.ModelViewSet):
     """
@@ -1833,8 +974,9 @@ class CategoryMaterialRuleParamViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(rule_id=rule_id)
         return queryset
 
-class MaterialTypeViewSet(viewsets.ModelViewSet):
+class MaterialTypeViewSet(CachedReferenceViewSetMixin, viewsets.ModelViewSet):
     queryset = MaterialType.objects.all().order_by('id')
+    reference_kind = 'material_type'
     serializer_class = MaterialTypeSerializer
     pagination_class = StandardResultsSetPagination
     filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
@@ -1844,46 +986,49 @@ class MaterialTypeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_material_types(self, request):
+        return run_import(request, 'material_types')
+
+class ImportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    后台导入任务：POST 提交文件（kind + file）立即返回任务ID，GET 查询状态、进度、吞吐和失败明细；
+    维护任务（如 kind=file_gc）不需要文件，参数放在 params 中
+    """
+    queryset = ImportJob.objects.all().order_by('-created_at')
+    serializer_class = ImportJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['kind', 'status', 'created_by']
+    ordering_fields = ['id', 'created_at']
+
+    def create(self, request, *args, **kwargs):
+        kind = request.data.get('kind')
+        if kind in TASKS:
+            # 维护任务（删除文件等）仅管理员可以提交
+            if not IsAdminUser().has_permission(request, self):
+                self.permission_denied(request, message=IsAdminUser.message)
+            params = request.data.get('params') or {}
+            if isinstance(params, str):
+                try:
+                    params = json.loads(params)
+                except ValueError:
+                    return Response({'msg': 'params 不是有效的JSON'}, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(params, dict):
+                return Response({'msg': 'params 必须是对象'}, status=status.HTTP_400_BAD_REQUEST)
+            if kind == 'file_gc':
+                try:
+                    validate_directories(params.get('directories'))
+                except ValueError as e:
+                    return Response({'msg': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            job = enqueue_task(kind, params, request.user)
+            return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+        if kind not in IMPORTERS:
+            return Response({'msg': f'不支持的导入类型: {kind}', 'kinds': list(IMPORTERS.keys()) + list(TASKS.keys())}, status=status.HTTP_400_BAD_REQUEST)
         file = request.FILES.get('file')
         if not file:
             return Response({'msg': '未上传文件'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            else:
-                df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'msg': f'文件解析失败: {e}'}, status=status.HTTP_400_BAD_REQUEST)
-        required_cols = ['code', 'name']
-        for col in required_cols:
-            if col not in df.columns:
-                return Response({'msg': f'缺少字段: {col}'}, status=status.HTTP_400_BAD_REQUEST)
-        success_count = 0
-        fail_count = 0
-        fail_msgs = []
-
-        for index, row in df.iterrows():
-            try:
-                # Create or update material type
-                material_type, created = MaterialType.objects.update_or_create(
-                    code=row['code'],
-                    defaults={
-                        'name': row['name'],
-                        'description': row.get('description', '')
-                    }
-                )
-
-                success_count += 1
-            except Exception as e:
-                fail_count += 1
-                fail_msgs.append(f'第{index+1}行: {str(e)}')
-
-        return Response({
-            'msg': '材质类型导入完成',
-            'success': success_count,
-            'fail': fail_count,
-            'fail_msgs': fail_msgs
-        })
+        job = enqueue_import_job(kind, file, request.user)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
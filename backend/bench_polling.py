@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+轮询接口压测：模拟车间终端持续轮询工单列表和当前工序，统计吞吐（请求/秒）和延迟分位数
+
+对比同步部署与 ASGI 部署（同一台机器、同一数据库）：
+    SERVER_MODE=wsgi ../deploy_gunicorn.sh   # 启动后执行
+    python bench_polling.py --token <access token> --label wsgi
+    SERVER_MODE=asgi ../deploy_gunicorn.sh   # 停掉上一个后启动
+    python bench_polling.py --token <access token> --label asgi
+--slow-import 可同时提交一个慢请求（如大文件导入）观察对轮询延迟的影响。
+只使用标准库，不依赖 requests。
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_PATHS = [
+    '/api/workorders/?expand=',
+    '/api/workorder-process-details/?current=true',
+]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def client(base_url, paths, token, deadline, latencies, errors, lock):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    i = 0
+    while time.monotonic() < deadline:
+        url = base_url + paths[i % len(paths)]
+        i += 1
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as resp:
+                resp.read()
+            elapsed = time.monotonic() - started
+            with lock:
+                latencies.append(elapsed)
+        except (urllib.error.URLError, OSError) as e:
+            with lock:
+                errors.append(str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='轮询接口压测')
+    parser.add_argument('--url', default='http://127.0.0.1:8900', help='服务地址')
+    parser.add_argument('--token', default='', help='JWT access token')
+    parser.add_argument('--clients', type=int, default=60, help='并发终端数')
+    parser.add_argument('--duration', type=int, default=30, help='持续秒数')
+    parser.add_argument('--path', action='append', dest='paths', help='轮询路径，可重复，默认工单列表和当前工序')
+    parser.add_argument('--label', default='', help='结果标签（如 wsgi / asgi）')
+    parser.add_argument('--slow-import', default='', help='压测期间同时上传的导入文件（提交到 /api/products/import/）')
+    args = parser.parse_args()
+
+    paths = args.paths or DEFAULT_PATHS
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(args.url, paths, args.token, deadline, latencies, errors, lock), daemon=True)
+        for _ in range(args.clients)
+    ]
+    if args.slow_import:
+        threads.append(threading.Thread(target=upload, args=(args.url, args.token, args.slow_import), daemon=True))
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    result = {
+        'label': args.label,
+        'clients': args.clients,
+        'duration': round(elapsed, 1),
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+    }
+    print(json.dumps(result, ensure_ascii=False))
+    if errors:
+        print('错误示例:', errors[:3])
+
+
+def upload(base_url, token, path):
+    boundary = 'benchboundary'
+    with open(path, 'rb') as f:
+        content = f.read()
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="import.xlsx"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    request = urllib.request.Request(base_url + '/api/products/import/', data=body, headers=headers, method='POST')
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=600) as resp:
+            resp.read()
+    except (urllib.error.URLError, OSError) as e:
+        print('导入请求失败:', e)
+    print(f'导入请求耗时 {time.monotonic() - started:.1f} 秒')
+
+
+if __name__ == '__main__':
+    main()
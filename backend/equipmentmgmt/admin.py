@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Equipment, EquipmentMaintenance, EquipmentSpare, EquipmentSpareInventory
+from .models import Equipment, EquipmentMaintenance, EquipmentSpare, EquipmentSpareInventory, EquipmentSpareStock
 
 @admin.register(Equipment)
 class EquipmentAdmin(admin.ModelAdmin):
@@ -17,7 +17,7 @@ class EquipmentMaintenanceAdmin(admin.ModelAdmin):
 
 @admin.register(EquipmentSpare)
 class EquipmentSpareAdmin(admin.ModelAdmin):
-    list_display = ('code', 'name', 'model', 'unit', 'price', 'min_inventory')
+    list_display = ('code', 'name', 'model', 'unit', 'price', 'min_inventory', 'stock_quantity')
     list_filter = ('manufacturer',)
     search_fields = ('code', 'name', 'model', 'manufacturer')
     filter_horizontal = ('applicable_equipment',)
@@ -27,4 +27,9 @@ class EquipmentSpareInventoryAdmin(admin.ModelAdmin):
     list_display = ('spare', 'transaction_type', 'quantity', 'transaction_date', 'related_equipment', 'created_by')
     list_filter = ('transaction_type', 'transaction_date')
     search_fields = ('spare__code', 'spare__name', 'batch_no', 'remark')
-    date_hierarchy = 'transaction_date' 
\ No newline at end of file
+    date_hierarchy = 'transaction_date'
+
+@admin.register(EquipmentSpareStock)
+class EquipmentSpareStockAdmin(admin.ModelAdmin):
+    list_display = ('spare', 'batch_no', 'quantity', 'updated_at')
+    search_fields = ('spare__code', 'spare__name', 'batch_no')
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from equipmentmgmt.models import EquipmentSpare, EquipmentSpareInventory, EquipmentSpareStock
+
+
+def history_balances():
+    """按库存变动历史汇总 {(备件ID, 批次号): 结余}，无批次号统一记为空字符串"""
+    balances = {}
+    for row in EquipmentSpareInventory.objects.order_by().values('spare_id', 'batch_no').annotate(total=Sum('quantity')):
+        key = (row['spare_id'], row['batch_no'] or '')
+        balances[key] = balances.get(key, Decimal('0')) + (row['total'] or Decimal('0'))
+    return balances
+
+
+class Command(BaseCommand):
+    help = '按库存变动历史校验/重建备件库存结余（备件结余 stock_quantity 及批次结余 EquipmentSpareStock）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', dest='check', help='只校验不修改，有差异时返回非零退出码')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # 锁定全部备件行，重建期间新的库存变动会等待，避免结余被覆盖
+            list(EquipmentSpare.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+            expected = history_balances()
+            diffs = self.compare(expected)
+            for line in diffs[:50]:
+                self.stdout.write(line)
+            if len(diffs) > 50:
+                self.stdout.write(f"... 共 {len(diffs)} 处差异")
+
+            if options['check']:
+                if diffs:
+                    raise CommandError(f'库存结余与变动历史不一致: {len(diffs)} 处差异')
+                self.stdout.write(self.style.SUCCESS('库存结余与变动历史一致'))
+                return
+
+            if not diffs:
+                self.stdout.write(self.style.SUCCESS('库存结余与变动历史一致，无需重建'))
+                return
+            self.rebuild(expected)
+        self.stdout.write(self.style.SUCCESS(f'重建完成，修正 {len(diffs)} 处差异'))
+
+    def compare(self, expected):
+        diffs = []
+        spare_totals = {}
+        for (spare_id, _), quantity in expected.items():
+            spare_totals[spare_id] = spare_totals.get(spare_id, Decimal('0')) + quantity
+        for spare_id, code, stock_quantity in EquipmentSpare.objects.values_list('pk', 'code', 'stock_quantity'):
+            total = spare_totals.get(spare_id, Decimal('0'))
+            if stock_quantity != total:
+                diffs.append(f"备件 {code}: 结余 {stock_quantity}, 历史汇总 {total}")
+
+        ledger = {
+            (spare_id, batch_no): quantity
+            for spare_id, batch_no, quantity in EquipmentSpareStock.objects.values_list('spare_id', 'batch_no', 'quantity')
+        }
+        for key in sorted(set(expected) | set(ledger), key=lambda k: (k[0], k[1])):
+            recorded, total = ledger.get(key), expected.get(key, Decimal('0'))
+            if recorded is None and total == 0:
+                continue
+            if recorded != total:
+                diffs.append(f"备件ID {key[0]} 批次 {key[1] or '无批次'}: 结余 {recorded}, 历史汇总 {total}")
+        return diffs
+
+    def rebuild(self, expected):
+        totals = (EquipmentSpareInventory.objects.filter(spare_id=OuterRef('pk')).order_by()
+                  .values('spare_id').annotate(total=Sum('quantity')).values('total'))
+        EquipmentSpare.objects.update(stock_quantity=Coalesce(
+            Subquery(totals), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+        EquipmentSpareStock.objects.all().delete()
+        EquipmentSpareStock.objects.bulk_create([
+            EquipmentSpareStock(spare_id=spare_id, batch_no=batch_no, quantity=quantity)
+            for (spare_id, batch_no), quantity in expected.items()
+        ], batch_size=1000)
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -90,6 +91,7 @@ class EquipmentSpare(models.Model):
     unit = models.CharField(max_length=20, blank=True, null=True, verbose_name='单位')
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name='单价')
     min_inventory = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='最小库存')
+    stock_quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False, db_index=True, verbose_name='库存结余')
     applicable_equipment = models.ManyToManyField(Equipment, related_name='applicable_spares', blank=True, verbose_name='适用设备')
     image = models.ImageField(upload_to='equipment_spares/', blank=True, null=True, verbose_name='备件图片')
     remark = models.TextField(blank=True, null=True, verbose_name='备注')
@@ -106,10 +108,8 @@ class EquipmentSpare(models.Model):
     
     @property
     def current_inventory(self):
-        """获取当前库存数量"""
-        from django.db.models import Sum
-        total = self.inventory_records.aggregate(Sum('quantity'))['quantity__sum'] or 0
-        return total
+        """获取当前库存数量（库存结余，随库存变动记录同步更新）"""
+        return self.stock_quantity
 
 
 class EquipmentSpareInventory(models.Model):
@@ -138,4 +138,79 @@ class EquipmentSpareInventory(models.Model):
         ordering = ['-transaction_date']
     
     def __str__(self):
-        return f"{self.spare.name} - {self.get_transaction_type_display()} - {self.quantity}" 
\ No newline at end of file
+        return f"{self.spare.name} - {self.get_transaction_type_display()} - {self.quantity}"
+
+    def save(self, *args, **kwargs):
+        # 库存变动记录与库存结余在同一事务内写入（结余由下方信号维护）
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class EquipmentSpareStock(models.Model):
+    """备件批次库存结余：按备件+批次号累计库存变动，随变动记录实时维护（无批次号记为空字符串）"""
+
+    spare = models.ForeignKey(EquipmentSpare, on_delete=models.CASCADE, related_name='stocks', verbose_name='备件')
+    batch_no = models.CharField(max_length=50, blank=True, default='', verbose_name='批次号')
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='结余数量')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '备件库存结余'
+        verbose_name_plural = '备件库存结余'
+        unique_together = ('spare', 'batch_no')
+        ordering = ['spare', 'batch_no']
+
+    def __str__(self):
+        return f"{self.spare.name} - {self.batch_no or '无批次'} - {self.quantity}"
+
+
+def apply_spare_stock_delta(spare_id, batch_no, delta, create=True):
+    """
+    按增量更新备件库存结余及批次结余（F() 表达式，并发安全）
+    :param create: 批次结余不存在时是否创建；删除变动记录时不创建，避免级联删除备件时插入新行
+    """
+    if not delta:
+        return
+    batch_no = batch_no or ''
+    now = timezone.now()
+    EquipmentSpare.objects.filter(pk=spare_id).update(stock_quantity=F('stock_quantity') + delta)
+    updated = EquipmentSpareStock.objects.filter(spare_id=spare_id, batch_no=batch_no).update(
+        quantity=F('quantity') + delta, updated_at=now
+    )
+    if updated or not create:
+        return
+    try:
+        with transaction.atomic():
+            EquipmentSpareStock.objects.create(spare_id=spare_id, batch_no=batch_no, quantity=delta)
+    except IntegrityError:
+        # 并发请求已创建该批次结余
+        EquipmentSpareStock.objects.filter(spare_id=spare_id, batch_no=batch_no).update(
+            quantity=F('quantity') + delta, updated_at=now
+        )
+
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+@receiver(pre_save, sender=EquipmentSpareInventory)
+def remember_spare_inventory_previous(sender, instance, raw=False, **kwargs):
+    # 修改变动记录时记下原备件/批次/数量，保存后先冲回再记入新值
+    instance._stock_previous = None
+    if instance.pk and not raw:
+        instance._stock_previous = sender.objects.filter(pk=instance.pk).values(
+            'spare_id', 'batch_no', 'quantity'
+        ).first()
+
+@receiver(post_save, sender=EquipmentSpareInventory)
+def update_spare_stock_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stock_previous', None)
+    if previous:
+        apply_spare_stock_delta(previous['spare_id'], previous['batch_no'], -previous['quantity'], create=False)
+    apply_spare_stock_delta(instance.spare_id, instance.batch_no, instance.quantity)
+    instance._stock_previous = None
+
+@receiver(post_delete, sender=EquipmentSpareInventory)
+def update_spare_stock_on_delete(sender, instance, **kwargs):
+    apply_spare_stock_delta(instance.spare_id, instance.batch_no, -instance.quantity, create=False) 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Equipment, EquipmentMaintenance, EquipmentSpare, EquipmentSpareInventory
+from .models import Equipment, EquipmentMaintenance, EquipmentSpare, EquipmentSpareInventory, EquipmentSpareStock
 
 
 class EquipmentSerializer(serializers.ModelSerializer):
@@ -45,4 +45,12 @@ class EquipmentSpareInventorySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EquipmentSpareInventory
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__' 
+
+
+class EquipmentSpareStockSerializer(serializers.ModelSerializer):
+    """备件批次库存结余序列化器"""
+    
+    class Meta:
+        model = EquipmentSpareStock
+        fields = ('id', 'spare', 'batch_no', 'quantity', 'updated_at')
@@ -0,0 +1,97 @@
+import io
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .models import Equipment, EquipmentSpare, EquipmentSpareInventory, EquipmentSpareStock
+
+
+class SpareInventoryListTests(TestCase):
+    """备件列表：当前库存读取库存结余，库存不足在数据库中过滤，每页查询数固定"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('keeper', password='x')
+        equipment = Equipment.objects.create(code='E1', name='车床', model='CK6140')
+        for i in range(6):
+            spare = EquipmentSpare.objects.create(code=f'SP{i}', name=f'备件{i}', model='M', min_inventory=5)
+            spare.applicable_equipment.add(equipment)
+            EquipmentSpareInventory.objects.create(spare=spare, transaction_type='in', quantity=i * 2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_low_inventory_filtered_in_database(self):
+        # 分页计数 + 备件 + 适用设备
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/equipment-spares/low_inventory/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([(s['code'], Decimal(s['current_inventory'])) for s in results],
+                         [('SP0', 0), ('SP1', 2), ('SP2', 4)])
+        self.assertEqual(results[0]['applicable_equipment_names'], ['E1 - 车床'])
+
+    def test_inventory_status_uses_stock_balance(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/equipment-spares/inventory_status/')
+        results = response.data['results']
+        self.assertEqual(Decimal(results[-1]['current_inventory']), 10)
+
+
+class SpareStockLedgerTests(TestCase):
+    """库存结余随变动记录的新增/修改/删除同步维护，可按历史校验和重建"""
+
+    def setUp(self):
+        self.spare = EquipmentSpare.objects.create(code='SP1', name='轴承', model='6204')
+        self.other = EquipmentSpare.objects.create(code='SP2', name='皮带', model='A50')
+
+    def balances(self):
+        self.spare.refresh_from_db()
+        return self.spare.stock_quantity, dict(self.spare.stocks.values_list('batch_no', 'quantity'))
+
+    def record(self, quantity, batch_no=None, spare=None):
+        return EquipmentSpareInventory.objects.create(
+            spare=spare or self.spare, transaction_type='in' if quantity > 0 else 'out',
+            quantity=quantity, batch_no=batch_no,
+        )
+
+    def test_balances_follow_records(self):
+        received = self.record(10, 'B1')
+        self.record(5)
+        self.record(-3, 'B1')
+        self.assertEqual(self.balances(), (12, {'B1': 7, '': 5}))
+
+        # 修改：先冲回原备件/批次，再记入新值
+        received.quantity = Decimal('8')
+        received.batch_no = 'B2'
+        received.save()
+        self.assertEqual(self.balances(), (10, {'B1': -3, 'B2': 8, '': 5}))
+        received.spare = self.other
+        received.save()
+        self.assertEqual(self.balances(), (2, {'B1': -3, 'B2': 0, '': 5}))
+        self.assertEqual(EquipmentSpare.objects.get(pk=self.other.pk).stock_quantity, 8)
+
+        received.delete()
+        self.assertEqual(EquipmentSpare.objects.get(pk=self.other.pk).stock_quantity, 0)
+
+        # 级联删除备件时不会为已删除的批次重新插入结余
+        self.spare.delete()
+        self.assertFalse(EquipmentSpareStock.objects.filter(spare_id=self.spare.pk).exists())
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        self.record(10, 'B1')
+        self.record(-4, 'B1')
+        EquipmentSpare.objects.filter(pk=self.spare.pk).update(stock_quantity=99)
+        EquipmentSpareStock.objects.filter(spare=self.spare).delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_spare_stock', '--check', stdout=io.StringIO())
+
+        call_command('rebuild_spare_stock', stdout=io.StringIO())
+        self.assertEqual(self.balances(), (6, {'B1': 6}))
+        call_command('rebuild_spare_stock', '--check', stdout=io.StringIO())
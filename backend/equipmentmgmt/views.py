@@ -2,15 +2,15 @@ from django.shortcuts import render
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, F, Value
-from django.db.models.functions import Coalesce
+from django.db.models import F
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Equipment, EquipmentMaintenance, EquipmentSpare, EquipmentSpareInventory
 from .serializers import (
     EquipmentSerializer, 
     EquipmentMaintenanceSerializer, 
     EquipmentSpareSerializer, 
-    EquipmentSpareInventorySerializer
+    EquipmentSpareInventorySerializer,
+    EquipmentSpareStockSerializer
 )
 
 
@@ -74,6 +74,10 @@ class EquipmentSpareViewSet(viewsets.ModelViewSet):
     serializer_class = EquipmentSpareSerializer
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['code', 'name', 'model', 'manufacturer']
+
+    def get_queryset(self):
+        # 当前库存读取预先维护的库存结余（stock_quantity），适用设备一次预取，避免逐行查询
+        return super().get_queryset().prefetch_related('applicable_equipment')
     
     @action(detail=True, methods=['get'])
     def inventory_records(self, request, pk=None):
@@ -86,16 +90,18 @@ class EquipmentSpareViewSet(viewsets.ModelViewSet):
             return self.get_paginated_response(serializer.data)
         serializer = EquipmentSpareInventorySerializer(inventory_records, many=True)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def batch_stocks(self, request, pk=None):
+        """获取备件按批次的库存结余"""
+        spare = self.get_object()
+        serializer = EquipmentSpareStockSerializer(spare.stocks.all(), many=True)
+        return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def inventory_status(self, request):
         """获取所有备件的库存状态，包括当前库存和最小库存信息"""
-        queryset = self.get_queryset()
-        
-        # 获取每个备件的库存总和
-        for spare in queryset:
-            spare.current_inventory_value = spare.current_inventory
-            
+        queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -106,21 +112,13 @@ class EquipmentSpareViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def low_inventory(self, request):
         """获取库存不足的备件列表"""
-        queryset = self.get_queryset()
-        
-        # 筛选库存低于最小库存的备件
-        low_inventory_spares = []
-        for spare in queryset:
-            current = spare.current_inventory
-            if current < spare.min_inventory:
-                spare.current_inventory_value = current
-                low_inventory_spares.append(spare)
-                
-        page = self.paginate_queryset(low_inventory_spares)
+        # 筛选库存低于最小库存的备件，在数据库中过滤后再分页
+        queryset = self.filter_queryset(self.get_queryset()).filter(stock_quantity__lt=F('min_inventory'))
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(low_inventory_spares, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
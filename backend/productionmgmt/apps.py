@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductionmgmtConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productionmgmt'
+
+    def ready(self):
+        from .events import connect_event_signals
+        connect_event_signals()
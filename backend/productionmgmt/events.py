@@ -0,0 +1,414 @@
+"""
+工单变更事件流（Server-Sent Events）
+
+终端不再定时重新下载工单/工序列表，而是订阅 GET /api/workorder-events/stream/，只接收变更：
+- status：工单状态变更（WorkOrder.save 时由信号记录；批量下达、生成工序明细和回冲用 update()/bulk_create
+  修改状态，由 release、process_details、feedback 显式记录）；
+- released：工单下达（mark_as_printed，待打印 -> 已下达）；
+- quantity：工序回冲后工序的待加工/已加工/完工数量和状态。
+
+事件与业务数据在同一事务中写入 WorkOrderEvent 表。自增ID按插入顺序分配而不是按提交顺序，
+游标（EventCursor）记录读到的最大ID和其下尚未出现的ID，迟到提交的事件之后补发；游标作为 SSE 的 id，
+断线重连时浏览器通过 Last-Event-ID 续传。每个进程一个 EventHub 后台线程，有订阅者时每
+WORKORDER_EVENT_POLL_INTERVAL 秒查询一次新事件，再分发给本进程的所有连接，不依赖外部消息服务。
+订阅参数：workorder=工单ID列表、process=工序ID列表（逗号分隔，按工位/产线订阅），都不传则接收全部事件。
+认证使用登录会话或 Authorization 请求头中的 JWT；浏览器的 EventSource 不能设置请求头，
+先用 POST /api/workorder-events/token/ 换取短期事件流令牌，通过 ?token= 传入。
+只在 ASGI 模式下提供：连接由事件循环维持，不占用工作进程；同步部署时接口返回 503，终端继续轮询。
+"""
+import asyncio
+import datetime
+import json
+import logging
+import re
+import threading
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models.signals import post_init, post_save
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .models import WorkOrder, WorkOrderEvent
+
+logger = logging.getLogger(__name__)
+
+EVENT_POLL_INTERVAL = getattr(settings, 'WORKORDER_EVENT_POLL_INTERVAL', 1)
+# 没有事件时发送心跳注释的间隔（秒），避免代理断开空闲连接
+EVENT_HEARTBEAT_SECONDS = 15
+# 事件ID出现空洞时（更早开始的事务尚未提交），从发现起持续重查的秒数，超过视为该事务已回滚；
+# 需大于写事件的事务的最长时间（批量下达、导入等），MySQL 行锁等待 innodb_lock_wait_timeout 默认 50 秒
+EVENT_GAP_WAIT_SECONDS = 120
+# 游标最多跟踪的空洞数，超过时只保留ID最大的
+EVENT_MAX_GAPS = 50
+# 事件保留时间（秒），断线超过该时间的终端会收到 reset 事件，需重新加载列表
+EVENT_RETENTION_SECONDS = 86400
+# 单次查询/补发的最大事件数，补发超过上限时发送 reset
+EVENT_BATCH_SIZE = 500
+EVENT_CATCHUP_LIMIT = 2000
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def workorder_status_event(workorder_id, status, previous=None, workorder_no=None):
+    """工单状态变更事件（待打印 -> 已下达 记为 released）"""
+    payload = {'status': status}
+    if previous is not None:
+        payload['previous'] = previous
+    if workorder_no is not None:
+        payload['workorder_no'] = workorder_no
+    kind = 'released' if previous == 'print' and status == 'released' else 'status'
+    return WorkOrderEvent(kind=kind, workorder_id=workorder_id, payload=payload)
+
+
+def process_quantity_event(detail):
+    """工序数量变更事件，detail 为已更新数量的 WorkOrderProcessDetail"""
+    return WorkOrderEvent(kind='quantity', workorder_id=detail.workorder_id, process_id=detail.process_id, payload={
+        'detail': detail.pk,
+        'step_no': detail.step_no,
+        'status': detail.status,
+        'pending_quantity': _plain(detail.pending_quantity),
+        'processed_quantity': _plain(detail.processed_quantity),
+        'completed_quantity': _plain(detail.completed_quantity),
+    })
+
+
+def record_events(events):
+    """在当前事务中写入事件"""
+    if events:
+        WorkOrderEvent.objects.bulk_create(events, batch_size=EVENT_BATCH_SIZE)
+
+
+def _remember_status(sender, instance, **kwargs):
+    # 只记录已加载的值，status 被 defer 时不触发查询
+    instance._event_status = instance.__dict__.get('status')
+
+
+def _record_status_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'status' not in update_fields):
+        return
+    previous = getattr(instance, '_event_status', None)
+    if instance.status != previous:
+        record_events([workorder_status_event(instance.pk, instance.status, previous, instance.workorder_no)])
+    instance._event_status = instance.status
+
+
+def connect_event_signals():
+    """在 AppConfig.ready 中调用"""
+    post_init.connect(_remember_status, sender=WorkOrder, dispatch_uid='workorder_event_post_init')
+    post_save.connect(_record_status_change, sender=WorkOrder, dispatch_uid='workorder_event_post_save')
+
+
+def event_data(event):
+    return {
+        'id': event.pk,
+        'type': event.kind,
+        'workorder': event.workorder_id,
+        'process': event.process_id,
+        'at': event.created_at.isoformat(),
+        **event.payload,
+    }
+
+
+def format_event(event):
+    """事件帧不带 id，每批事件之后单独发送游标帧（cursor_frame）"""
+    data = json.dumps(event_data(event), ensure_ascii=False, separators=(',', ':'))
+    return f'event: {event.kind}\ndata: {data}\n\n'
+
+
+def cursor_frame(cursor):
+    """只有 id 字段的帧：浏览器更新 Last-Event-ID，不触发事件"""
+    return f'id: {cursor}\n\n'
+
+
+class EventCursor:
+    """
+    事件游标：已读到的最大事件ID（position）和其下尚未出现的ID（gaps，值为首次发现的时间）
+    较大的ID可能先提交，读到时缺失的较小ID记为空洞，之后每次读取都重新检查，
+    从发现起超过 EVENT_GAP_WAIT_SECONDS 仍未出现的视为已回滚
+    文本形式 "120" 或 "120-115.117"，用作 SSE 的 id
+    """
+    FORMAT_RE = re.compile(r'^(\d+)(?:-(\d+(?:\.\d+)*))?$')
+
+    def __init__(self, position=0, gaps=()):
+        self.position = position
+        now = time.monotonic()
+        self.gaps = {pk: now for pk in gaps if pk < position}
+
+    def __str__(self):
+        if not self.gaps:
+            return str(self.position)
+        return f"{self.position}-{'.'.join(str(pk) for pk in sorted(self.gaps))}"
+
+    @classmethod
+    def parse(cls, value):
+        """解析 Last-Event-ID，格式不对时返回 None"""
+        match = cls.FORMAT_RE.match(value or '')
+        if not match:
+            return None
+        gaps = [int(pk) for pk in match.group(2).split('.')] if match.group(2) else []
+        return cls(int(match.group(1)), gaps[-EVENT_MAX_GAPS:])
+
+    @classmethod
+    def latest(cls):
+        """从最新事件开始，最近 EVENT_BATCH_SIZE 个ID中的空洞可能属于尚未提交的事务，继续跟踪"""
+        ids = list(WorkOrderEvent.objects.order_by('-pk').values_list('pk', flat=True)[:EVENT_BATCH_SIZE])
+        if not ids:
+            return cls()
+        present = set(ids)
+        return cls(ids[0], [pk for pk in range(ids[-1] + 1, ids[0]) if pk not in present][-EVENT_MAX_GAPS:])
+
+    def expire(self):
+        now = time.monotonic()
+        for pk, seen in list(self.gaps.items()):
+            if now - seen >= EVENT_GAP_WAIT_SECONDS:
+                del self.gaps[pk]
+
+    def advance(self, events):
+        """
+        按读到的事件（按ID升序）推进游标
+        :return: 其中之前没有读过的事件：新事件和补上空洞的迟到事件
+        """
+        now = time.monotonic()
+        fresh = []
+        for event in events:
+            if event.pk in self.gaps:
+                del self.gaps[event.pk]
+            elif event.pk > self.position:
+                for pk in range(max(self.position + 1, event.pk - EVENT_MAX_GAPS), event.pk):
+                    self.gaps[pk] = now
+                self.position = event.pk
+            else:
+                continue
+            fresh.append(event)
+        for pk in sorted(self.gaps)[:-EVENT_MAX_GAPS]:
+            del self.gaps[pk]
+        return fresh
+
+
+def fetch_events(cursor, limit=EVENT_BATCH_SIZE):
+    """
+    读取游标之后已提交的事件和空洞中迟到提交的事件，并推进游标
+    遇到空洞时不等待，先返回已提交的事件
+    :return: 之前没有读过的事件
+    """
+    cursor.expire()
+    late = list(WorkOrderEvent.objects.filter(pk__in=list(cursor.gaps)).order_by('pk')) if cursor.gaps else []
+    events = list(WorkOrderEvent.objects.filter(pk__gt=cursor.position).order_by('pk')[:limit])
+    return cursor.advance(late + events)
+
+
+def purge_expired_events():
+    cutoff = timezone.now() - datetime.timedelta(seconds=EVENT_RETENTION_SECONDS)
+    return WorkOrderEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+class Subscriber:
+    """一个 SSE 连接：订阅条件和投递回调 notify(事件列表)"""
+
+    def __init__(self, workorders=(), processes=()):
+        self.workorders = set(workorders)
+        self.processes = set(processes)
+        self.notify = None
+
+    def wants(self, event):
+        return ((not self.workorders or event.workorder_id in self.workorders)
+                and (not self.processes or event.process_id in self.processes))
+
+
+class EventHub:
+    """进程内事件分发：有订阅者时由一个后台线程轮询事件表，把新事件推给匹配的订阅者"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cursor = None
+        self._purged_at = 0
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='workorder-events', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _poll(self):
+        if self._cursor is None:
+            self._cursor = EventCursor.latest()
+        events = fetch_events(self._cursor)
+        if time.monotonic() - self._purged_at > 3600:
+            self._purged_at = time.monotonic()
+            purge_expired_events()
+        return events
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        # 没有订阅者时退出，下次订阅时从最新事件重新开始
+                        return
+                    subscribers = list(self._subscribers)
+                events = []
+                try:
+                    events = self._poll()
+                except Exception as e:
+                    logger.warning(f"读取工单事件失败: {e}")
+                finally:
+                    close_old_connections()
+                if events:
+                    # 推送全部事件，订阅者按条件过滤并用事件ID推进自己的游标
+                    for subscriber in subscribers:
+                        try:
+                            if subscriber.notify is not None:
+                                subscriber.notify(events)
+                        except Exception as e:
+                            # 连接的事件循环已关闭等，断开该订阅者，不影响其他连接
+                            logger.warning(f"推送工单事件失败，断开订阅: {e}")
+                            self.unsubscribe(subscriber)
+                if len(events) < EVENT_BATCH_SIZE:
+                    time.sleep(EVENT_POLL_INTERVAL)
+        except Exception:
+            logger.exception("工单事件线程异常退出")
+        finally:
+            with self._lock:
+                # 退出后下次订阅重新启动线程；此前已启动的新线程不受影响
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                    self._cursor = None
+
+
+hub = EventHub()
+
+
+def _catch_up(subscriber, cursor):
+    """
+    断线重连时补发 Last-Event-ID（EventCursor）之后的事件和之前空洞中迟到的事件
+    :return: (SSE 帧列表, 游标)
+    """
+    if cursor is None:
+        return [], EventCursor.latest()
+    oldest = WorkOrderEvent.objects.order_by('pk').values_list('pk', flat=True).first()
+    resume_from = cursor.position
+    frames = []
+    count = 0
+    while count <= EVENT_CATCHUP_LIMIT:
+        events = fetch_events(cursor)
+        if not events:
+            break
+        count += len(events)
+        frames.extend(format_event(event) for event in events if subscriber.wants(event))
+    if (oldest is not None and resume_from + 1 < oldest) or count > EVENT_CATCHUP_LIMIT:
+        # 缺失的事件已被清理或太多，终端应重新加载列表
+        return [f'id: {cursor}\nevent: reset\ndata: {{}}\n\n'], cursor
+    if count:
+        frames.append(cursor_frame(cursor))
+    return frames, cursor
+
+
+def _frames_for(events, subscriber, cursor):
+    """EventHub 推送的一批事件：跳过补发时已发送的，按订阅条件过滤，最后发送游标帧"""
+    fresh = cursor.advance(events)
+    frames = [format_event(event) for event in fresh if subscriber.wants(event)]
+    if fresh:
+        frames.append(cursor_frame(cursor))
+    return frames
+
+
+async def _async_stream(subscriber, cursor):
+    inbox = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    subscriber.notify = lambda events: loop.call_soon_threadsafe(inbox.put_nowait, events)
+    # 先订阅再补发，补发期间到达的事件在队列中等待，按游标去重
+    hub.subscribe(subscriber)
+    try:
+        frames, cursor = await sync_to_async(_catch_up)(subscriber, cursor)
+        yield 'retry: 3000\n\n'
+        for frame in frames:
+            yield frame
+        while True:
+            try:
+                events = await asyncio.wait_for(inbox.get(), EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            for frame in _frames_for(events, subscriber, cursor):
+                yield frame
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def _authenticate_token(request):
+    """?token= 只接受事件流令牌，Authorization 请求头接受 access 令牌；都只用令牌声明，不查 User 表"""
+    from utils.authentication import EventStreamToken, FastJWTAuthentication
+
+    auth = FastJWTAuthentication()
+    try:
+        if request.GET.get('token'):
+            token = EventStreamToken(request.GET['token'])
+        else:
+            header = auth.get_header(request)
+            raw_token = auth.get_raw_token(header) if header else None
+            if not raw_token:
+                return None
+            token = auth.get_validated_token(raw_token)
+        return auth.get_user(token, claims_only=True)
+    except (TokenError, InvalidToken, AuthenticationFailed):
+        return None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def workorder_event_token(request):
+    """POST /api/workorder-events/token/ 签发订阅工单事件流的短期令牌"""
+    from utils.authentication import get_event_stream_token
+
+    token = get_event_stream_token(request.user)
+    return Response({'token': str(token), 'expires_in': int(token.lifetime.total_seconds())})
+
+
+def _id_list(value):
+    ids = set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            ids.add(int(part))
+    return ids
+
+
+async def workorder_event_stream(request):
+    """GET /api/workorder-events/stream/?workorder=1,2&process=3 订阅工单变更事件"""
+    if not settings.ASYNC_POLLING_VIEWS:
+        # 同步工作进程下每个连接会一直占用一个工作进程，几个终端就能占满全部工作进程
+        return JsonResponse({'detail': '工单事件流需要 ASGI 部署（MES_SERVER_MODE=asgi），请继续使用轮询接口。'}, status=503)
+    user = await request.auser()
+    if not user.is_authenticated:
+        user = await sync_to_async(_authenticate_token)(request)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': '身份认证信息未提供或已失效。'}, status=401)
+    cursor = EventCursor.parse(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+    subscriber = Subscriber(_id_list(request.GET.get('workorder')), _id_list(request.GET.get('process')))
+
+    response = StreamingHttpResponse(_async_stream(subscriber, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx 不缓冲事件流
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,24 @@
+"""工单导出，流式写入方式见 basedata.exporters"""
+from basedata.exporters import ExportSheet, keyset_chunks
+
+
+def export_workorders(workorders):
+    """工单列表，一行一个工单，与列表接口一样按创建顺序倒序"""
+    status_names = dict(workorders.model.STATUS_CHOICES)
+    fields = (
+        'id', 'workorder_no', 'order__order_no', 'product__code', 'product__name', 'quantity',
+        'process_code__code', 'process_code__version', 'status', 'plan_start', 'plan_end',
+        'actual_start', 'actual_end', 'remark',
+    )
+
+    def rows():
+        for chunk in keyset_chunks(workorders.values_list(*fields), ['-id']):
+            for _, *row in chunk:
+                row[7] = status_names.get(row[7], row[7])
+                yield row
+
+    columns = [
+        'workorder_no', 'order_no', 'product_code', 'product_name', 'quantity', 'process_code', 'version',
+        'status', 'plan_start', 'plan_end', 'actual_start', 'actual_end', 'remark',
+    ]
+    return ExportSheet('工单', columns, rows(), widths={'A': 20, 'B': 20, 'C': 30, 'D': 30, 'I': 20, 'J': 20, 'K': 20, 'L': 20})
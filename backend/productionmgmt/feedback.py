@@ -0,0 +1,276 @@
+"""
+工序回冲
+
+扫码枪会对同一道工序高频并发回冲，离线缓存后还会一次上传大量回冲，这里保证数量不丢失、重放不重复：
+- 加锁顺序固定：按 (工单ID, step_no) 升序一次性锁定回冲的工序及其下一道工序，工单行最后更新，避免死锁；
+- 在锁内按提交顺序逐条校验和计算，数量用 F() 表达式按增量写回，每道工序只写一次；
+  扣减待加工数量的 UPDATE 另带 pending_quantity >= 扣减量 条件，更新 0 行视为并发冲突，整批回滚；
+- 回冲记录 bulk_create 写入，带幂等键的回冲重复提交时直接返回已有记录；
+- 锁等待超时/死锁时自动重试，仍失败则抛出 FeedbackConflict，由接口返回可重试的 409。
+"""
+import logging
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from basedata.reference_cache import get_reference
+
+from .events import process_quantity_event, record_events, workorder_status_event
+from .models import WorkOrder, WorkOrderProcessDetail, WorkOrderFeedback
+
+logger = logging.getLogger(__name__)
+
+# 锁冲突时的最大尝试次数及重试间隔（秒）
+FEEDBACK_MAX_ATTEMPTS = 3
+FEEDBACK_RETRY_DELAY = 0.05
+# 批量回冲单次最多条数
+FEEDBACK_BATCH_LIMIT = 1000
+
+
+class FeedbackError(Exception):
+    """业务校验失败，不应重试"""
+
+
+class FeedbackConflict(Exception):
+    """并发冲突（锁等待超时、死锁），客户端可稍后重试"""
+
+
+def _process_name(step):
+    # 工序名称从参考数据缓存读取，不锁定工序行
+    process = get_reference('process', step.process_id) or step.process
+    return process.name
+
+
+class _Batch:
+    """一个事务内的回冲：锁定的工序、各工序的数量增量、工单状态变更、待写入的回冲记录"""
+
+    def __init__(self, process_ids):
+        involved = set(process_ids)
+        # 先不加锁读出涉及工单的工序顺序，确定每道回冲工序的下一道工序
+        positions = list(
+            WorkOrderProcessDetail.objects
+            .filter(workorder_id__in=WorkOrderProcessDetail.objects.filter(pk__in=involved).values('workorder_id'))
+            .order_by('workorder_id', 'step_no').values_list('id', 'workorder_id')
+        )
+        successors = {}
+        for (step_id, workorder_id), (next_id, next_workorder_id) in zip(positions, positions[1:]):
+            if workorder_id == next_workorder_id:
+                successors[step_id] = next_id
+        locked = involved | {successors[step_id] for step_id in involved if step_id in successors}
+
+        # 只锁定回冲工序及其下一道工序（完工数量流转到下一道），按 (工单ID, step_no) 升序加锁；
+        # 不 select_related，避免同时锁住多个工单共用的工序（basedata.Process）行
+        self.steps = {}
+        self.next_steps = {}
+        steps = list(WorkOrderProcessDetail.objects.select_for_update()
+                     .filter(pk__in=locked).order_by('workorder_id', 'step_no'))
+        for step in steps:
+            self.steps[step.pk] = step
+        for step_id, next_id in successors.items():
+            if step_id in self.steps and next_id in self.steps:
+                self.next_steps[step_id] = self.steps[next_id]
+
+        self.deltas = defaultdict(lambda: {'completed': Decimal('0'), 'pending': Decimal('0'), 'processed': Decimal('0')})
+        self.step_fields = defaultdict(dict)
+        self.workorder_fields = defaultdict(dict)
+        self.feedbacks = []
+        self.now = timezone.now()
+
+    def apply(self, process_id, completed_qty, defective_qty, defective_reason, remark, user, idempotency_key):
+        """在内存中应用一条回冲，返回结果字典；校验失败抛出 FeedbackError，不影响同批其他回冲"""
+        process_detail = self.steps.get(process_id)
+        if process_detail is None:
+            raise FeedbackError('工序不存在')
+        total_qty = completed_qty + defective_qty
+        if total_qty > process_detail.pending_quantity:
+            raise FeedbackError("总数量不能超过待加工数量")
+
+        process_detail.completed_quantity += completed_qty
+        process_detail.pending_quantity -= total_qty
+        process_detail.processed_quantity += total_qty
+        delta = self.deltas[process_detail.pk]
+        delta['completed'] += completed_qty
+        delta['pending'] -= total_qty
+        delta['processed'] += total_qty
+
+        # 设置工序状态，记录实际开始/结束时间
+        fields = self.step_fields[process_detail.pk]
+        if process_detail.pending_quantity <= 0:
+            fields['status'] = 'completed'
+            fields['actual_end_time'] = self.now
+        else:
+            fields['status'] = 'in_progress'
+        if process_detail.actual_start_time is None:
+            fields['actual_start_time'] = process_detail.actual_start_time = self.now
+        process_detail.status = fields['status']
+
+        # 如果是第一道工序完成，更新工单状态为生产中
+        if process_detail.status == 'completed' and process_detail.step_no == 1:
+            self.workorder_fields[process_detail.workorder_id].update(status='in_progress', actual_start=self.now)
+
+        # 处理工序流转或入库
+        result_message = ""
+        if process_detail.status == 'completed' and completed_qty > 0:
+            next_process = self.next_steps.get(process_detail.pk)
+            # 如果有下一道工序，更新下一道工序的待加工数量
+            if next_process:
+                next_process.pending_quantity += completed_qty
+                self.deltas[next_process.pk]['pending'] += completed_qty
+                result_message = f"已完成当前工序，成品数量{completed_qty}已转移到下一道工序: {_process_name(next_process)}"
+            # 如果是最后一道工序，入库，更新工单状态为已完成
+            else:
+                self.workorder_fields[process_detail.workorder_id].update(status='completed', actual_end=self.now)
+                result_message = f"已完成所有工序，产品数量{completed_qty}已入库"
+
+        feedback = WorkOrderFeedback(
+            workorder_process=process_detail,
+            completed_quantity=completed_qty,
+            defective_quantity=defective_qty,
+            defective_reason=defective_reason,
+            remark=remark,
+            created_by=user,
+            idempotency_key=idempotency_key,
+        )
+        self.feedbacks.append(feedback)
+        return {
+            'feedback': feedback,
+            'completed_quantity': completed_qty,
+            'defective_quantity': defective_qty,
+            'total_quantity': total_qty,
+            'message': result_message
+        }
+
+    def save(self):
+        """按增量写回工序（每道工序一条 UPDATE）、更新工单、批量写入回冲记录"""
+        for step_id, delta in self.deltas.items():
+            rows = WorkOrderProcessDetail.objects.filter(pk=step_id)
+            if delta['pending'] < 0:
+                # 行锁之外的第二道校验：待加工数量不足时不写入，避免扣成负数
+                rows = rows.filter(pending_quantity__gte=-delta['pending'])
+            updated = rows.update(
+                completed_quantity=F('completed_quantity') + delta['completed'],
+                pending_quantity=F('pending_quantity') + delta['pending'],
+                processed_quantity=F('processed_quantity') + delta['processed'],
+                updated_at=self.now,
+                **self.step_fields.get(step_id, {}),
+            )
+            if not updated:
+                raise FeedbackConflict(f"工序{step_id}的待加工数量已被其他回冲修改")
+        for workorder_id, fields in self.workorder_fields.items():
+            WorkOrder.objects.filter(pk=workorder_id).update(**fields)
+        # update() 不触发信号，变更事件在这里显式写入（同一事务）
+        record_events(
+            [process_quantity_event(self.steps[step_id]) for step_id in self.deltas]
+            + [workorder_status_event(workorder_id, fields['status'])
+               for workorder_id, fields in self.workorder_fields.items() if 'status' in fields]
+        )
+        if not self.feedbacks:
+            return
+        WorkOrderFeedback.objects.bulk_create(self.feedbacks)
+        # MySQL 的 bulk_create 不回填主键，按幂等键重新查询
+        if self.feedbacks[0].pk is None:
+            ids = dict(WorkOrderFeedback.objects.filter(
+                idempotency_key__in=[f.idempotency_key for f in self.feedbacks]
+            ).values_list('idempotency_key', 'id'))
+            for feedback in self.feedbacks:
+                feedback.pk = ids.get(feedback.idempotency_key)
+
+
+def _duplicate_result(feedback):
+    return {
+        'feedback_id': feedback.id,
+        'completed_quantity': feedback.completed_quantity,
+        'defective_quantity': feedback.defective_quantity,
+        'total_quantity': feedback.completed_quantity + feedback.defective_quantity,
+        'message': '重复提交，已忽略',
+        'duplicate': True,
+    }
+
+
+def _with_retry(func, label):
+    """在独立事务内执行 func；锁冲突或幂等键并发冲突时重试"""
+    for attempt in range(1, FEEDBACK_MAX_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return func()
+        except (OperationalError, IntegrityError) as e:
+            # MySQL 1205 锁等待超时 / 1213 死锁；SQLite database is locked；并发重放同一幂等键
+            logger.warning(f"{label}冲突(第{attempt}次): {e}")
+            if attempt == FEEDBACK_MAX_ATTEMPTS or transaction.get_connection().in_atomic_block:
+                raise FeedbackConflict(str(e))
+            time.sleep(FEEDBACK_RETRY_DELAY * attempt)
+
+
+def submit_feedback(process_id, completed_qty, defective_qty, defective_reason='', remark='', user=None,
+                    idempotency_key=None):
+    """
+    提交一次工序回冲
+    :param idempotency_key: 幂等键，同一键重复提交时返回已有记录（结果带 duplicate=True）
+    :raises FeedbackError: 工序不存在、数量超出待加工数量
+    :raises FeedbackConflict: 重试后仍发生锁冲突，或写入时待加工数量已不足
+    """
+    def run():
+        if idempotency_key:
+            existing = WorkOrderFeedback.objects.filter(idempotency_key=idempotency_key).first()
+            if existing:
+                return _duplicate_result(existing)
+        batch = _Batch([process_id])
+        result = batch.apply(process_id, completed_qty, defective_qty, defective_reason, remark, user,
+                             idempotency_key or uuid.uuid4().hex)
+        batch.save()
+        result['feedback_id'] = result.pop('feedback').id
+        return result
+
+    return _with_retry(run, f"工序回冲(工序{process_id})")
+
+
+def submit_feedback_batch(items, user=None):
+    """
+    批量提交工序回冲（离线缓存后补传），按提交顺序在一个事务内应用
+    :param items: 已校验的回冲字典列表（workorder_process_id, completed_quantity, defective_quantity,
+                  defective_reason, remark, idempotency_key）
+    :return: 与 items 一一对应的结果列表，status 为 created / duplicate / failed
+    :raises FeedbackConflict: 重试后仍发生锁冲突，或写入时待加工数量已不足
+    """
+    def run():
+        keys = [item.get('idempotency_key') for item in items if item.get('idempotency_key')]
+        existing = {f.idempotency_key: f for f in WorkOrderFeedback.objects.filter(idempotency_key__in=keys)}
+        batch = _Batch([item['workorder_process_id'] for item in items])
+
+        results = []
+        pending = []
+        seen_keys = {}
+        for index, item in enumerate(items):
+            key = item.get('idempotency_key') or None
+            if key in existing:
+                results.append({'index': index, 'idempotency_key': key, 'status': 'duplicate',
+                                **_duplicate_result(existing[key])})
+                continue
+            if key in seen_keys:
+                results.append({'index': index, 'idempotency_key': key, 'status': 'duplicate',
+                                'duplicate_of': seen_keys[key], 'message': '同批次内重复提交，已忽略'})
+                continue
+            try:
+                result = batch.apply(
+                    item['workorder_process_id'], item['completed_quantity'], item['defective_quantity'],
+                    item.get('defective_reason', ''), item.get('remark', ''), user, key or uuid.uuid4().hex,
+                )
+            except FeedbackError as e:
+                results.append({'index': index, 'idempotency_key': key, 'status': 'failed', 'message': str(e)})
+                continue
+            if key:
+                seen_keys[key] = index
+            results.append({'index': index, 'idempotency_key': key, 'status': 'created', **result})
+            pending.append(results[-1])
+
+        batch.save()
+        for result in pending:
+            result['feedback_id'] = result.pop('feedback').id
+        return results
+
+    return _with_retry(run, f"批量工序回冲({len(items)}条)")
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from productionmgmt.feedback import submit_feedback, FeedbackError, FeedbackConflict
+from productionmgmt.models import WorkOrderProcessDetail, WorkOrderFeedback
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = '工序回冲并发压测：多线程并发回冲同一道工序，结束后校验数量是否平衡（会写入真实回冲记录，请在测试库执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('process_id', type=int, help='工单工序ID')
+        parser.add_argument('--threads', type=int, default=8, dest='threads', help='并发线程数')
+        parser.add_argument('--requests', type=int, default=200, dest='requests', help='回冲请求总数')
+        parser.add_argument('--completed', type=Decimal, default=Decimal('1'), dest='completed', help='每次完成数量')
+        parser.add_argument('--defective', type=Decimal, default=Decimal('0'), dest='defective', help='每次不良品数量')
+        parser.add_argument('--user', default=None, dest='user', help='回冲人用户名')
+
+    def handle(self, *args, **options):
+        process_id = options['process_id']
+        completed = options['completed']
+        defective = options['defective']
+        user = User.objects.filter(username=options['user']).first() if options['user'] else None
+
+        before = WorkOrderProcessDetail.objects.filter(pk=process_id).first()
+        if before is None:
+            raise CommandError(f'工序不存在: {process_id}')
+        last_feedback_id = WorkOrderFeedback.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        counts = {'ok': 0, 'rejected': 0, 'conflict': 0, 'error': 0}
+        lock = threading.Lock()
+
+        def fire(_):
+            try:
+                submit_feedback(process_id, completed, defective, remark='load_test_feedback', user=user)
+                outcome = 'ok'
+            except FeedbackError:
+                outcome = 'rejected'
+            except FeedbackConflict:
+                outcome = 'conflict'
+            except Exception as e:
+                logger.error(f"压测回冲异常: {e}", exc_info=True)
+                outcome = 'error'
+            finally:
+                connection.close()
+            with lock:
+                counts[outcome] += 1
+
+        self.stdout.write(
+            f"工序{process_id}: 待加工{before.pending_quantity}, 并发{options['threads']}线程, "
+            f"{options['requests']}次回冲(完成{completed}/不良{defective})"
+        )
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(fire, range(options['requests'])))
+        elapsed = time.monotonic() - started
+
+        after = WorkOrderProcessDetail.objects.get(pk=process_id)
+        totals = WorkOrderFeedback.objects.filter(
+            workorder_process_id=process_id, id__gt=last_feedback_id
+        ).aggregate(completed=Sum('completed_quantity'), defective=Sum('defective_quantity'))
+        fed_completed = totals['completed'] or Decimal('0')
+        fed_total = fed_completed + (totals['defective'] or Decimal('0'))
+        accepted = WorkOrderFeedback.objects.filter(workorder_process_id=process_id, id__gt=last_feedback_id).count()
+
+        checks = [
+            ('成功回冲数 = 新增回冲记录数', counts['ok'] == accepted),
+            ('已加工数量增量 = 回冲总数量', after.processed_quantity - before.processed_quantity == fed_total),
+            ('完成数量增量 = 回冲完成数量', after.completed_quantity - before.completed_quantity == fed_completed),
+            ('待加工数量减少量 = 回冲总数量', before.pending_quantity - after.pending_quantity == fed_total),
+            ('待加工数量不为负', after.pending_quantity >= 0),
+        ]
+
+        self.stdout.write(
+            f"耗时{elapsed:.2f}秒, {options['requests'] / elapsed:.1f}次/秒; "
+            f"成功{counts['ok']}, 拒绝{counts['rejected']}, 冲突{counts['conflict']}, 异常{counts['error']}"
+        )
+        self.stdout.write(
+            f"待加工 {before.pending_quantity} -> {after.pending_quantity}, "
+            f"已加工 {before.processed_quantity} -> {after.processed_quantity}, "
+            f"完成 {before.completed_quantity} -> {after.completed_quantity}"
+        )
+        for name, ok in checks:
+            self.stdout.write(self.style.SUCCESS(f'通过: {name}') if ok else self.style.ERROR(f'失败: {name}'))
+        if not all(ok for _, ok in checks):
+            raise CommandError('数量不平衡')
@@ -120,6 +120,13 @@ class WorkOrderFeedback(models.Model):
         auto_now_add=True, 
         verbose_name="创建时间"
     )
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name="幂等键"
+    )
     
     class Meta:
         verbose_name = '工序回冲记录'
@@ -128,3 +135,24 @@ class WorkOrderFeedback(models.Model):
     def __str__(self):
         return f"{self.workorder_process} - 回冲{self.completed_quantity}"
 
+
+
+class WorkOrderEvent(models.Model):
+    """工单变更事件，供终端通过 SSE 订阅（见 productionmgmt/events.py），按自增ID作为事件游标"""
+    KIND_CHOICES = [
+        ('status', '工单状态变更'),
+        ('released', '工单下达'),
+        ('quantity', '工序数量变更'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="事件类型")
+    workorder = models.ForeignKey(WorkOrder, on_delete=models.CASCADE, related_name='events', verbose_name="工单")
+    process = models.ForeignKey(Process, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="工序")
+    payload = models.JSONField(default=dict, verbose_name="事件内容")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="创建时间")
+
+    class Meta:
+        verbose_name = '工单事件'
+        verbose_name_plural = '工单事件'
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.workorder_id}"
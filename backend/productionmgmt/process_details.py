@@ -0,0 +1,164 @@
+"""
+工单工序明细生成
+
+根据工单的工艺流程代码，把 ProcessDetail 模板展开为 WorkOrderProcessDetail，
+并用产品参数值替换工序内容中的参数表达式。
+多个工单一起生成时，模板和参数值各查询一次，全部明细一次 bulk_create 写入。
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from django.utils import timezone
+
+from basedata.models import ProcessDetail, ProductParamValue
+from .events import record_events, workorder_status_event
+from .models import WorkOrder, WorkOrderProcessDetail
+
+# bulk_create 每批写入的行数
+BULK_BATCH_SIZE = 1000
+
+# ${参数名+数值} 或 ${参数名-数值}
+DOLLAR_BRACE_EXPR_RE = re.compile(r'\$\{([A-Za-z][A-Za-z0-9]*)([\+\-])(\d+(?:\.\d+)?)\}')
+# ${参数名}
+SIMPLE_DOLLAR_BRACE_RE = re.compile(r'\$\{([A-Za-z][A-Za-z0-9]*)\}')
+# 旧格式中直接书写的参数名（比如D和D2）
+PARAM_NAME_RE = re.compile(r'([A-Za-z][A-Za-z0-9]*)')
+# 括号内的加减运算，例如 (20+5)
+PAREN_EXPR_RE = re.compile(r'\((\d+(?:\.\d+)?)([\+\-])(\d+(?:\.\d+)?)\)')
+
+
+@lru_cache(maxsize=256)
+def _param_name_re(param_name):
+    # 只替换独立的参数名（避免部分匹配）
+    return re.compile(r'\b' + re.escape(param_name) + r'\b')
+
+
+def _format_number(result):
+    # 格式化为两位小数，如果是整数则不显示小数点
+    if result.is_integer():
+        return str(int(result))
+    return f"{result:.2f}"
+
+
+def _calc(a, op, b):
+    return a + b if op == '+' else a - b
+
+
+def render_process_content(process_content, param_values):
+    """
+    用产品参数值替换工序内容中的参数
+    :param param_values: {参数名: 参数值}
+    """
+    if not process_content or not param_values:
+        return process_content
+
+    def replace_dollar_brace_expr(match):
+        param_name, op, value = match.groups()
+        if param_name in param_values:
+            return _format_number(_calc(float(param_values[param_name]), op, float(value)))
+        return match.group(0)  # 如果找不到参数值，保留原始表达式
+
+    def replace_simple_dollar_brace(match):
+        return param_values.get(match.group(1), match.group(0))
+
+    process_content = DOLLAR_BRACE_EXPR_RE.sub(replace_dollar_brace_expr, process_content)
+    process_content = SIMPLE_DOLLAR_BRACE_RE.sub(replace_simple_dollar_brace, process_content)
+
+    # 保留原来的参数替换逻辑，以保证兼容性：去重后按长度降序替换（确保先替换D2再替换D）
+    for param_name in sorted(set(PARAM_NAME_RE.findall(process_content)), key=len, reverse=True):
+        if param_name in param_values:
+            value = param_values[param_name]
+            process_content = _param_name_re(param_name).sub(lambda m: value, process_content)
+
+    # 计算表达式，例如将括号内的加减运算处理为结果值
+    def replace_expr(match):
+        a, op, b = match.groups()
+        return _format_number(_calc(float(a), op, float(b)))
+
+    while PAREN_EXPR_RE.search(process_content):
+        process_content = PAREN_EXPR_RE.sub(replace_expr, process_content)
+    return process_content
+
+
+def build_process_details(workorder, templates, param_values):
+    """
+    按工艺流程模板构建（不保存）工单的工序明细
+    :param templates: 该工单工艺流程代码下按 step_no 排序的 ProcessDetail 列表
+    :param param_values: 工单产品的 {参数名: 参数值}
+    """
+    # 计算每道工序的时间
+    if templates and workorder.plan_start and workorder.plan_end:
+        total_duration = (workorder.plan_end - workorder.plan_start).total_seconds() / 60
+        step_duration = total_duration / len(templates)
+    else:
+        step_duration = 0
+
+    details = []
+    for idx, template in enumerate(templates):
+        if workorder.plan_start and step_duration > 0:
+            plan_start = workorder.plan_start + timezone.timedelta(minutes=step_duration * idx)
+            plan_end = workorder.plan_start + timezone.timedelta(minutes=step_duration * (idx + 1))
+        else:
+            plan_start = None
+            plan_end = None
+
+        details.append(WorkOrderProcessDetail(
+            workorder=workorder,
+            step_no=template.step_no,
+            process_id=template.step_id,
+            machine_time=template.machine_time,
+            labor_time=template.labor_time,
+            process_content=render_process_content(template.process_content, param_values),
+            plan_start_time=plan_start,
+            plan_end_time=plan_end,
+            # 只有第一道工序的待加工数量设为工单数量，其他工序设为0
+            pending_quantity=workorder.quantity if idx == 0 else 0,
+            processed_quantity=0,
+            completed_quantity=0,
+            status='pending',
+            program_file=template.program_file.name,
+        ))
+    return details
+
+
+def generate_process_details(workorders):
+    """
+    为多个工单批量生成工序明细，生成后工单状态更新为"待打印"
+    没有工艺流程代码的工单跳过
+    :return: 生成的工序明细数量
+    """
+    workorders = [wo for wo in workorders if wo.process_code_id]
+    if not workorders:
+        return 0
+
+    templates = defaultdict(list)
+    for template in ProcessDetail.objects.filter(
+        process_code_id__in={wo.process_code_id for wo in workorders}
+    ).order_by('step_no'):
+        templates[template.process_code_id].append(template)
+
+    param_values = defaultdict(dict)
+    for value in ProductParamValue.objects.filter(
+        product_id__in={wo.product_id for wo in workorders if wo.product_id}
+    ).select_related('param'):
+        param_values[value.product_id][value.param.name] = value.value
+
+    details = []
+    for workorder in workorders:
+        details.extend(build_process_details(
+            workorder, templates.get(workorder.process_code_id, []), param_values.get(workorder.product_id, {})
+        ))
+    WorkOrderProcessDetail.objects.bulk_create(details, batch_size=BULK_BATCH_SIZE)
+
+    WorkOrder.objects.filter(pk__in=[wo.pk for wo in workorders]).update(status='print')
+    # update() 不触发信号，状态变更事件在这里显式写入
+    record_events([
+        workorder_status_event(wo.pk, 'print', wo.status, wo.workorder_no)
+        for wo in workorders if wo.status != 'print'
+    ])
+    for workorder in workorders:
+        workorder.status = 'print'
+        # 同一实例之后再 save() 时不重复记录该变更
+        workorder._event_status = 'print'
+    return len(details)
@@ -0,0 +1,153 @@
+"""
+按销售订单批量下达工单
+
+一次调用为多个订单创建工单：默认工艺流程代码按产品类/产品批量解析，
+工单 bulk_create 后一次性生成全部工序明细（见 process_details.generate_process_details）。
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from basedata.models import ProductCategoryProcessCode, ProductProcessCode
+from salesmgmt.models import Order
+from .events import record_events, workorder_status_event
+from .models import WorkOrder
+from .process_details import generate_process_details
+
+# bulk_create / IN 查询每批的行数
+BULK_BATCH_SIZE = 1000
+
+
+class ReleaseConflict(Exception):
+    """同一批订单正被其他请求下达（工单号唯一约束冲突），客户端可刷新后重试"""
+
+
+def orders_without_workorder():
+    """未被工单关联的订单"""
+    return Order.objects.filter(~Exists(WorkOrder.objects.filter(order_id=OuterRef('pk'))))
+
+
+def resolve_default_process_codes(products):
+    """
+    批量解析产品的默认工艺流程代码，优先级与单个工单创建一致：先产品类默认，再产品默认
+    :return: {product_id: process_code_id}
+    """
+    products = [p for p in products if p is not None]
+    category_defaults = {}
+    for link in ProductCategoryProcessCode.objects.filter(
+        category_id__in={p.category_id for p in products}, is_default=True
+    ).order_by('id'):
+        category_defaults.setdefault(link.category_id, link.process_code_id)
+
+    product_defaults = {}
+    for link in ProductProcessCode.objects.filter(
+        product_id__in=[p.id for p in products if p.category_id not in category_defaults], is_default=True
+    ).order_by('id'):
+        product_defaults.setdefault(link.product_id, link.process_code_id)
+
+    resolved = {}
+    for product in products:
+        process_code_id = category_defaults.get(product.category_id) or product_defaults.get(product.id)
+        if process_code_id:
+            resolved[product.id] = process_code_id
+    return resolved
+
+
+def _as_datetime(value):
+    # 将日期转换为日期时间
+    if not value:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(value, datetime.time.min))
+
+
+def _create_workorders(workorders):
+    """批量创建工单并回填主键"""
+    WorkOrder.objects.bulk_create(workorders, batch_size=BULK_BATCH_SIZE)
+    # MySQL 的 bulk_create 不回填主键，按工单号重新查询
+    if workorders and workorders[0].pk is None:
+        nos = [wo.workorder_no for wo in workorders]
+        ids = {}
+        for start in range(0, len(nos), BULK_BATCH_SIZE):
+            ids.update(WorkOrder.objects.filter(workorder_no__in=nos[start:start + BULK_BATCH_SIZE])
+                       .values_list('workorder_no', 'id'))
+        for wo in workorders:
+            wo.pk = ids[wo.workorder_no]
+    # bulk_create 不触发信号，新工单的状态事件在这里显式写入
+    record_events([workorder_status_event(wo.pk, wo.status, workorder_no=wo.workorder_no) for wo in workorders])
+    for wo in workorders:
+        wo._event_status = wo.status
+
+
+def release_orders(orders):
+    """
+    为订单批量创建工单并生成工序明细，在一个事务内完成
+    已有工单或重复传入的订单跳过；产品没有默认工艺流程代码的工单保持草稿状态
+    :param orders: Order 查询集或列表
+    :return: 汇总结果字典
+    :raises ReleaseConflict: 并发下达同一订单，工单号冲突，整批回滚
+    """
+    skipped = []
+    unique_orders = {}
+    for order in orders:
+        if order.id in unique_orders:
+            skipped.append({'order_id': order.id, 'order_no': order.order_no, 'reason': '订单重复'})
+        else:
+            unique_orders[order.id] = order
+    orders = list(unique_orders.values())
+
+    linked = set()
+    existing_nos = set()
+    order_ids = [o.id for o in orders]
+    workorder_nos = [f"WO{o.order_no}" for o in orders]
+    for start in range(0, len(orders), BULK_BATCH_SIZE):
+        linked.update(WorkOrder.objects.filter(order_id__in=order_ids[start:start + BULK_BATCH_SIZE])
+                      .values_list('order_id', flat=True))
+        existing_nos.update(WorkOrder.objects.filter(workorder_no__in=workorder_nos[start:start + BULK_BATCH_SIZE])
+                            .values_list('workorder_no', flat=True))
+
+    to_release = []
+    for order in orders:
+        if order.id in linked:
+            skipped.append({'order_id': order.id, 'order_no': order.order_no, 'reason': '订单已有工单'})
+        elif f"WO{order.order_no}" in existing_nos:
+            skipped.append({'order_id': order.id, 'order_no': order.order_no, 'reason': '工单号已存在'})
+        else:
+            to_release.append(order)
+
+    process_codes = resolve_default_process_codes(order.product for order in to_release)
+
+    workorders = [
+        WorkOrder(
+            workorder_no=f"WO{order.order_no}",
+            order=order,
+            product=order.product,
+            quantity=order.quantity,
+            process_code_id=process_codes.get(order.product_id),
+            plan_start=_as_datetime(order.order_date),
+            plan_end=_as_datetime(order.plan_delivery),
+            status='draft',
+            remark=f"由订单{order.order_no}自动生成",
+        )
+        for order in to_release
+    ]
+
+    try:
+        with transaction.atomic():
+            _create_workorders(workorders)
+            detail_count = generate_process_details(workorders)
+    except IntegrityError as e:
+        # 检查已有工单之后、提交之前，另一个请求下达了同一订单
+        raise ReleaseConflict(str(e))
+
+    return {
+        'created': len(workorders),
+        'process_details': detail_count,
+        'skipped': skipped,
+        'without_process_code': [wo.workorder_no for wo in workorders if not wo.process_code_id],
+        'workorders': [
+            {'id': wo.id, 'workorder_no': wo.workorder_no, 'order_id': wo.order_id, 'status': wo.status}
+            for wo in workorders
+        ],
+    }
@@ -3,6 +3,7 @@ from .models import WorkOrder, WorkOrderProcessDetail, WorkOrderFeedback
 from salesmgmt.models import Order
 from basedata.models import Product, ProcessCode
 from basedata.serializers import ProductSerializer, CustomerSerializer, MaterialSerializer
+from utils.serializers import DynamicFieldsMixin
 
 class WorkOrderProcessDetailSerializer(serializers.ModelSerializer):
     process_name = serializers.CharField(source='process.name', read_only=True)
@@ -23,7 +24,8 @@ class WorkOrderProcessDetailSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(url)
         return url
 
-class WorkOrderSerializer(serializers.ModelSerializer):
+class WorkOrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ('process_details',)
     process_details = WorkOrderProcessDetailSerializer(many=True, read_only=True)
     order_no = serializers.SerializerMethodField(read_only=True)
     product_code = serializers.SerializerMethodField(read_only=True)
@@ -62,27 +64,47 @@ class WorkOrderFeedbackSerializer(serializers.ModelSerializer):
         model = WorkOrderFeedback
         fields = [
             'id', 'workorder_process', 'completed_quantity', 'defective_quantity',
-            'defective_reason', 'remark', 'created_by', 'created_at'
+            'defective_reason', 'remark', 'created_by', 'created_at', 'idempotency_key'
         ]
         read_only_fields = ['created_by', 'created_at']
 
-class WorkOrderFeedbackCreateSerializer(serializers.Serializer):
+class WorkOrderFeedbackItemSerializer(serializers.Serializer):
+    """单条回冲数据（不查询数据库，批量回冲逐条使用）"""
     workorder_process_id = serializers.IntegerField()
     completed_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
     defective_quantity = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
     defective_reason = serializers.CharField(required=False, allow_blank=True)
     remark = serializers.CharField(required=False, allow_blank=True)
-    
+    idempotency_key = serializers.CharField(required=False, allow_blank=True, max_length=64)
+
     def validate(self, data):
         """
-        验证总数量不超过待加工数量，并且不良品有原因
+        验证数量大于0，并且不良品有原因
         """
         completed = data.get('completed_quantity', 0)
         defective = data.get('defective_quantity', 0)
-        total = completed + defective
-        
-        if total <= 0:
+
+        if completed + defective <= 0:
             raise serializers.ValidationError("完成数量和不良品数量总和必须大于0")
+
+        # 检查不良品原因
+        if defective > 0 and not data.get('defective_reason'):
+            raise serializers.ValidationError("存在不良品时必须填写不良原因")
+
+        return data
+
+class WorkOrderFeedbackCreateSerializer(WorkOrderFeedbackItemSerializer):
+    def validate(self, data):
+        """
+        验证总数量不超过待加工数量，并且不良品有原因
+        """
+        data = super().validate(data)
+        total = data.get('completed_quantity', 0) + data.get('defective_quantity', 0)
+
+        # 重复提交（幂等键已存在）不再校验数量，由回冲处理直接返回已有记录
+        key = data.get('idempotency_key')
+        if key and WorkOrderFeedback.objects.filter(idempotency_key=key).exists():
+            return data
         
         # 检查工序是否存在
         try:
@@ -98,9 +120,4 @@ class WorkOrderFeedbackCreateSerializer(serializers.Serializer):
                 f"总数量不能超过待加工数量({workorder_process.pending_quantity})"
             )
             
-        # 检查不良品原因
-        if defective > 0 and not data.get('defective_reason'):
-            raise serializers.ValidationError("存在不良品时必须填写不良原因")
-            
         return data
-
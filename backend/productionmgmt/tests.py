@@ -1,3 +1,535 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from basedata.models import Company, ProductCategory, Product, ProcessCode, Process
+from salesmgmt.models import Order
+from .models import WorkOrder, WorkOrderEvent, WorkOrderFeedback, WorkOrderProcessDetail
+
+
+class WorkOrderListQueryCountTests(TestCase):
+    """工单列表每页查询数固定，不随行数和工序数增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='x')
+        company = Company.objects.create(name='测试公司')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        process_code = ProcessCode.objects.create(code='PC1', version='1')
+        processes = [Process.objects.create(code=f'S{i}', name=f'工序{i}') for i in range(3)]
+        for i in range(25):
+            product = Product.objects.create(code=f'P{i}', name=f'产品{i}', price=1, category=category)
+            order = Order.objects.create(
+                order_no=f'O{i}', company=company, order_date='2026-01-01', product=product,
+                quantity=10, unit_price=1, plan_delivery='2026-02-01',
+            )
+            workorder = WorkOrder.objects.create(
+                workorder_no=f'WO{i}', order=order, product=product, quantity=10, process_code=process_code,
+            )
+            for step_no, process in enumerate(processes, start=1):
+                WorkOrderProcessDetail.objects.create(
+                    workorder=workorder, step_no=step_no, process=process,
+                    machine_time=Decimal('1'), labor_time=Decimal('1'),
+                )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_page_query_count(self):
+        # 分页计数 + 工单(关联订单/产品/工艺流程) + 工序明细(关联工序)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/workorders/')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(results[0]['process_details']), 3)
+        self.assertEqual(results[0]['process_details'][0]['process_name'], '工序0')
+        self.assertTrue(results[0]['order_no'].startswith('O'))
+
+    def test_list_without_nested_details(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/workorders/', {'expand': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('process_details', response.data['results'][0])
+        self.assertIn('product_name', response.data['results'][0])
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/workorders/', {'fields': 'id,workorder_no,status'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'workorder_no', 'status'})
+
+    async def test_async_list_view_matches_sync_list(self):
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncRequestFactory
+        from utils.async_views import async_list_view
+        from utils.authentication import get_tokens_for_user
+        from .views import WorkOrderProcessDetailViewSet, WorkOrderViewSet
+
+        token = (await sync_to_async(get_tokens_for_user)(self.user))['access']
+        factory = AsyncRequestFactory()
+        headers = {'Authorization': f'Bearer {token}'}
+        for url, viewset, params in [
+            ('/api/workorders/', WorkOrderViewSet, {'page': 2}),
+            ('/api/workorder-process-details/', WorkOrderProcessDetailViewSet, {'current': 'true'}),
+        ]:
+            view = async_list_view(viewset, {'get': 'list', 'post': 'create'})
+            response = await view(factory.get(url, params, headers=headers))
+            expected = await sync_to_async(self.client.get)(url, params)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertEqual(response.data, expected.data)
+
+        # 无效页码与同步接口一样交给异常处理器
+        response = await async_list_view(WorkOrderViewSet, {'get': 'list'})(factory.get('/api/workorders/', {'page': 9}, headers=headers))
+        expected = await sync_to_async(self.client.get)('/api/workorders/', {'page': 9})
+        self.assertEqual((response.status_code, response.data), (expected.status_code, expected.data))
+        response = await async_list_view(WorkOrderViewSet, {'get': 'list'})(factory.get('/api/workorders/'))
+        self.assertNotEqual(response.status_code, 200)
+
+    def test_workorder_events(self):
+        from .events import EventCursor, Subscriber, _catch_up
+        from .feedback import submit_feedback
+
+        workorder = WorkOrder.objects.get(workorder_no='WO0')
+        workorder.status = 'print'
+        workorder.save()
+        workorder.status = 'released'
+        workorder.save(update_fields=['status'])
+        first, second = workorder.process_details.order_by('step_no')[:2]
+        WorkOrderProcessDetail.objects.filter(pk=first.pk).update(pending_quantity=10)
+        submit_feedback(first.pk, Decimal('10'), Decimal('0'), user=self.user)
+
+        events = list(WorkOrderEvent.objects.filter(workorder=workorder).order_by('pk'))
+        self.assertEqual([e.kind for e in events], ['status', 'released', 'quantity', 'quantity', 'status'])
+        self.assertEqual(events[1].payload['previous'], 'print')
+        self.assertEqual(events[3].payload, {
+            'detail': second.pk, 'step_no': 2, 'status': 'pending',
+            'pending_quantity': '10.00', 'processed_quantity': '0.00', 'completed_quantity': '0.00',
+        })
+        self.assertEqual(events[4].payload['status'], 'in_progress')
+
+        # 断线重连：按工序订阅只补发该工序的事件
+        frames, cursor = _catch_up(Subscriber(processes={second.process_id}), EventCursor.parse(str(events[0].pk)))
+        self.assertEqual(str(cursor), str(events[-1].pk))
+        self.assertEqual(len(frames), 2)
+        self.assertTrue(frames[0].startswith(f'event: quantity\ndata: {{"id":{events[3].pk},'))
+        self.assertEqual(frames[1], f'id: {events[-1].pk}\n\n')
+
+    def test_event_cursor_rechecks_gaps(self):
+        from .events import EVENT_GAP_WAIT_SECONDS, EventCursor, fetch_events
+
+        workorder = WorkOrder.objects.get(workorder_no='WO0')
+        events = [WorkOrderEvent.objects.create(kind='status', workorder=workorder, payload={'status': s})
+                  for s in ('print', 'released', 'in_progress')]
+        # 中间的事件所在事务尚未提交：先返回已提交的，空洞记入游标
+        WorkOrderEvent.objects.filter(pk=events[1].pk).delete()
+        cursor = EventCursor.parse(str(events[0].pk - 1))
+        self.assertEqual(fetch_events(cursor), [events[0], events[2]])
+        self.assertEqual(str(cursor), f'{events[2].pk}-{events[1].pk}')
+        # 游标文本（Last-Event-ID）保留空洞
+        cursor = EventCursor.parse(str(cursor))
+        self.assertEqual(fetch_events(cursor), [])
+        # 迟到提交的事件补发，不重复返回已读事件
+        events[1].save()
+        self.assertEqual(fetch_events(cursor), [events[1]])
+        self.assertEqual((str(cursor), fetch_events(cursor)), (str(events[2].pk), []))
+
+        # 超过等待时间仍未出现的空洞不再检查
+        WorkOrderEvent.objects.filter(pk=events[1].pk).delete()
+        cursor = EventCursor(events[2].pk, [events[1].pk])
+        with mock.patch('productionmgmt.events.time.monotonic', return_value=cursor.gaps[events[1].pk] + EVENT_GAP_WAIT_SECONDS):
+            self.assertEqual(fetch_events(cursor), [])
+        self.assertEqual(cursor.gaps, {})
+        self.assertIsNone(EventCursor.parse('1;DROP'))
+
+    def test_event_hub_drops_failing_subscriber(self):
+        import threading
+        from .events import EventCursor, EventHub, Subscriber
+
+        workorder = WorkOrder.objects.get(workorder_no='WO0')
+        start = WorkOrderEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        WorkOrderEvent.objects.create(kind='status', workorder=workorder, payload={'status': 'print'})
+        hub = EventHub()
+        closed, alive = Subscriber(), Subscriber()
+        closed.notify = mock.Mock(side_effect=RuntimeError('Event loop is closed'))
+        alive.notify = mock.Mock(side_effect=lambda events: hub.unsubscribe(alive))
+        hub._subscribers.update({closed, alive})
+        hub._thread = threading.current_thread()
+        hub._cursor = EventCursor(start)
+        with mock.patch('productionmgmt.events.time.sleep'), \
+                mock.patch('productionmgmt.events.close_old_connections'), \
+                self.assertLogs('productionmgmt.events', 'WARNING'):
+            hub._run()
+        # 推送失败的订阅者被断开，其他订阅者照常收到事件；线程退出后可以重新启动
+        self.assertEqual(len(alive.notify.call_args.args[0]), 1)
+        self.assertEqual(hub._subscribers, set())
+        self.assertIsNone(hub._thread)
+
+    async def test_event_stream_requires_asgi_and_login(self):
+        from asgiref.sync import sync_to_async
+        from django.db import connection
+        from django.test import AsyncClient, RequestFactory, override_settings
+        from django.test.utils import CaptureQueriesContext
+        from utils.authentication import get_tokens_for_user
+        from .events import _authenticate_token, hub
+
+        def authenticate_with_claims(token):
+            # 事件流令牌只用声明认证，不查 User 表
+            with CaptureQueriesContext(connection) as queries:
+                user = _authenticate_token(RequestFactory().get('/', {'token': token}))
+            return user.username, [q['sql'] for q in queries if 'auth_user' in q['sql']]
+
+        client = AsyncClient()
+        with override_settings(ASYNC_POLLING_VIEWS=False):
+            await client.aforce_login(self.user)
+            self.assertEqual((await client.get('/api/workorder-events/stream/')).status_code, 503)
+        with override_settings(ASYNC_POLLING_VIEWS=True), \
+                mock.patch.object(hub, 'subscribe') as subscribe, mock.patch.object(hub, 'unsubscribe'):
+            self.assertEqual((await AsyncClient().get('/api/workorder-events/stream/')).status_code, 401)
+            # 会话登录即可订阅
+            response = await client.get('/api/workorder-events/stream/', {'workorder': '1,2'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = aiter(response.streaming_content)
+            self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+            self.assertEqual(subscribe.call_args.args[0].workorders, {1, 2})
+            await stream.aclose()
+
+            # 没有会话的终端：?token= 只接受短期事件流令牌，不接受 access 令牌
+            access = (await sync_to_async(get_tokens_for_user)(self.user))['access']
+            anonymous = AsyncClient()
+            response = await anonymous.get('/api/workorder-events/stream/', {'token': access})
+            self.assertEqual(response.status_code, 401)
+            response = await anonymous.post('/api/workorder-events/token/', headers={'Authorization': f'Bearer {access}'})
+            self.assertEqual(response.status_code, 200)
+            token = response.json()['token']
+            self.assertEqual(response.json()['expires_in'], 60)
+            response = await anonymous.get('/api/workorder-events/stream/', {'token': token})
+            self.assertEqual(response.status_code, 200)
+            await response.streaming_content.aclose()
+            self.assertEqual(await sync_to_async(authenticate_with_claims)(token), ('planner', []))
+            # 事件流令牌不能用于其他接口
+            response = await anonymous.get('/api/workorders/', headers={'Authorization': f'Bearer {token}'})
+            self.assertNotEqual(response.status_code, 200)
+
+
+class OrdersWithoutWorkOrderTests(TestCase):
+    """未建工单订单：NOT EXISTS 过滤，按交货期游标分页，每页一条查询"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='x')
+        company = Company.objects.create(name='测试公司')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        product = Product.objects.create(code='P1', name='产品1', price=1, category=category)
+        for i in range(7):
+            order = Order.objects.create(
+                order_no=f'O{i}', company=company, order_date='2026-01-01', product=product,
+                quantity=1, unit_price=1, plan_delivery=f'2026-02-{10 - i:02d}',
+            )
+            if i % 3 == 0:
+                WorkOrder.objects.create(workorder_no=f'WO{i}', order=order, product=product, quantity=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_pages_by_due_date(self):
+        url = '/api/orders-without-workorder/?page_size=2'
+        order_nos = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            order_nos += [order['order_no'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(order_nos, ['O5', 'O4', 'O2', 'O1'])
+
+    def test_cursor_pages_through_ties(self):
+        # 下单日期全部相同：游标按 (order_date, id) 定位，翻页期间插入同日订单也不重复
+        company, product = Order.objects.values_list('company', 'product').first()
+        url = '/api/orders-without-workorder/?page_size=2&ordering=-order_date'
+        response = self.client.get(url)
+        order_nos = [order['order_no'] for order in response.data['results']]
+        Order.objects.create(order_no='O9', company_id=company, order_date='2026-01-01', product_id=product,
+                             quantity=1, unit_price=1, plan_delivery='2026-02-01')
+        response = self.client.get(response.data['next'])
+        order_nos += [order['order_no'] for order in response.data['results']]
+        self.assertEqual(order_nos, ['O5', 'O4', 'O2', 'O1'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([order['order_no'] for order in response.data['results']], ['O5', 'O4'])
+
+    def test_filters(self):
+        response = self.client.get('/api/orders-without-workorder/', {'due_after': '2026-02-06', 'search': 'O'})
+        self.assertEqual([order['order_no'] for order in response.data['results']], ['O4', 'O2', 'O1'])
+
+
+class ProcessDetailGenerationTests(TestCase):
+    """工序明细批量生成：模板和参数值各查询一次，参数表达式按产品参数值替换"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from basedata.models import CategoryParam, ProcessDetail, ProductParamValue
+
+        company = Company.objects.create(name='测试公司')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        cls.process_code = ProcessCode.objects.create(code='PC1', version='1')
+        contents = ['车外圆 ${D+5}', '钻孔 D2', '倒角 (D+1)']
+        for step_no, content in enumerate(contents, start=1):
+            ProcessDetail.objects.create(
+                process_code=cls.process_code, step_no=step_no,
+                step=Process.objects.create(code=f'S{step_no}', name=f'工序{step_no}'),
+                machine_time=1, labor_time=2, process_content=content,
+            )
+        params = {name: CategoryParam.objects.create(category=category, name=name) for name in ('D', 'D2')}
+        cls.products = []
+        for i, (d, d2) in enumerate([('20', '8'), ('30', '10')]):
+            product = Product.objects.create(code=f'P{i}', name=f'产品{i}', price=1, category=category)
+            ProductParamValue.objects.create(product=product, param=params['D'], value=d)
+            ProductParamValue.objects.create(product=product, param=params['D2'], value=d2)
+            cls.products.append(product)
+
+    def test_render_process_content(self):
+        from .process_details import render_process_content
+
+        values = {'D': '20', 'D2': '8', 'L': '12.5'}
+        self.assertEqual(render_process_content('外径${D-0.5} 长${L}', values), '外径19.50 长12.5')
+        # 旧格式先替换较长的参数名，括号内的加减再求值
+        self.assertEqual(render_process_content('D2 孔 (D+2)', values), '8 孔 22')
+        self.assertEqual(render_process_content('${X+1}', values), '${X+1}')
+        self.assertIsNone(render_process_content(None, values))
+
+    def test_generate_for_many_workorders(self):
+        import datetime
+        from django.utils import timezone
+        from .process_details import generate_process_details
+
+        start = timezone.make_aware(datetime.datetime(2026, 1, 1))
+        workorders = [
+            WorkOrder.objects.create(
+                workorder_no=f'WO{i}', product=product, quantity=6, process_code=self.process_code,
+                plan_start=start, plan_end=start + datetime.timedelta(hours=3),
+            )
+            for i, product in enumerate(self.products)
+        ]
+        draft = WorkOrder.objects.create(workorder_no='WO-DRAFT', product=self.products[0], quantity=1)
+        # 模板 + 参数值 + 批量插入 + 更新工单状态 + 状态变更事件
+        with self.assertNumQueries(5):
+            self.assertEqual(generate_process_details([*workorders, draft]), 6)
+
+        details = list(WorkOrderProcessDetail.objects.filter(workorder=workorders[1]).order_by('step_no'))
+        self.assertEqual([d.process_content for d in details], ['车外圆 35', '钻孔 10', '倒角 31'])
+        self.assertEqual([d.pending_quantity for d in details], [6, 0, 0])
+        self.assertEqual([d.plan_start_time - start for d in details],
+                         [datetime.timedelta(hours=h) for h in range(3)])
+        self.assertEqual(set(WorkOrder.objects.values_list('workorder_no', 'status')),
+                         {('WO0', 'print'), ('WO1', 'print'), ('WO-DRAFT', 'draft')})
+        events = WorkOrderEvent.objects.filter(payload__status='print')
+        self.assertEqual(sorted(e.payload['workorder_no'] for e in events), ['WO0', 'WO1'])
+        self.assertEqual({e.payload['previous'] for e in events}, {'draft'})
+        # 同一实例再保存不重复记录
+        workorders[0].save()
+        self.assertEqual(WorkOrderEvent.objects.filter(payload__status='print').count(), 2)
+
+
+class FeedbackTests(TestCase):
+    """工序回冲：数量流转、状态变更、幂等键、批量回冲"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='x')
+        company = Company.objects.create(name='测试公司')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        product = Product.objects.create(code='P1', name='产品1', price=1, category=category)
+        process_code = ProcessCode.objects.create(code='PC1', version='1')
+        cls.processes = [Process.objects.create(code=f'S{i}', name=f'工序{i}') for i in range(3)]
+        cls.workorders = []
+        for i in range(2):
+            workorder = WorkOrder.objects.create(
+                workorder_no=f'WO{i}', product=product, quantity=10, process_code=process_code, status='released',
+            )
+            for step_no, process in enumerate(cls.processes, start=1):
+                WorkOrderProcessDetail.objects.create(
+                    workorder=workorder, step_no=step_no, process=process,
+                    pending_quantity=10 if step_no == 1 else 0, machine_time=Decimal('1'), labor_time=Decimal('1'),
+                )
+            cls.workorders.append(workorder)
+
+    def steps(self, workorder):
+        return list(workorder.process_details.order_by('step_no'))
+
+    def test_batch_locks_only_feedback_steps_and_successors(self):
+        from .feedback import _Batch
+
+        first, second, third = self.steps(self.workorders[0])
+        other = self.steps(self.workorders[1])[2]
+        batch = _Batch([first.pk, other.pk])
+        self.assertEqual(set(batch.steps), {first.pk, second.pk, other.pk})
+        self.assertEqual(batch.next_steps, {first.pk: batch.steps[second.pk]})
+
+    def test_save_rejects_when_pending_quantity_changed(self):
+        from django.db import transaction
+        from .feedback import FeedbackConflict, _Batch
+
+        first = self.steps(self.workorders[0])[0]
+        with self.assertRaises(FeedbackConflict), transaction.atomic():
+            batch = _Batch([first.pk])
+            batch.apply(first.pk, Decimal('8'), Decimal('0'), '', '', self.user, 'k1')
+            # 绕过行锁的写入使待加工数量少于扣减量
+            WorkOrderProcessDetail.objects.filter(pk=first.pk).update(pending_quantity=5)
+            batch.save()
+        first.refresh_from_db()
+        self.assertEqual(first.pending_quantity, 10)
+        self.assertFalse(WorkOrderFeedback.objects.exists())
+
+    def feedback(self, step, completed, defective=0, **extra):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post('/api/workorder-process-details/feedback/', {
+            'workorder_process_id': step.pk, 'completed_quantity': completed, 'defective_quantity': defective,
+            'defective_reason': '划伤' if defective else '', **extra,
+        }, format='json')
+
+    def test_feedback_moves_quantity_and_replays_idempotently(self):
+        from .feedback import FeedbackError, submit_feedback
+        from .models import WorkOrderEvent
+
+        first, second, third = self.steps(self.workorders[0])
+        response = self.feedback(first, 4, 1, idempotency_key='scan-1')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.steps(self.workorders[0])[0].pending_quantity, 5)
+
+        response = self.feedback(first, 5, idempotency_key='scan-2')
+        self.assertIn('已转移到下一道工序: 工序1', response.data['data']['message'])
+        first, second, third = self.steps(self.workorders[0])
+        self.assertEqual((first.status, first.completed_quantity, first.processed_quantity), ('completed', 9, 10))
+        self.assertEqual((second.pending_quantity, third.pending_quantity), (5, 0))
+        self.assertEqual(WorkOrder.objects.get(pk=self.workorders[0].pk).status, 'in_progress')
+        self.assertEqual(WorkOrderEvent.objects.filter(kind='quantity').count(), 3)
+
+        # 重放同一幂等键：返回已有记录，数量不变
+        response = self.feedback(first, 5, idempotency_key='scan-2')
+        self.assertTrue(response.data['data']['duplicate'])
+        self.assertEqual(WorkOrderFeedback.objects.count(), 2)
+        self.assertEqual(self.steps(self.workorders[0])[1].pending_quantity, 5)
+
+        with self.assertRaisesMessage(FeedbackError, '总数量不能超过待加工数量'):
+            submit_feedback(second.pk, Decimal('6'), Decimal('0'), user=self.user)
+
+    def test_feedback_conflict_is_retryable(self):
+        from django.db import OperationalError
+
+        first = self.steps(self.workorders[0])[0]
+        with mock.patch('productionmgmt.feedback._Batch', side_effect=OperationalError('database is locked')):
+            response = self.feedback(first, 1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertTrue(response.data['data']['retryable'])
+
+    def test_feedback_batch_results_per_item(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        first = self.steps(self.workorders[0])[0]
+        other = self.steps(self.workorders[1])[0]
+        self.feedback(first, 2, idempotency_key='old')
+
+        def item(step, qty, key=None):
+            return {'workorder_process_id': step.pk, 'completed_quantity': qty, 'defective_quantity': 0,
+                    'idempotency_key': key}
+
+        response = client.post('/api/workorder-process-details/feedback-batch/', {'items': [
+            item(first, 2, 'old'), item(first, 3, 'a'), item(first, 3, 'a'), item(first, 6, 'b'),
+            item(other, 10, 'c'), {'workorder_process_id': other.pk}, item(first, 5, 'd'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        data = response.data['data']
+        self.assertEqual([r['status'] for r in data['results']],
+                         ['duplicate', 'created', 'duplicate', 'failed', 'created', 'failed', 'created'])
+        self.assertEqual(data['results'][2]['duplicate_of'], 1)
+        self.assertEqual((data['created'], data['duplicate'], data['failed']), (3, 2, 2))
+        # 按提交顺序应用：第4条超出剩余的5，第7条正好用完
+        first, second, _ = self.steps(self.workorders[0])
+        self.assertEqual((first.pending_quantity, first.status, second.pending_quantity), (0, 'completed', 5))
+        self.assertEqual(self.steps(self.workorders[1])[1].pending_quantity, 10)
+        self.assertEqual(WorkOrderFeedback.objects.count(), 4)
+
+
+class ReleaseOrdersTests(TestCase):
+    """按订单批量下达工单：默认工艺流程代码、工序明细、跳过已下达/重复订单、并发冲突"""
+
+    @classmethod
+    def setUpTestData(cls):
+        from basedata.models import ProcessDetail, ProductCategoryProcessCode
+
+        cls.user = User.objects.create_user('planner', password='x')
+        company = Company.objects.create(name='测试公司')
+        category = ProductCategory.objects.create(company=company, code='C1', display_name='轴')
+        bare = ProductCategory.objects.create(company=company, code='C2', display_name='套')
+        process_code = ProcessCode.objects.create(code='PC1', version='1')
+        ProductCategoryProcessCode.objects.create(category=category, process_code=process_code, is_default=True)
+        for step_no in (1, 2):
+            ProcessDetail.objects.create(
+                process_code=process_code, step_no=step_no, step=Process.objects.create(code=f'S{step_no}', name=f'工序{step_no}'),
+                machine_time=1, labor_time=1,
+            )
+        cls.orders = [
+            Order.objects.create(
+                order_no=f'O{i}', company=company, order_date='2026-01-01', quantity=5, unit_price=1,
+                plan_delivery='2026-02-01',
+                product=Product.objects.create(code=f'P{i}', name=f'产品{i}', price=1, category=bare if i == 2 else category),
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def release(self, order_ids):
+        return self.client.post('/api/workorders/create-by-orders/', {'order_ids': order_ids}, format='json')
+
+    def test_release_creates_workorders_and_details(self):
+        ids = [order.id for order in self.orders]
+        response = self.release([*ids, ids[0], 0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['process_details'], 4)
+        self.assertEqual(response.data['without_process_code'], ['WOO2'])
+        self.assertEqual(response.data['not_found'], [0])
+        self.assertEqual(WorkOrderProcessDetail.objects.filter(workorder__workorder_no='WOO0', status='pending').count(), 2)
+        # bulk_create/update 不触发信号，新建和待打印事件显式写入
+        events = [(e.workorder.workorder_no, e.payload['status']) for e in WorkOrderEvent.objects.order_by('pk')]
+        self.assertEqual(events, [('WOO0', 'draft'), ('WOO1', 'draft'), ('WOO2', 'draft'), ('WOO0', 'print'), ('WOO1', 'print')])
+
+        # 已有工单的订单再次下达时跳过
+        response = self.release(ids[:1])
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['skipped'][0]['reason'], '订单已有工单')
+
+    def test_duplicate_orders_skipped(self):
+        from .release import release_orders
+
+        order = Order.objects.select_related('product').get(pk=self.orders[0].pk)
+        summary = release_orders([order, order])
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(summary['skipped'], [{'order_id': self.orders[0].id, 'order_no': 'O0', 'reason': '订单重复'}])
+
+    def test_concurrent_release_returns_conflict(self):
+        from . import release
+
+        resolve = release.resolve_default_process_codes
+
+        def racing(products):
+            # 检查已有工单之后，另一个请求先下达了同一订单
+            WorkOrder.objects.create(workorder_no='WOO1', product=self.orders[1].product, quantity=5)
+            return resolve(products)
 
-# Create your tests here.
+        with mock.patch.object(release, 'resolve_default_process_codes', racing):
+            response = self.release([self.orders[0].id, self.orders[1].id])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(WorkOrder.objects.filter(workorder_no='WOO0').exists())
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .events import workorder_event_stream, workorder_event_token
 from .views import  WorkOrderViewSet, OrdersWithoutWorkOrderView, WorkOrderProcessDetailViewSet, WorkOrderFeedbackViewSet
 
 router = DefaultRouter()
@@ -7,7 +9,18 @@ router.register(r'workorders', WorkOrderViewSet)
 router.register(r'workorder-process-details', WorkOrderProcessDetailViewSet)
 router.register(r'workorder-feedbacks', WorkOrderFeedbackViewSet)
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_POLLING_VIEWS:
+    # ASGI 模式：终端轮询的列表接口使用 async 视图，写操作仍由视图集处理
+    from utils.async_views import async_list_view
+    urlpatterns += [
+        path('workorders/', async_list_view(WorkOrderViewSet, {'get': 'list', 'post': 'create'})),
+        path('workorder-process-details/', async_list_view(WorkOrderProcessDetailViewSet, {'get': 'list', 'post': 'create'})),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
+    path('workorder-events/stream/', workorder_event_stream, name='workorder-event-stream'),
+    path('workorder-events/token/', workorder_event_token, name='workorder-event-token'),
     path('orders-without-workorder/', OrdersWithoutWorkOrderView.as_view(), name='orders-without-workorder'),
 ]
@@ -1,27 +1,68 @@
 from django.shortcuts import render, get_object_or_404
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, generics
+from rest_framework.pagination import CursorPagination
 from .models import WorkOrder, WorkOrderProcessDetail, WorkOrderFeedback
-from .serializers import WorkOrderSerializer, WorkOrderProcessDetailSerializer, WorkOrderFeedbackSerializer, WorkOrderFeedbackCreateSerializer
+from .serializers import WorkOrderSerializer, WorkOrderProcessDetailSerializer, WorkOrderFeedbackSerializer, WorkOrderFeedbackCreateSerializer, WorkOrderFeedbackItemSerializer
+from .process_details import generate_process_details
+from .release import orders_without_workorder, release_orders, ReleaseConflict
+from .exporters import export_workorders
+from .feedback import submit_feedback, submit_feedback_batch, FeedbackError, FeedbackConflict, FEEDBACK_BATCH_LIMIT
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from salesmgmt.models import Order
 from salesmgmt.serializers import OrderSerializer
 from django.db import transaction
+from django.db.models import Prefetch, Q
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
-from basedata.models import ProcessDetail, ProductCategoryProcessCode, ProductProcessCode, ProductParamValue
+from basedata.models import ProductCategoryProcessCode, ProductProcessCode
+from basedata.exporters import xlsx_response
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import serializers
 from utils.response import success_response, error_response, api_view_exception_handler
 from utils.authentication import IsInGroup
 from decimal import Decimal
 from django_filters.rest_framework import DjangoFilterBackend
+import django_filters
 
 class WorkOrderViewSet(viewsets.ModelViewSet):
+    """
+    工单视图集
+    列表/详情支持 ?fields= 和 ?expand= 裁剪输出（见 DynamicFieldsMixin），
+    关联查询按实际输出的字段 select_related/prefetch_related，每页查询数固定
+    """
     queryset = WorkOrder.objects.all().order_by('-created_at')
     serializer_class = WorkOrderSerializer
 
+    # 输出字段 -> 需要 select_related 的关联
+    related_fields = {
+        'order_no': 'order',
+        'product_code': 'product',
+        'product_name': 'product',
+        'process_code_text': 'process_code',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = WorkOrderSerializer.requested_fields(self.request)
+        related = {source for name, source in self.related_fields.items() if name in fields}
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if 'process_details' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'process_details', queryset=WorkOrderProcessDetail.objects.select_related('process')
+            ))
+        return queryset
+
+    @action(methods=['get'], detail=False, url_path='export')
+    def export(self, request):
+        """按当前过滤条件导出工单列表"""
+        return xlsx_response([export_workorders(self.filter_queryset(self.get_queryset()))], '工单列表.xlsx')
+
     @action(methods=['post'], detail=False, url_path='create-by-order', permission_classes=[IsAuthenticated])
     @transaction.atomic
     def create_by_order(self, request):
@@ -51,6 +92,42 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         serializer = WorkOrderSerializer(workorder)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(methods=['post'], detail=False, url_path='create-by-orders', permission_classes=[IsAuthenticated])
+    def create_by_orders(self, request):
+        """
+        按订单批量创建工单，并按默认工艺流程代码生成工序明细
+        order_ids: 订单ID列表；或 due_before: 计划交货期不晚于该日期（YYYY-MM-DD）的全部未建工单订单
+        """
+        order_ids = request.data.get('order_ids')
+        due_before = request.data.get('due_before')
+        not_found = []
+        if order_ids:
+            if not isinstance(order_ids, list):
+                return Response({'detail': 'order_ids必须为列表'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                order_ids = [int(order_id) for order_id in order_ids]
+            except (TypeError, ValueError):
+                return Response({'detail': 'order_ids包含无效的订单ID'}, status=status.HTTP_400_BAD_REQUEST)
+            orders = list(Order.objects.filter(id__in=order_ids).select_related('product').order_by('plan_delivery', 'id'))
+            found = {order.id for order in orders}
+            not_found = [order_id for order_id in order_ids if order_id not in found]
+        elif due_before:
+            due_date = parse_date(str(due_before))
+            if not due_date:
+                return Response({'detail': 'due_before格式错误，应为YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+            orders = orders_without_workorder().filter(plan_delivery__lte=due_date) \
+                .select_related('product').order_by('plan_delivery', 'id')
+        else:
+            return Response({'detail': '缺少order_ids或due_before'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            summary = release_orders(orders)
+        except ReleaseConflict:
+            return Response({'detail': '订单正在被其他请求下达，请刷新后重试', 'retryable': True},
+                            status=status.HTTP_409_CONFLICT)
+        summary['not_found'] = not_found
+        return Response(summary, status=status.HTTP_201_CREATED)
+
     def perform_create(self, serializer):
         """创建工单时，如果设置了工艺流程代码，自动生成工序明细"""
         # 保存工单
@@ -132,134 +209,7 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
 
     def _generate_process_details(self, workorder):
         """根据工艺流程代码生成工单的工序明细"""
-        if not workorder.process_code:
-            return
-
-        # 获取工艺流程代码对应的工序明细
-        process_details = ProcessDetail.objects.filter(
-            process_code=workorder.process_code
-        ).order_by('step_no')
-
-        # 获取产品的参数项和参数值
-        param_values = {}
-        product_params = ProductParamValue.objects.filter(product=workorder.product)
-        for param in product_params:
-            param_values[param.param.name] = param.value
-
-        # 计算每道工序的时间
-        if process_details.exists() and workorder.plan_start and workorder.plan_end:
-            total_duration = (workorder.plan_end - workorder.plan_start).total_seconds() / 60
-            total_steps = process_details.count()
-            step_duration = total_duration / total_steps if total_steps > 0 else 0
-        else:
-            step_duration = 0
-
-        # 创建工单工序明细
-        for idx, pd in enumerate(process_details):
-            # 计算每道工序的计划开始和结束时间
-            if workorder.plan_start and step_duration > 0:
-                plan_start = workorder.plan_start + timezone.timedelta(minutes=step_duration * idx)
-                plan_end = workorder.plan_start + timezone.timedelta(minutes=step_duration * (idx + 1))
-            else:
-                plan_start = None
-                plan_end = None
-
-            # 只有第一道工序的待加工数量设为工单数量，其他工序设为0
-            pending_qty = workorder.quantity if idx == 0 else 0
-
-            # 处理工序内容中的参数替换
-            process_content = pd.process_content
-            if process_content and param_values:
-                import re
-                
-                # 处理新格式 ${参数名+数值} 或 ${参数名-数值} 的表达式
-                dollar_brace_pattern = r'\$\{([A-Za-z][A-Za-z0-9]*)([\+\-])(\d+(?:\.\d+)?)\}'
-                
-                def replace_dollar_brace_expr(match):
-                    param_name, op, value = match.groups()
-                    if param_name in param_values:
-                        param_value = float(param_values[param_name])
-                        value = float(value)
-                        
-                        if op == '+':
-                            result = param_value + value
-                        elif op == '-':
-                            result = param_value - value
-                            
-                        # 格式化为两位小数，如果是整数则不显示小数点
-                        if result.is_integer():
-                            return str(int(result))
-                        else:
-                            return f"{result:.2f}"
-                    return match.group(0)  # 如果找不到参数值，保留原始表达式
-                
-                # 替换 ${参数名+数值} 格式的表达式
-                process_content = re.sub(dollar_brace_pattern, replace_dollar_brace_expr, process_content)
-                
-                # 替换简单的 ${参数名} 格式
-                simple_dollar_brace_pattern = r'\$\{([A-Za-z][A-Za-z0-9]*)\}'
-                
-                def replace_simple_dollar_brace(match):
-                    param_name = match.group(1)
-                    if param_name in param_values:
-                        return param_values[param_name]
-                    return match.group(0)  # 如果找不到参数值，保留原始表达式
-                
-                # 替换 ${参数名} 格式的表达式
-                process_content = re.sub(simple_dollar_brace_pattern, replace_simple_dollar_brace, process_content)
-                
-                # 保留原来的参数替换逻辑，以保证兼容性
-                # 查找所有参数名（比如D和D2）
-                param_names = re.findall(r'([A-Za-z][A-Za-z0-9]*)', process_content)
-                
-                # 去重，按长度降序排序（确保先替换D2再替换D）
-                param_names = sorted(set(param_names), key=len, reverse=True)
-                
-                # 对每个参数名进行替换
-                for param_name in param_names:
-                    if param_name in param_values:
-                        # 使用正则表达式确保只替换独立的参数名（避免部分匹配）
-                        pattern = r'\b' + re.escape(param_name) + r'\b'
-                        process_content = re.sub(pattern, param_values[param_name], process_content)
-                
-                # 计算表达式，例如将括号内的加减运算处理为结果值
-                pattern = r'\((\d+(?:\.\d+)?)([\+\-])(\d+(?:\.\d+)?)\)'
-                while re.search(pattern, process_content):
-                    def replace_expr(match):
-                        # 处理各种运算
-                        a, op, b = match.groups()
-                        a, b = float(a), float(b)
-                        if op == '+':
-                            result = a + b
-                        elif op == '-':
-                            result = a - b
-                        # 格式化为两位小数，如果是整数则不显示小数点
-                        if result.is_integer():
-                            return str(int(result))
-                        else:
-                            return f"{result:.2f}"
-                    
-                    process_content = re.sub(pattern, replace_expr, process_content)
-
-            WorkOrderProcessDetail.objects.create(
-                workorder=workorder,
-                step_no=pd.step_no,
-                process=pd.step,
-                machine_time=pd.machine_time,
-                labor_time=pd.labor_time,
-                process_content=process_content,
-                plan_start_time=plan_start,
-                plan_end_time=plan_end,
-                pending_quantity=pending_qty,
-                processed_quantity=0,
-                completed_quantity=0,
-                status='pending',
-                program_file=pd.program_file
-            )
-
-        # 生成工艺明细后，将工单状态更新为"待打印"
-        workorder.status = 'print'
-        workorder.save(update_fields=['status'])
+        generate_process_details([workorder])
 
     @action(methods=['post'], detail=True, url_path='generate-process-details')
     @transaction.atomic
@@ -339,7 +289,8 @@ class WorkOrderProcessDetailViewSet(viewsets.ModelViewSet):
     search_fields = ['workorder__workorder_no', 'process__name']
 
     def get_queryset(self):
-        queryset = WorkOrderProcessDetail.objects.all().order_by('workorder', 'step_no')
+        # 序列化输出工序名称/代码，一并查询工序，避免逐行查询（async 列表视图中也不能再延迟查询）
+        queryset = WorkOrderProcessDetail.objects.select_related('process').order_by('workorder', 'step_no')
         
         # 按工单ID筛选
         workorder_id = self.request.query_params.get('workorder')
@@ -355,106 +306,164 @@ class WorkOrderProcessDetailViewSet(viewsets.ModelViewSet):
         return queryset
         
     @action(methods=['post'], detail=False, url_path='feedback', permission_classes=[IsAuthenticated])
-    @transaction.atomic
     @api_view_exception_handler
     def process_feedback(self, request):
         """
         工序回冲接口
         处理工序的完工回冲、不良品记录，并判断是否需要进入下道工序或入库
+        并发回冲同一工序时按行加锁，锁冲突重试后仍失败返回 409（data.retryable=true），客户端可稍后重试
         """
         serializer = WorkOrderFeedbackCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
-        # 获取工序详情
-        process_id = serializer.validated_data['workorder_process_id']
-        process_detail = get_object_or_404(WorkOrderProcessDetail, pk=process_id)
-        
-        # 提取数量
-        completed_qty = serializer.validated_data['completed_quantity']
-        defective_qty = serializer.validated_data['defective_quantity']
-        total_qty = completed_qty + defective_qty
-        
-        # 检查数量是否超过待加工数量
-        if total_qty > process_detail.pending_quantity:
-            return error_response("总数量不能超过待加工数量")
-        
-        # 创建回冲记录
-        feedback = WorkOrderFeedback.objects.create(
-            workorder_process=process_detail,
-            completed_quantity=completed_qty,
-            defective_quantity=defective_qty,
-            defective_reason=serializer.validated_data.get('defective_reason', ''),
-            remark=serializer.validated_data.get('remark', ''),
-            created_by=request.user
-        )
-        
-        # 更新工序状态
-        process_detail.completed_quantity += completed_qty
-        process_detail.pending_quantity -= total_qty
-        process_detail.processed_quantity += total_qty
-        
-        # 设置工序状态
-        if process_detail.pending_quantity <= 0:
-            process_detail.status = 'completed'
-            # 如果是第一道工序，更新工单状态为生产中
-            if process_detail.step_no == 1:
-                process_detail.workorder.status = 'in_progress'
-                process_detail.workorder.actual_start = timezone.now()
-                process_detail.workorder.save(update_fields=['status', 'actual_start'])
-        else:
-            process_detail.status = 'in_progress'
-            
-        # 记录实际开始时间
-        if process_detail.actual_start_time is None:
-            process_detail.actual_start_time = timezone.now()
-            
-        # 如果工序完成，记录实际结束时间
-        if process_detail.status == 'completed':
-            process_detail.actual_end_time = timezone.now()
-            
-        # 保存工序更新
-        process_detail.save()
-        
-        # 处理工序流转或入库
-        result_message = ""
-        
-        # 如果当前工序已完成且有合格品
-        if process_detail.status == 'completed' and completed_qty > 0:
-            next_process = process_detail.get_next_process()
-            
-            # 如果有下一道工序，更新下一道工序的待加工数量
-            if next_process:
-                next_process.pending_quantity += completed_qty
-                next_process.save(update_fields=['pending_quantity'])
-                result_message = f"已完成当前工序，成品数量{completed_qty}已转移到下一道工序: {next_process.process.name}"
-            # 如果是最后一道工序，入库
-            elif process_detail.is_last_process():
-                # 更新工单状态为已完成
-                workorder = process_detail.workorder
-                workorder.status = 'completed'
-                workorder.actual_end = timezone.now()
-                workorder.save(update_fields=['status', 'actual_end'])
-                result_message = f"已完成所有工序，产品数量{completed_qty}已入库"
-            
-        # 返回结果
-        return success_response({
-            'feedback_id': feedback.id,
-            'completed_quantity': completed_qty,
-            'defective_quantity': defective_qty,
-            'total_quantity': total_qty,
-            'message': result_message
-        })
-
-class OrdersWithoutWorkOrderView(APIView):
+        data = serializer.validated_data
+
+        try:
+            result = submit_feedback(
+                data['workorder_process_id'],
+                data['completed_quantity'],
+                data['defective_quantity'],
+                defective_reason=data.get('defective_reason', ''),
+                remark=data.get('remark', ''),
+                user=request.user,
+                idempotency_key=data.get('idempotency_key') or None,
+            )
+        except FeedbackError as e:
+            return error_response(str(e))
+        except FeedbackConflict:
+            response = error_response(
+                "工序正在被其他回冲占用，请稍后重试",
+                code=409,
+                data={'retryable': True},
+                status_code=status.HTTP_409_CONFLICT,
+            )
+            response['Retry-After'] = '1'
+            return response
+        return success_response(result)
+
+    @action(methods=['post'], detail=False, url_path='feedback-batch', permission_classes=[IsAuthenticated])
+    @api_view_exception_handler
+    def process_feedback_batch(self, request):
+        """
+        批量工序回冲接口（终端离线缓存后补传）
+        请求: {"items": [回冲, ...]}，每条格式同 feedback 接口，建议带 idempotency_key 以便安全重放
+        按提交顺序在一个事务内应用，逐条返回结果（created / duplicate / failed）
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return error_response("items必须为非空列表")
+        if len(items) > FEEDBACK_BATCH_LIMIT:
+            return error_response(f"单次最多提交{FEEDBACK_BATCH_LIMIT}条回冲")
+
+        results = [None] * len(items)
+        valid_items = []
+        valid_indexes = []
+        for index, item in enumerate(items):
+            item_serializer = WorkOrderFeedbackItemSerializer(data=item)
+            if item_serializer.is_valid():
+                valid_items.append(item_serializer.validated_data)
+                valid_indexes.append(index)
+            else:
+                results[index] = {
+                    'index': index,
+                    'idempotency_key': item.get('idempotency_key') if isinstance(item, dict) else None,
+                    'status': 'failed',
+                    'message': '请求参数错误',
+                    'errors': item_serializer.errors,
+                }
+
+        if valid_items:
+            try:
+                applied = submit_feedback_batch(valid_items, user=request.user)
+            except FeedbackConflict:
+                response = error_response(
+                    "工序正在被其他回冲占用，请稍后重试",
+                    code=409,
+                    data={'retryable': True},
+                    status_code=status.HTTP_409_CONFLICT,
+                )
+                response['Retry-After'] = '1'
+                return response
+            for index, result in zip(valid_indexes, applied):
+                result['index'] = index
+                if 'duplicate_of' in result:
+                    result['duplicate_of'] = valid_indexes[result['duplicate_of']]
+                results[index] = result
+
+        summary = {name: sum(1 for r in results if r['status'] == name) for name in ('created', 'duplicate', 'failed')}
+        return success_response({'results': results, **summary})
+
+class OrdersWithoutWorkOrderPagination(CursorPagination):
+    """
+    游标分页：按交货期翻页，结果集增长时翻页开销不变
+    日期字段大量重复，游标位置记为 "首字段值|id"，按 (首字段, id) 复合条件定位，
+    同值订单跨页不跳过、不重复（DRF 默认只记首字段值，同值记录靠偏移量区分）
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('plan_delivery', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        # 只取排序首字段（?ordering= 可能给出多个），id 与首字段同方向
+        field = super().get_ordering(request, queryset, view)[0]
+        return (field, '-id' if field.startswith('-') else 'id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{super()._get_position_from_instance(instance, ordering)}|{instance.pk}'
+
+    def decode_cursor(self, request):
+        # 位置由 paginate_queryset 按复合条件过滤，父类只看到方向和偏移量
+        cursor = super().decode_cursor(request)
+        self.keyset_position = cursor.position if cursor else None
+        return cursor._replace(position=None) if cursor else None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = self.decode_cursor(request) if self.get_page_size(request) else None
+        position = self.keyset_position if cursor else None
+        if position is not None:
+            ordering = self.get_ordering(request, queryset, view)
+            field = ordering[0].lstrip('-')
+            value, _, pk = position.rpartition('|')
+            lookup = 'lt' if ordering[0].startswith('-') != cursor.reverse else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk}))
+
+        page = super().paginate_queryset(queryset, request, view)
+        if position is not None:
+            # 父类按无位置的游标计算了翻页状态，补回当前位置作为反方向翻页的起点
+            if cursor.reverse:
+                self.has_next, self.next_position = True, position
+            else:
+                self.has_previous, self.previous_position = True, position
+        return page
+
+
+class OrdersWithoutWorkOrderFilter(django_filters.FilterSet):
+    order_date_after = django_filters.DateFilter(field_name='order_date', lookup_expr='gte')
+    order_date_before = django_filters.DateFilter(field_name='order_date', lookup_expr='lte')
+    due_after = django_filters.DateFilter(field_name='plan_delivery', lookup_expr='gte')
+    due_before = django_filters.DateFilter(field_name='plan_delivery', lookup_expr='lte')
+
+    class Meta:
+        model = Order
+        fields = ['company', 'product']
+
+
+class OrdersWithoutWorkOrderView(generics.ListAPIView):
     """
     获取未被工单关联的订单列表
+    支持按公司、产品、下单日期范围（order_date_after/order_date_before）、
+    交货期范围（due_after/due_before）筛选，按订单号搜索，ordering 排序，游标分页
     """
-    def get(self, request):
-        # 找出未被工单关联的订单
-        used_order_ids = WorkOrder.objects.exclude(order=None).values_list('order', flat=True)
-        orders = Order.objects.exclude(id__in=used_order_ids)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+    serializer_class = OrderSerializer
+    pagination_class = OrdersWithoutWorkOrderPagination
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filterset_class = OrdersWithoutWorkOrderFilter
+    search_fields = ['order_no']
+    ordering_fields = ['plan_delivery', 'order_date', 'order_no', 'id']
+
+    def get_queryset(self):
+        # NOT EXISTS 反连接，走 WorkOrder.order_id 索引，不再把全部已关联订单ID取回再 NOT IN
+        return orders_without_workorder().select_related('company')
 
 class WorkOrderFeedbackViewSet(viewsets.ModelViewSet):
     """工单回冲记录查询视图集"""
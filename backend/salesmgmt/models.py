@@ -11,7 +11,7 @@ class Order(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name="产品", null=True, blank=True)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="数量")
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="单价")
-    plan_delivery = models.DateField(verbose_name="计划交货期")
+    plan_delivery = models.DateField(verbose_name="计划交货期", db_index=True)
     actual_delivery = models.DateField(null=True, blank=True, verbose_name="实际交货期")
     actual_quantity = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="实际交货数量")
     actual_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="实际交货金额")
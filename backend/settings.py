@@ -66,7 +66,8 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # 读请求直接使用令牌声明，不查询 User 表；令牌无声明时与 JWTAuthentication 行为一致
+        'utils.authentication.FastJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -100,9 +101,32 @@ WSGI_APPLICATION = 'wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# 数据库连接复用：
+# - DB_POOL_SIZE > 0（默认）时使用带连接池的后端 utils.mysql_pool，每个工作进程最多 DB_POOL_SIZE 个连接，
+#   请求结束时连接放回池中，存活 DB_POOL_MAX_LIFETIME 秒后重建（需小于 MySQL wait_timeout）；
+#   池满时最多等待 DB_POOL_TIMEOUT 秒。统计见 /api/system/db-pool/。
+# - DB_POOL_SIZE = 0 时使用 Django 自带的持久连接（每个线程一个），存活 DB_CONN_MAX_AGE 秒。
+# 两种方式都开启 CONN_HEALTH_CHECKS，复用前检查连接是否可用。
+#
+# 池大小按每个工作进程中同时使用数据库的线程数计算（可用 DB_POOL_SIZE 覆盖）：
+# - WSGI（gunicorn 同步 worker）：1 个请求线程 + IMPORT_JOB_WORKERS 个导入线程 + 1 个余量，默认 1 + 2 + 1 = 4
+# - ASGI（uvicorn worker）：Django 为每个请求单独开一个线程执行同步视图和 async 视图中的 ORM 调用，
+#   同时访问数据库的线程数等于并发请求数。按 DB_POOL_ASGI_REQUESTS 个并发请求
+#   + IMPORT_JOB_WORKERS 个导入线程 + 1 个工单事件推送线程（productionmgmt.events.EventHub）+ 1 个余量，
+#   默认 16 + 2 + 1 + 1 = 20；超过的请求在池中排队，最多等待 DB_POOL_TIMEOUT 秒
+# MySQL 总连接数 = gunicorn workers（deploy_gunicorn.sh 中为 4）× DB_POOL_SIZE，
+# ASGI 默认 4 × 20 = 80，需小于 MySQL max_connections（默认 151）
+MES_SERVER_MODE = os.environ.get('MES_SERVER_MODE', 'wsgi')
+# 后台导入任务：每个Web进程启动的工作线程数（0 表示只由 run_import_jobs 命令执行）
+IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', 2))
+if MES_SERVER_MODE == 'asgi':
+    _db_threads = int(os.environ.get('DB_POOL_ASGI_REQUESTS', 16)) + IMPORT_JOB_WORKERS + 1
+else:
+    _db_threads = 1 + IMPORT_JOB_WORKERS
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', _db_threads + 1))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'utils.mysql_pool' if DB_POOL_SIZE > 0 else 'django.db.backends.mysql',
         'NAME': 'xMes',
         'USER': 'xgx',
         'PASSWORD': 'You@5good',
@@ -110,6 +134,14 @@ DATABASES = {
         'PORT': '3306',
         'CHARSET': 'utf8',
         'COLLATION': 'utf8_general_ci',
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE > 0 else int(os.environ.get('DB_CONN_MAX_AGE', 300)),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 600)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'PING_AFTER': float(os.environ.get('DB_POOL_PING_AFTER', 5)),
+        },
     }
 }
 # DATABASES = {
@@ -156,6 +188,12 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# 上传/删除媒体文件时同步维护媒体文件索引（basedata.MediaFileIndex）
+STORAGES = {
+    'default': {'BACKEND': 'basedata.media_index.IndexedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -195,6 +233,36 @@ CSRF_COOKIE_SECURE = False
 # 设置X-Frame-Options允许在任何iframe中显示内�?
 X_FRAME_OPTIONS = 'ALLOWALL'
 
+# ASGI 模式（asgi.py 设置 MES_SERVER_MODE=asgi）下工单/工序明细列表使用 async 视图，WSGI 模式不变
+ASYNC_POLLING_VIEWS = MES_SERVER_MODE == 'asgi'
+
+# 后台导入任务（工作线程数 IMPORT_JOB_WORKERS 见数据库配置）
+IMPORT_JOB_POLL_INTERVAL = 2
+IMPORT_JOB_STALE_SECONDS = 600
+
+# 菜单树缓存时间（秒）；菜单/组变更会立即使缓存失效，该时间只限制未共享缓存的其他进程的滞后
+MENU_CACHE_TIMEOUT = 300
+# 用户组名跨请求缓存时间（秒），0 表示只在单次请求内缓存
+USER_GROUPS_CACHE_TIMEOUT = 30
+# JWT 吊销记录（保存在数据库）在各进程内存中的刷新间隔（秒）
+JWT_DENYLIST_REFRESH_SECONDS = 5
+
+# 缓存：同一主机上各 gunicorn 进程共享的文件缓存（菜单树、用户组、参考数据版本号都依赖它跨进程失效）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+# 参考数据（单位/工序/材质/公司）缓存：共享缓存中整表数据的保存时间（秒），各进程比对版本号的间隔（秒）
+REFERENCE_CACHE_TIMEOUT = 86400
+REFERENCE_CACHE_CHECK_SECONDS = 1
+
+# 图纸PDF交给 nginx 发送时的 internal location 前缀（如 '/protected-media'，指向 MEDIA_ROOT），为空则由 Django 发送
+PDF_X_ACCEL_REDIRECT_PREFIX = os.environ.get('PDF_X_ACCEL_REDIRECT_PREFIX', '')
+
 MEDIA_URL = '/attachment/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'attachment')
 
@@ -26,6 +26,7 @@ from django.conf.urls.static import static
 from django.views.static import serve
 from django.http import FileResponse
 from utils.tools import pdf_view
+from utils.db_pool import db_pool_stats_view
 
 # @csrf_exempt
 # def register(request):
@@ -170,6 +171,7 @@ urlpatterns = [
     path('api/', include('salesmgmt.urls')),
     path('api/', include('productionmgmt.urls')),
     path('api/', include('equipmentmgmt.urls')),  # 新增：注册设备管理模块接口
+    path('api/system/db-pool/', db_pool_stats_view, name='db-pool-stats'),
     # path('attachment/<path:path>/', pdf_view, name='pdf_view'),
     # path('drawings/<path:path>', media_serve, {'document_root': settings.MEDIA_ROOT}),
 ]
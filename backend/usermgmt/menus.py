@@ -0,0 +1,82 @@
+"""
+菜单树
+
+菜单树每次页面加载都会请求，按用户所属组集合缓存到 Django 缓存：
+- 缓存键包含组名集合（排序后）和菜单版本号，用户组变化后自然命中另一份缓存；
+- 菜单、菜单可见组或组本身变更时更换版本号，旧缓存全部失效（见 models.py 中的信号）。
+未配置共享缓存（默认进程内 LocMemCache）时，其他进程的缓存最多在 MENU_CACHE_TIMEOUT 秒后过期。
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import Menu
+
+SUPER_ADMIN_GROUP = '超级管理员'
+MENU_VERSION_KEY = 'usermgmt:menus:version'
+
+
+def _cache_timeout():
+    return getattr(settings, 'MENU_CACHE_TIMEOUT', 300)
+
+
+def _menu_version():
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add 避免并发首次访问时互相覆盖版本号
+        if not cache.add(MENU_VERSION_KEY, version, None):
+            version = cache.get(MENU_VERSION_KEY, version)
+    return version
+
+
+def invalidate_menu_cache():
+    """菜单或组变更后调用：更换版本号，所有组集合的菜单树缓存失效"""
+    cache.set(MENU_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def build_menu_tree(group_names):
+    """用一条查询构建用户可见的菜单树（菜单 LEFT JOIN 可见组）"""
+    group_names = set(group_names)
+    menus = Menu.objects.all()
+    if SUPER_ADMIN_GROUP not in group_names:
+        visible = Menu.groups.through.objects.filter(menu_id=OuterRef('pk'), group__name__in=group_names)
+        menus = menus.filter(Exists(visible))
+
+    menu_dict = {}
+    for row in menus.order_by('id').values('id', 'name', 'path', 'parent_id', 'groups__name'):
+        menu = menu_dict.get(row['id'])
+        if menu is None:
+            menu = menu_dict[row['id']] = {
+                'id': row['id'],
+                'name': row['name'],
+                'path': row['path'],
+                'parent': row['parent_id'],
+                'groups': [],
+                'children': []
+            }
+        if row['groups__name'] is not None:
+            menu['groups'].append(row['groups__name'])
+
+    menu_tree = []
+    for m in menu_dict.values():
+        if m['parent'] is not None and m['parent'] in menu_dict:
+            menu_dict[m['parent']]['children'].append(m)
+        else:
+            menu_tree.append(m)
+    return menu_tree
+
+
+def get_menu_tree(group_names):
+    """按组名集合读取缓存的菜单树，未命中时构建并写入缓存"""
+    group_names = sorted(set(group_names))
+    digest = hashlib.md5('\n'.join(group_names).encode('utf-8')).hexdigest()
+    key = f'usermgmt:menus:{_menu_version()}:{digest}'
+    menu_tree = cache.get(key)
+    if menu_tree is None:
+        menu_tree = build_menu_tree(group_names)
+        cache.set(key, menu_tree, _cache_timeout())
+    return menu_tree
@@ -15,7 +15,22 @@ class UserProfile(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
 
-from django.db.models.signals import post_save
+class RevokedToken(models.Model):
+    """按 jti 吊销的单个 JWT（退出登录、refresh 令牌轮换），过期后清理"""
+    jti = models.CharField(max_length=255, unique=True)
+    token_type = models.CharField(max_length=32, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+class UserTokenState(models.Model):
+    """
+    用户令牌状态：revoked_at 之前签发的令牌被拒绝，claims_stale_at 之前签发的令牌声明需查库。
+    user_id 不用外键，删除用户后记录仍需保留到令牌过期；user_id 为 0 的行对全部用户生效
+    """
+    user_id = models.IntegerField(primary_key=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    claims_stale_at = models.DateTimeField(null=True, blank=True)
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
 @receiver(post_save, sender=User)
@@ -29,4 +44,45 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         else:
             instance.profile.save()
 
+@receiver([post_save, post_delete], sender=Menu)
+@receiver(m2m_changed, sender=Menu.groups.through)
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_menu_cache_on_change(sender, **kwargs):
+    # 菜单、菜单可见组、组名变更后菜单树缓存失效；用户组成员变化时缓存键随组集合变化，无需失效
+    from .menus import invalidate_menu_cache
+    invalidate_menu_cache()
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # 用户组成员变化后，用户组名缓存失效
+    from utils.authentication import invalidate_user_groups
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_user_groups([instance.pk])
+    else:
+        # 从组一侧变更（group.user_set），clear 时 pk_set 为空，全部失效
+        invalidate_user_groups(pk_set if action != 'post_clear' else None)
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_user_groups_on_group_change(sender, **kwargs):
+    from utils.authentication import invalidate_user_groups
+    invalidate_user_groups()
+
+@receiver(post_save, sender=User)
+def expire_token_claims_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    # 用户信息变更后令牌声明不再可信；停用用户时吊销其令牌。登录只更新 last_login，忽略
+    from utils.authentication import mark_token_claims_stale, revoke_user_tokens
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    if not instance.is_active:
+        revoke_user_tokens([instance.pk])
+    else:
+        mark_token_claims_stale([instance.pk])
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_user_delete(sender, instance, **kwargs):
+    from utils.authentication import revoke_user_tokens
+    revoke_user_tokens([instance.pk])
+
 # Create your models here.
@@ -1,3 +1,154 @@
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from .models import Menu, RevokedToken, UserTokenState
+
+
+class MenuTreeCacheTests(TestCase):
+    """菜单树一条查询构建并按组集合缓存，菜单变更后缓存失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name='车间')
+        cls.user = User.objects.create_user('worker', password='x')
+        cls.user.groups.add(cls.group)
+        root = Menu.objects.create(name='生产管理', path='/production')
+        root.groups.add(cls.group)
+        for i in range(5):
+            child = Menu.objects.create(name=f'子菜单{i}', path=f'/production/{i}', parent=root)
+            child.groups.add(cls.group)
+        Menu.objects.create(name='系统设置', path='/settings')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def menus(self):
+        response = self.client.get('/api/menus/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['menus']
+
+    def test_tree_built_in_one_query_then_cached(self):
+        # 会话 + 用户 + 用户组 + 菜单树
+        with self.assertNumQueries(4):
+            menus = self.menus()
+        self.assertEqual([m['name'] for m in menus], ['生产管理'])
+        self.assertEqual(len(menus[0]['children']), 5)
+        self.assertEqual(menus[0]['groups'], ['车间'])
+        # 用户组名和菜单树均命中缓存：只剩会话 + 用户
+        with self.assertNumQueries(2):
+            self.assertEqual(self.menus(), menus)
+
+    def test_menu_change_invalidates_cache(self):
+        self.menus()
+        Menu.objects.get(name='系统设置').groups.add(self.group)
+        self.assertEqual([m['name'] for m in self.menus()], ['生产管理', '系统设置'])
+        Menu.objects.filter(name='系统设置').delete()
+        self.assertEqual([m['name'] for m in self.menus()], ['生产管理'])
+
+
+class UserGroupCacheTests(TestCase):
+    """用户组名每个请求最多查询一次，成员变化后缓存失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('admin', password='x')
+        self.group = Group.objects.create(name='超级管理员')
+
+    def test_membership_change_invalidates_cache(self):
+        from utils.authentication import get_user_group_names, user_in_group
+        self.assertEqual(get_user_group_names(User.objects.get(pk=self.user.pk)), frozenset())
+        self.user.groups.add(self.group)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user_in_group(user, '超级管理员'))
+        with self.assertNumQueries(0):
+            self.assertTrue(user_in_group(user, '超级管理员'))
+            self.assertFalse(user_in_group(user, '车间'))
+        self.group.user_set.remove(self.user)
+        self.assertFalse(user_in_group(User.objects.get(pk=self.user.pk), '超级管理员'))
+
+
+class FastJWTAuthenticationTests(TestCase):
+    """读请求用令牌声明认证不查 User 表，组变更后退回查库，吊销后拒绝"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('tablet', password='x')
+        self.user.groups.add(Group.objects.create(name='车间'))
+
+    def issue(self):
+        from rest_framework.test import APIClient
+        from utils import authentication
+        from utils.authentication import get_tokens_for_user
+        # 令牌签发时间精确到秒，清掉建数据时记下的声明过期时间
+        UserTokenState.objects.all().delete()
+        authentication._denylist_memo.update(data=None, loaded_at=0.0)
+        client = APIClient()
+        token = get_tokens_for_user(self.user)['access']
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client, token
+
+    def test_claims_revocation_and_stale_fallback(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        from utils import authentication
+        from utils.authentication import revoke_token, user_in_group
+        client, token = self.issue()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/equipment-spares/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('auth_user' in q['sql'] for q in queries))
+        self.assertTrue(user_in_group(response.wsgi_request.user, '车间'))
+
+        # 组变更后令牌声明过期，改为查库
+        self.user.groups.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/api/equipment-spares/').status_code, 200)
+        self.assertTrue(any('auth_user' in q['sql'] for q in queries))
+
+        revoke_token(AccessToken(token))
+        self.assertNotEqual(client.get('/api/equipment-spares/').status_code, 200)
+        # 吊销记录在数据库中，缓存被清空或淘汰、其他进程重新加载时仍然有效
+        cache.clear()
+        authentication._denylist_memo.update(data=None, loaded_at=0.0)
+        self.assertNotEqual(client.get('/api/equipment-spares/').status_code, 200)
+
+
+class TokenEndpointTests(TestCase):
+    """令牌签发、刷新（旧 refresh 令牌作废）和退出登录（吊销令牌）"""
+
+    def setUp(self):
+        from utils import authentication
+        authentication._denylist_memo.update(data=None, loaded_at=0.0)
+        self.user = User.objects.create_user('tablet', password='x')
+        self.user.groups.add(Group.objects.create(name='车间'))
+
+    def post(self, url, data, **extra):
+        return self.client.post(url, data, content_type='application/json', **extra)
+
+    def test_obtain_refresh_and_logout(self):
+        from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+        self.assertEqual(self.post('/api/token/', {'username': 'tablet', 'password': 'y'}).status_code, 400)
+        tokens = self.post('/api/token/', {'username': 'tablet', 'password': 'x'}).json()
+        self.assertEqual(AccessToken(tokens['access'])['groups'], ['车间'])
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {tokens['access']}"}
+        self.assertEqual(self.client.get('/api/equipment-spares/', **auth).status_code, 200)
+
+        refreshed = self.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(refreshed.status_code, 200)
+        # 旧 refresh 令牌只能用一次；refresh 令牌的吊销记录不进各进程的内存缓存，使用时查库
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
+        self.assertEqual(RevokedToken.objects.get(jti=RefreshToken(tokens['refresh'])['jti']).token_type, 'refresh')
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': 'garbage'}).status_code, 401)
+
+        tokens = refreshed.json()
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {tokens['access']}"}
+        self.assertEqual(self.post('/api/token/logout/', {'refresh': tokens['refresh']}, **auth).status_code, 200)
+        self.assertNotEqual(self.client.get('/api/equipment-spares/', **auth).status_code, 200)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_refresh_rejected_for_inactive_user(self):
+        tokens = self.post('/api/token/', {'username': 'tablet', 'password': 'x'}).json()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.post('/api/token/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('register/', views.register),
     path('login/', views.user_login),
+    path('token/', views.token_obtain),
+    path('token/refresh/', views.token_refresh),
+    path('token/logout/', views.token_logout),
     path('userinfo/', views.user_info),
     path('users/', views.user_list),
     path('groups/', views.group_list),
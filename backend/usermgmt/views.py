@@ -1,10 +1,15 @@
 from django.shortcuts import render
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import authenticate, login, logout
 from django.http import JsonResponse, QueryDict
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.contrib.auth.models import User, Group
 import json
 from .models import Menu, UserProfile
+from .menus import get_menu_tree
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from utils.authentication import get_tokens_for_user, get_user_group_names, is_token_revoked, revoke_token, user_in_group
 import logging
 from django.conf import settings
 
@@ -43,10 +48,59 @@ def user_login(request):
             return JsonResponse({'error': '用户名或密码错误'}, status=400)
     return JsonResponse({'error': '只支持POST'}, status=405)
 
+@csrf_exempt
+def token_obtain(request):
+    """签发 JWT（车间终端等不使用会话的客户端），令牌带用户名/组名声明，读请求认证不查库"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST'}, status=405)
+    data = json.loads(request.body or '{}')
+    user = authenticate(request, username=data.get('username'), password=data.get('password'))
+    if user is None:
+        return JsonResponse({'error': '用户名或密码错误'}, status=400)
+    return JsonResponse(get_tokens_for_user(user))
+
+@csrf_exempt
+def token_refresh(request):
+    """用 refresh 令牌换新的令牌对；旧 refresh 令牌随即吊销，新令牌的声明按当前用户和组重新生成"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST'}, status=405)
+    data = json.loads(request.body or '{}')
+    try:
+        refresh = RefreshToken(data.get('refresh'))
+    except TokenError:
+        return JsonResponse({'error': '令牌无效或已过期'}, status=401)
+    if is_token_revoked(refresh):
+        return JsonResponse({'error': '令牌已被吊销'}, status=401)
+    user = User.objects.filter(pk=refresh.get(jwt_settings.USER_ID_CLAIM), is_active=True).first()
+    if user is None:
+        return JsonResponse({'error': '用户不存在或已停用'}, status=401)
+    revoke_token(refresh)
+    return JsonResponse(get_tokens_for_user(user))
+
+@csrf_exempt
+def token_logout(request):
+    """退出登录：吊销请求头中的 access 令牌和请求体中的 refresh 令牌，同时清除会话"""
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持POST'}, status=405)
+    data = json.loads(request.body or '{}')
+    header = request.headers.get('Authorization', '')
+    raw_tokens = [(AccessToken, header[7:].strip() if header.startswith('Bearer ') else None),
+                  (RefreshToken, data.get('refresh'))]
+    for token_class, raw in raw_tokens:
+        if not raw:
+            continue
+        try:
+            revoke_token(token_class(raw))
+        except TokenError:
+            # 已过期的令牌无需吊销
+            pass
+    logout(request)
+    return JsonResponse({'msg': '已退出登录'})
+
 @csrf_exempt
 def user_info(request):
     if request.user.is_authenticated:
-        groups = list(request.user.groups.values_list('name', flat=True))
+        groups = sorted(get_user_group_names(request.user))
         profile = getattr(request.user, 'profile', None)
         avatar = ''
         if profile and profile.avatar:
@@ -73,13 +127,13 @@ def user_info(request):
 def user_list(request):
     if not request.user.is_authenticated:
         return JsonResponse({'error': '未登录'}, status=401)
-    users = User.objects.all()
+    users = User.objects.prefetch_related('groups')
     data = []
     for u in users:
         data.append({
             'id': u.id,
             'username': u.username,
-            'groups': list(u.groups.values_list('name', flat=True))
+            'groups': [g.name for g in u.groups.all()]
         })
     return JsonResponse({'users': data})
 
@@ -159,28 +213,9 @@ def delete_group(request, group_name):
 def menu_list(request):
     if not request.user.is_authenticated:
         return JsonResponse({'error': '未登录'}, status=401)
-    user_groups = list(request.user.groups.values_list('name', flat=True))
-    if '超级管理员' in user_groups:
-        menus = Menu.objects.all()
-    else:
-        menus = Menu.objects.filter(groups__name__in=user_groups).distinct()
-    # 构建菜单树
-    menu_dict = {}
-    for m in menus:
-        menu_dict[m.id] = {
-            'id': m.id,
-            'name': m.name,
-            'path': m.path,
-            'parent': m.parent_id,
-            'groups': list(m.groups.values_list('name', flat=True)),
-            'children': []
-        }
-    menu_tree = []
-    for m in menu_dict.values():
-        if m['parent'] is not None and m['parent'] in menu_dict:
-            menu_dict[m['parent']]['children'].append(m)
-        else:
-            menu_tree.append(m)
+    user_groups = get_user_group_names(request.user)
+    # 菜单树按组集合缓存，菜单/组变更时自动失效（见 menus.py）
+    menu_tree = get_menu_tree(user_groups)
     return JsonResponse({'menus': menu_tree})
 
 @csrf_exempt
@@ -201,11 +236,7 @@ def menu_save(request):
         menu.save()
     else:
         menu = Menu.objects.create(name=name, path=path, parent_id=parent)
-    menu.groups.clear()
-    for g in groups:
-        group = Group.objects.filter(name=g).first()
-        if group:
-            menu.groups.add(group)
+    menu.groups.set(Group.objects.filter(name__in=groups))
     return JsonResponse({'msg': '保存成功'})
 
 @csrf_exempt
@@ -213,7 +244,7 @@ def menu_delete(request, menu_id):
     if not request.user.is_authenticated:
         return JsonResponse({'error': '未登录'}, status=401)
     # 仅超级管理员组可操作
-    if not request.user.groups.filter(name='超级管理员').exists():
+    if not user_in_group(request.user, '超级管理员'):
         return JsonResponse({'error': '无权限'}, status=403)
     Menu.objects.filter(id=menu_id).delete()
     return JsonResponse({'msg': '删除成功'})
@@ -257,7 +288,7 @@ def user_profile(request):
         profile = getattr(request.user, 'profile', None)
         phone = profile.phone if profile else ''
         avatar = get_avatar_url(request, profile) if profile else ''
-        groups = list(request.user.groups.values_list('name', flat=True))
+        groups = sorted(get_user_group_names(request.user))
         return JsonResponse({
             'username': request.user.username,
             'phone': phone,
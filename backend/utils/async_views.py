@@ -0,0 +1,71 @@
+"""
+轮询接口的原生 async 视图（ASGI 模式）
+
+DRF 视图集只有同步实现，在 ASGI 下每个请求都要整体放进线程池执行。async_list_view 把视图集的 list
+改成 async 视图：认证/权限/过滤条件仍调用视图集原有的同步代码（可能查询用户、组），
+计数和取数用 async ORM（acount / async for），等待数据库时不占用工作进程；
+序列化在事件循环中执行，视图集的 get_queryset 必须已经 select_related/prefetch_related 了输出用到的关联。
+响应格式、分页、过滤参数与同步接口完全一致；非 GET 请求交给原视图集处理。
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+
+def async_list_view(viewset_class, actions):
+    """
+    :param viewset_class: DRF 视图集
+    :param actions: 同一 URL 的动作映射，如 {'get': 'list', 'post': 'create'}；GET 走 async 实现
+    """
+    sync_view = sync_to_async(viewset_class.as_view(actions))
+
+    async def view(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await sync_view(request, *args, **kwargs)
+        self = viewset_class(action_map={'get': 'list'}, basename=None, detail=False, suffix='List')
+        self.args, self.kwargs = args, kwargs
+        self.format_kwarg = None
+        drf_request = self.initialize_request(request, *args, **kwargs)
+        self.request = drf_request
+        self.headers = self.default_response_headers
+        try:
+            queryset = await sync_to_async(_prepare)(self, drf_request)
+            response = await _list(self, drf_request, queryset)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(drf_request, response, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+def _prepare(self, request):
+    """同步部分：认证、权限、限流，构造查询集（不执行查询）"""
+    self.initial(request)
+    return self.filter_queryset(self.get_queryset())
+
+
+async def _list(self, request, queryset):
+    paginator = self.paginator
+    page_size = paginator.get_page_size(request) if paginator is not None else None
+    if not page_size:
+        objects = [obj async for obj in queryset]
+        return Response(self.get_serializer(objects, many=True).data)
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    # 预先用 acount 计算总数，Paginator 不再同步查询
+    django_paginator.count = await queryset.acount()
+    page_number = request.query_params.get(paginator.page_query_param) or 1
+    if page_number in paginator.last_page_strings:
+        page_number = django_paginator.num_pages
+    try:
+        page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    page.object_list = [obj async for obj in page.object_list]
+    paginator.page = page
+    paginator.request = request
+    paginator.display_page_controls = False
+    return paginator.get_paginated_response(self.get_serializer(page.object_list, many=True).data)
+
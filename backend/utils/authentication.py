@@ -1,8 +1,73 @@
-from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.permissions import BasePermission, IsAuthenticated, SAFE_METHODS
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.utils.translation import gettext_lazy as _
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import RefreshToken, Token
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import datetime
+import threading
+import time
+import uuid
+
+# 用户组名缓存：请求内缓存在 user 对象上；USER_GROUPS_CACHE_TIMEOUT > 0 时再跨请求缓存到 Django 缓存
+USER_GROUPS_ATTR = '_cached_group_names'
+USER_GROUPS_VERSION_KEY = 'auth:user_groups:version'
+
+
+def _user_groups_cache_key(user_id):
+    version = cache.get(USER_GROUPS_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(USER_GROUPS_VERSION_KEY, version, None):
+            version = cache.get(USER_GROUPS_VERSION_KEY, version)
+    return f'auth:user_groups:{version}:{user_id}'
+
+
+def get_user_group_names(user):
+    """
+    获取用户所属组名集合（frozenset），一次请求内最多查询一次
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    names = getattr(user, USER_GROUPS_ATTR, None)
+    if names is not None:
+        return names
+    timeout = getattr(settings, 'USER_GROUPS_CACHE_TIMEOUT', 0)
+    key = _user_groups_cache_key(user.pk) if timeout else None
+    if key:
+        names = cache.get(key)
+    if names is None:
+        names = frozenset(user.groups.values_list('name', flat=True))
+        if key:
+            cache.set(key, names, timeout)
+    setattr(user, USER_GROUPS_ATTR, names)
+    return names
+
+
+def user_in_group(user, group_name):
+    """判断用户是否属于指定组"""
+    return group_name in get_user_group_names(user)
+
+
+def invalidate_user_groups(user_ids=None):
+    """
+    用户组成员变更后使缓存失效
+    :param user_ids: 变更的用户ID；为 None 时（组改名/删除等）全部失效
+    """
+    # 令牌中的组名声明同时过期，这些用户的令牌改走数据库查询
+    mark_token_claims_stale(user_ids)
+    if user_ids is None:
+        cache.set(USER_GROUPS_VERSION_KEY, uuid.uuid4().hex, None)
+        return
+    cache.delete_many([_user_groups_cache_key(user_id) for user_id in user_ids])
+
 
 class IsAdminUser(BasePermission):
     """
@@ -42,7 +107,7 @@ class IsInGroup(BasePermission):
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        return request.user.groups.filter(name=self.group_name).exists()
+        return user_in_group(request.user, self.group_name)
 
 class IsOwnerOrReadOnly(BasePermission):
     """
@@ -58,17 +123,190 @@ class IsOwnerOrReadOnly(BasePermission):
         # 只允许创建者修改或删除
         return obj.creator == request.user
 
+# JWT 吊销记录保存在数据库（usermgmt.RevokedToken / UserTokenState），各进程共享，不会因缓存淘汰丢失。
+# 认证时不逐个请求查库：每个进程把仍有效的用户记录和 access 令牌的 jti 缓存在内存中，
+# 每 JWT_DENYLIST_REFRESH_SECONDS 秒重新加载；本进程的修改立即生效，其他进程在刷新间隔内生效。
+# 数量较多的 refresh 等其他类型令牌的 jti 只在使用时（刷新令牌、订阅事件流）查库
+ALL_USERS = 0
+_denylist_lock = threading.Lock()
+_denylist_memo = {'data': None, 'loaded_at': 0.0}
+
+
+def _token_horizon():
+    """早于该时间签发的令牌都已过期，相关记录可以清理"""
+    lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+    return timezone.now() - lifetime
+
+
+def _load_denylist():
+    from usermgmt.models import RevokedToken, UserTokenState
+
+    data = {'jti': set(), 'revoked_users': {}, 'stale_users': {}, 'stale_all': 0}
+    data['jti'].update(RevokedToken.objects.filter(
+        token_type='access', expires_at__gt=timezone.now()
+    ).values_list('jti', flat=True))
+    horizon = _token_horizon()
+    for user_id, revoked_at, stale_at in UserTokenState.objects.filter(
+        Q(revoked_at__gt=horizon) | Q(claims_stale_at__gt=horizon)
+    ).values_list('user_id', 'revoked_at', 'claims_stale_at'):
+        if revoked_at:
+            data['revoked_users'][user_id] = revoked_at.timestamp()
+        if stale_at and user_id == ALL_USERS:
+            data['stale_all'] = stale_at.timestamp()
+        elif stale_at:
+            data['stale_users'][user_id] = stale_at.timestamp()
+    return data
+
+
+def _get_denylist():
+    refresh = getattr(settings, 'JWT_DENYLIST_REFRESH_SECONDS', 5)
+    with _denylist_lock:
+        data = _denylist_memo['data']
+        if data is None or time.monotonic() - _denylist_memo['loaded_at'] >= refresh:
+            data = _load_denylist()
+            _denylist_memo.update(data=data, loaded_at=time.monotonic())
+    return data
+
+
+def _denylist_changed():
+    """本进程立即重新加载；在事务中修改时提交后再重新加载一次，其他线程不会缓存提交前的结果"""
+    _denylist_memo.update(data=None, loaded_at=0.0)
+    transaction.on_commit(lambda: _denylist_memo.update(data=None, loaded_at=0.0))
+
+
+def _purge_denylist():
+    from usermgmt.models import RevokedToken, UserTokenState
+
+    RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    horizon = _token_horizon()
+    UserTokenState.objects.filter(
+        Q(revoked_at__isnull=True) | Q(revoked_at__lte=horizon),
+        Q(claims_stale_at__isnull=True) | Q(claims_stale_at__lte=horizon),
+    ).delete()
+
+
+def revoke_token(token):
+    """吊销单个令牌（按 jti），直至其过期"""
+    from usermgmt.models import RevokedToken
+
+    jti = token.get(jwt_settings.JTI_CLAIM)
+    if not jti:
+        return
+    _purge_denylist()
+    RevokedToken.objects.get_or_create(jti=jti, defaults={
+        'token_type': token.get(jwt_settings.TOKEN_TYPE_CLAIM, ''),
+        'expires_at': datetime.datetime.fromtimestamp(token.get('exp', time.time()), tz=datetime.timezone.utc),
+    })
+    _denylist_changed()
+
+
+def is_token_revoked(token):
+    """令牌是否已被吊销（单个 jti 吊销，或用户此前签发的令牌全部吊销）"""
+    from usermgmt.models import RevokedToken
+
+    denylist = _get_denylist()
+    if token.get('iat', 0) <= denylist['revoked_users'].get(token.get(jwt_settings.USER_ID_CLAIM), 0):
+        return True
+    jti = token.get(jwt_settings.JTI_CLAIM)
+    if token.get(jwt_settings.TOKEN_TYPE_CLAIM) == 'access':
+        return jti in denylist['jti']
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def _mark_users(user_ids, field):
+    from usermgmt.models import UserTokenState
+
+    now = timezone.now()
+    for user_id in user_ids:
+        UserTokenState.objects.update_or_create(user_id=user_id, defaults={field: now})
+    _denylist_changed()
+
+
+def revoke_user_tokens(user_ids):
+    """吊销用户此前签发的全部令牌（删除/停用用户时调用）"""
+    _mark_users(user_ids, 'revoked_at')
+
+
+def mark_token_claims_stale(user_ids=None):
+    """用户名、管理员标志或组变更后调用：此前签发的令牌仍有效，但不再信任其中的声明"""
+    _mark_users([ALL_USERS] if user_ids is None else user_ids, 'claims_stale_at')
+
+
+class ClaimsTokenUser(TokenUser):
+    """
+    由令牌声明构造的轻量用户，不查询数据库；组名来自令牌的 groups 声明
+    """
+    def __init__(self, token):
+        super().__init__(token)
+        setattr(self, USER_GROUPS_ATTR, frozenset(token.get('groups', ())))
+
+
+class FastJWTAuthentication(JWTAuthentication):
+    """
+    JWT 认证快速通道：读请求（GET/HEAD/OPTIONS）直接用令牌声明构造用户，不查询 User 表，
+    适合车间平板高频轮询；写请求仍加载真实 User（视图会把 request.user 写入外键）。
+    令牌没有声明、声明已过期（用户或组变更后）时退回数据库查询；已吊销的令牌直接拒绝。
+    令牌需由 get_tokens_for_user 签发（接口 /api/token/、/api/token/refresh/）。
+    """
+    def authenticate(self, request):
+        self._safe_method = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token, claims_only=None):
+        """
+        :param claims_only: 声明有效时只用声明构造用户、不查库；为 None 时按请求方法决定（读请求为 True）
+        """
+        if claims_only is None:
+            claims_only = getattr(self, '_safe_method', False)
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        issued_at = validated_token.get('iat', 0)
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed(_('令牌已被吊销。'), code='token_revoked')
+        denylist = _get_denylist()
+
+        claims_fresh = (
+            'groups' in validated_token
+            and issued_at > denylist['stale_all']
+            and issued_at > denylist['stale_users'].get(user_id, 0)
+        )
+        if claims_only and claims_fresh:
+            return ClaimsTokenUser(validated_token)
+        return super().get_user(validated_token)
+
+
 def get_tokens_for_user(user):
     """
-    获取用户的 JWT token
+    获取用户的 JWT token，声明中带上用户名、管理员标志和组名，供 FastJWTAuthentication 免查库认证
     """
     refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh['is_staff'] = user.is_staff
+    refresh['is_superuser'] = user.is_superuser
+    refresh['groups'] = sorted(get_user_group_names(user))
 
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
     }
 
+class EventStreamToken(Token):
+    """
+    订阅工单事件流专用的短期令牌（EventSource 不能设置请求头，令牌只能放在 URL 的 ?token= 中，
+    会出现在代理和访问日志里）。令牌类型不是 access，不能用于其他接口；
+    过期后终端重新申请令牌再连接，用 ?last_event_id= 续传
+    """
+    token_type = 'event_stream'
+    lifetime = datetime.timedelta(seconds=getattr(settings, 'EVENT_STREAM_TOKEN_LIFETIME', 60))
+
+
+def get_event_stream_token(user):
+    """签发事件流令牌，声明与 get_tokens_for_user 一致，认证时不查库"""
+    token = EventStreamToken.for_user(user)
+    token['username'] = user.username
+    token['groups'] = sorted(get_user_group_names(user))
+    return token
+
+
 def get_user_from_token(token):
     """
     从 token 获取用户
@@ -0,0 +1,183 @@
+"""
+数据库连接池
+
+每个 gunicorn 工作进程（WSGI 或 ASGI）一个有上限的连接池，由 utils.mysql_pool 数据库后端使用：
+- 请求结束时 Django 关闭连接，实际是把连接放回池中，下一个请求直接复用，省去 TCP 建连和认证；
+- 池中连接总数（使用中 + 空闲）不超过 SIZE，取不到连接时最多等待 TIMEOUT 秒；
+- 连接存活超过 MAX_LIFETIME 秒后不再复用；空闲超过 PING_AFTER 秒的连接取出时先 ping，失败则丢弃重建；
+- fork 出的子进程不会复用父进程的连接。
+连接池统计见 pool_stats()，接口 GET /api/system/db-pool/。
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    """
+    线程安全的有界连接池，与具体数据库驱动无关
+    :param size: 连接总数上限
+    :param max_lifetime: 连接最长存活秒数，0 表示不限
+    :param timeout: 取连接的最长等待秒数
+    :param ping_after: 空闲超过该秒数的连接取出时先检查是否可用
+    """
+
+    def __init__(self, size, max_lifetime=600, timeout=10, ping_after=5):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        self._idle = collections.deque()  # (连接, 创建时间, 放回时间)
+        self._created_at = {}  # id(连接) -> 创建时间
+        self._open = 0
+        self._cond = threading.Condition()
+        self.counters = collections.Counter()
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime and now - created_at >= self.max_lifetime
+
+    def _close(self, conn, reason):
+        with self._cond:
+            self.counters[f'closed_{reason}'] += 1
+        try:
+            conn.close()
+        except Exception as e:
+            logger.debug(f"关闭数据库连接失败: {e}")
+
+    def acquire(self, connect, ping):
+        """
+        取一个连接：优先复用空闲连接（后进先出），未达上限时新建，否则等待
+        :param connect: 新建连接的函数
+        :param ping: 检查连接是否可用的函数，不可用时抛出异常
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            expired = []
+            entry = None
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        conn, created_at, released_at = self._idle.pop()
+                        if self._expired(created_at, now):
+                            self._open -= 1
+                            self._created_at.pop(id(conn), None)
+                            expired.append(conn)
+                            continue
+                        entry = (conn, released_at)
+                        break
+                    if entry is not None or self._open < self.size:
+                        if entry is None:
+                            self._open += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        for conn in expired:
+                            self._close(conn, 'expired')
+                        raise PoolTimeout(f'{self.timeout} 秒内没有空闲的数据库连接（上限 {self.size}）')
+                    self.counters['waits'] += 1
+                    self._cond.wait(remaining)
+            for conn in expired:
+                self._close(conn, 'expired')
+
+            if entry is None:
+                try:
+                    conn = connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(conn)] = time.monotonic()
+                    self.counters['created'] += 1
+                return conn
+
+            conn, released_at = entry
+            if time.monotonic() - released_at >= self.ping_after:
+                try:
+                    ping(conn)
+                except Exception as e:
+                    logger.info(f"丢弃不可用的数据库连接: {e}")
+                    self.discard(conn, 'broken')
+                    continue
+            with self._cond:
+                self.counters['reused'] += 1
+            return conn
+
+    def release(self, conn):
+        """归还连接；超过存活时间或不属于当前进程的连接直接关闭"""
+        now = time.monotonic()
+        with self._cond:
+            created_at = self._created_at.get(id(conn))
+            if created_at is not None and not self._expired(created_at, now) and self.pid == os.getpid():
+                self._idle.append((conn, created_at, now))
+                self._cond.notify()
+                return
+        self.discard(conn, 'expired')
+
+    def discard(self, conn, reason='discarded'):
+        """关闭并移除连接（连接处于事务中或出错时）"""
+        with self._cond:
+            if self._created_at.pop(id(conn), None) is not None:
+                self._open -= 1
+            self._cond.notify()
+        self._close(conn, reason)
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'pid': self.pid,
+                'size': self.size,
+                'max_lifetime': self.max_lifetime,
+                'open': self._open,
+                'idle': idle,
+                'in_use': self._open - idle,
+                **self.counters,
+            }
+
+
+_pools = {}
+# fork 前创建的连接池：子进程不能使用也不能关闭这些连接（会关闭父进程的 socket），保留引用避免被回收
+_inherited = []
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, size, max_lifetime, timeout, ping_after):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is not None and pool.pid != os.getpid():
+            _inherited.append(pool)
+            pool = None
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(size, max_lifetime, timeout, ping_after)
+        return pool
+
+
+def pool_stats():
+    """当前进程各数据库别名的连接池统计"""
+    with _pools_lock:
+        pools = {alias: pool for alias, pool in _pools.items() if pool.pid == os.getpid()}
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats_view(request):
+    """查看处理本请求的工作进程的连接池统计"""
+    return Response(pool_stats())
@@ -0,0 +1,56 @@
+"""
+带连接池的 MySQL 数据库后端（ENGINE = 'utils.mysql_pool'）
+
+在 django.db.backends.mysql 的基础上，新建连接时从 utils.db_pool 的进程级连接池取连接，
+关闭连接时放回池中。连接池参数在 DATABASES[alias]['POOL'] 中配置：
+SIZE（连接上限）、MAX_LIFETIME（连接最长存活秒数）、TIMEOUT（等待秒数）、PING_AFTER（空闲多久后取出时先 ping）。
+配合 CONN_MAX_AGE = 0 使用：每个请求结束都归还连接，连接的复用和寿命由连接池管理。
+"""
+from django.db.backends.mysql.base import Database, DatabaseWrapper as MySQLDatabaseWrapper
+
+from utils.db_pool import PoolTimeout, get_pool
+
+# 连接会话状态（隔离级别等）初始化后在连接对象上做标记，复用时不再重复执行 SET 语句
+_INITIALIZED_ATTR = '_pool_initialized'
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL') or {}
+        return get_pool(
+            self.alias,
+            size=int(options.get('SIZE', 4)),
+            max_lifetime=int(options.get('MAX_LIFETIME', 600)),
+            timeout=float(options.get('TIMEOUT', 10)),
+            ping_after=float(options.get('PING_AFTER', 5)),
+        )
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                lambda conn: conn.ping(),
+            )
+        except PoolTimeout as e:
+            # 转为驱动异常，由 wrap_database_errors 转换为 django.db.OperationalError
+            raise Database.OperationalError(str(e)) from e
+
+    def init_connection_state(self):
+        if getattr(self.connection, _INITIALIZED_ATTR, False):
+            return
+        super().init_connection_state()
+        setattr(self.connection, _INITIALIZED_ATTR, True)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # 事务中关闭或自动提交状态被改动的连接不放回池中，避免把未结束的事务带给下一个请求
+            if self.in_atomic_block or self.autocommit != self.settings_dict['AUTOCOMMIT']:
+                self.pool.discard(self.connection, 'in_transaction')
+            elif self.errors_occurred and not self.is_usable():
+                self.pool.discard(self.connection, 'broken')
+            else:
+                self.pool.release(self.connection)
@@ -0,0 +1,37 @@
+"""
+序列化器通用扩展
+"""
+
+
+def _split_param(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    按查询参数裁剪输出字段：
+    ?fields=a,b   只输出列出的字段
+    ?expand=x,y   只输出列出的嵌套字段（expandable_fields 中未列出的不输出，expand= 为空则全部不输出）
+    两个参数都不传时输出保持不变。视图可用 requested_fields() 判断需要预取哪些关联。
+    """
+    expandable_fields = ()
+
+    @classmethod
+    def requested_fields(cls, request):
+        """根据请求参数返回需要输出的字段名集合"""
+        names = set(cls.Meta.fields)
+        if request is None or request.method != 'GET':
+            return names
+        params = request.query_params
+        if 'fields' in params:
+            names &= _split_param(params['fields'])
+        if 'expand' in params:
+            names -= set(cls.expandable_fields) - _split_param(params['expand'])
+        return names
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = self.requested_fields(self.context.get('request'))
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
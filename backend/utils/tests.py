@@ -0,0 +1,73 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .db_pool import ConnectionPool, PoolTimeout
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """连接池：复用空闲连接，连接总数有上限，过期/不可用/跨进程的连接不复用"""
+
+    class Conn:
+        def __init__(self):
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    def pool(self, **kwargs):
+        options = {'size': 2, 'max_lifetime': 600, 'timeout': 0.05, 'ping_after': 5, **kwargs}
+        return ConnectionPool(**options)
+
+    def ok(self, conn):
+        pass
+
+    def test_reuse_and_limit(self):
+        pool = self.pool()
+        first = pool.acquire(self.Conn, self.ok)
+        second = pool.acquire(self.Conn, self.ok)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.Conn, self.ok)
+
+        # 等待中的请求在其他线程归还连接后取到该连接
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, [second]).start()
+        self.assertIs(pool.acquire(self.Conn, self.ok), second)
+        pool.release(first)
+        pool.release(second)
+        self.assertIs(pool.acquire(self.Conn, self.ok), second)
+        stats = pool.stats()
+        self.assertEqual((stats['open'], stats['idle'], stats['in_use']), (2, 1, 1))
+        self.assertEqual((stats['created'], stats['reused'], stats['timeouts']), (2, 2, 1))
+
+    def test_expired_broken_and_foreign_connections_not_reused(self):
+        pool = self.pool(max_lifetime=60, ping_after=0)
+        conn = pool.acquire(self.Conn, self.ok)
+        with mock.patch('utils.db_pool.time.monotonic', return_value=10 ** 9):
+            pool.release(conn)
+        self.assertTrue(conn.closed)
+
+        conn = pool.acquire(self.Conn, self.ok)
+        pool.release(conn)
+
+        def broken(c):
+            raise OSError('server has gone away')
+        fresh = pool.acquire(self.Conn, broken)
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+
+        # fork 出的子进程不把父进程的连接放回池中
+        pool.pid = -1
+        pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.pool(size=1)
+
+        def refuse():
+            raise OSError('connection refused')
+        with self.assertRaises(OSError):
+            pool.acquire(refuse, self.ok)
+        self.assertIsNotNone(pool.acquire(self.Conn, self.ok))
@@ -1,5 +1,8 @@
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 import os
+import stat
 from django.conf import settings
 from io import BytesIO
 from django.core.files.base import ContentFile
@@ -8,41 +11,18 @@ from django.views.decorators.csrf import csrf_exempt
 import re
 import urllib.parse
 import traceback
+import logging
 
-@csrf_exempt
-def pdf_view(request, path):
-    # 去除多余的drawings/前缀，确保只拼接一次
-    rel_path = path
-    if rel_path.startswith('drawings/'):
-        rel_path = rel_path[len('drawings/'):]
-    file_path = os.path.join(settings.MEDIA_ROOT, 'drawings', rel_path)
-
-    # 记录请求信息，方便调试
-    print(f"PDF查看请求: 原始路径={path}, 处理后路径={file_path}")
-
-    # 检查文件存在性并确保它是一个有效的文件
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        print(f"文件不存在: {file_path}")
-        raise Http404('文件不存在')
+logger = logging.getLogger(__name__)
 
-    # 检查文件是否可读
-    if not os.access(file_path, os.R_OK):
-        print(f"文件不可读: {file_path}")
-        raise Http404('文件不可读')
+# 分块读取大小（字节）
+PDF_CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
-    # 检查文件大小
-    try:
-        file_size = os.path.getsize(file_path)
-        if file_size == 0:
-            print(f"文件为空: {file_path}")
-            raise Http404('文件为空')
-    except Exception as e:
-        print(f"无法访问文件: {file_path}, 错误: {e}")
-        raise Http404(f'无法访问文件: {str(e)}')
 
+def _pdf_display_filename(filename):
     # 解析文件名，从路径中提取，不使用原始文件名
     # 默认名称为 "文档.pdf"，如果能解析出更好的名称则使用解析结果
-    filename = os.path.basename(file_path)
     display_filename = "文档.pdf"
 
     # 尝试从文件名中解析出更有意义的名称
@@ -64,53 +44,166 @@ def pdf_view(request, path):
                 display_filename = f"{code}-{company}-工艺.pdf"
             else:
                 display_filename = f"{code}-{company}-图纸.pdf"
+    return display_filename
+
 
-    # 尝试读取文件的前几个字节，确保它是一个有效的PDF
+def _parse_range(header, file_size):
+    """
+    解析单段 Range 请求头
+    :return: (start, end) 闭区间；None 表示忽略 Range（格式不支持或多段）；'unsatisfiable' 表示范围越界
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N：最后 N 个字节
+        length = int(end)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(file_size - length, 0), file_size - 1
+    start = int(start)
+    end = min(int(end), file_size - 1) if end else file_size - 1
+    if start >= file_size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+
+def _iter_file_range(f, start, length):
     try:
-        with open(file_path, 'rb') as f:
-            header = f.read(5)
-            # PDF文件应该以%PDF-开头
-            if not header.startswith(b'%PDF-'):
-                print(f"无效的PDF文件: {file_path}, 头部: {header}")
-                raise Http404('无效的PDF文件')
-    except Exception as e:
-        print(f"文件读取错误: {file_path}, 错误: {e}")
-        raise Http404(f'文件读取错误: {str(e)}')
-
-    # 创建响应
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(PDF_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+@csrf_exempt
+def pdf_view(request, path):
+    """
+    在线查看图纸PDF：支持 Range 断点/分段读取（206）、ETag/Last-Modified 条件请求（304）；
+    配置 PDF_X_ACCEL_REDIRECT_PREFIX 后由 nginx 通过 X-Accel-Redirect 直接发送文件
+    """
+    # 内容寻址存储的文件（blobs/..）直接按存储路径读取；其余去除多余的drawings/前缀，确保只拼接一次
+    if path.startswith('blobs/'):
+        media_dir, rel_path = 'blobs', path[len('blobs/'):]
+    else:
+        media_dir, rel_path = 'drawings', path
+        if rel_path.startswith('drawings/'):
+            rel_path = rel_path[len('drawings/'):]
+    drawings_root = os.path.join(settings.MEDIA_ROOT, media_dir)
+    file_path = os.path.join(drawings_root, rel_path)
+
+    logger.debug(f"PDF查看请求: 原始路径={path}, 处理后路径={file_path}")
+
+    # 不允许通过 ../ 访问图纸目录以外的文件
+    if not os.path.realpath(file_path).startswith(os.path.realpath(drawings_root) + os.sep):
+        raise Http404('文件不存在')
+
+    filename = os.path.basename(file_path)
+    if media_dir == 'blobs':
+        # 磁盘上是哈希文件名，可读文件名保存在数据库中
+        from basedata.models import StoredBlob
+        filename = StoredBlob.objects.filter(name=f'blobs/{rel_path}').values_list('original_name', flat=True).first() or filename
+    encoded_filename = urllib.parse.quote(_pdf_display_filename(filename))
+    accel_prefix = getattr(settings, 'PDF_X_ACCEL_REDIRECT_PREFIX', '')
+
+    # 只打开一次文件，用 fstat 取得类型、大小和修改时间（文件不存在/不可读时 open 即失败）
+    f = None
     try:
-        file_handle = open(file_path, 'rb')
-        response = FileResponse(file_handle, content_type='application/pdf')
-    except Exception as e:
-        print(f"打开文件失败: {file_path}, 错误: {e}")
-        raise Http404(f'打开文件失败: {str(e)}')
-
-    # URL编码文件名
-    encoded_filename = urllib.parse.quote(display_filename)
-
-    # 设置文件名 (UTF-8编码)，完全符合RFC规范
-    response['Content-Disposition'] = f'inline; filename="{encoded_filename}"; filename*=UTF-8\'\'{encoded_filename}'
-
-    # 清除X-Frame-Options，允许在iframe中显示
-    if 'X-Frame-Options' in response:
-        del response['X-Frame-Options']
-
-    # 添加必要的CORS和缓存控制头
-    response['Access-Control-Allow-Origin'] = '*'
-    response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-    response['Access-Control-Allow-Headers'] = 'Content-Type, Range'
-    response['Accept-Ranges'] = 'bytes'
-
-    # 设置Content-Type头，确保浏览器正确处理
-    response['Content-Type'] = 'application/pdf'
-
-    # 避免缓存问题
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
-
-    print(f"PDF文件成功响应: {file_path}")
-    return response
+        if not accel_prefix:
+            f = open(file_path, 'rb')
+            st = os.fstat(f.fileno())
+        else:
+            st = os.stat(file_path)
+        if not stat.S_ISREG(st.st_mode):
+            raise Http404('文件不存在')
+        if st.st_size == 0:
+            logger.warning(f"文件为空: {file_path}")
+            raise Http404('文件为空')
+        # PDF文件应该以%PDF-开头
+        if f is not None and not f.read(5).startswith(b'%PDF-'):
+            logger.warning(f"无效的PDF文件: {file_path}")
+            raise Http404('无效的PDF文件')
+    except Http404:
+        if f is not None:
+            f.close()
+        raise
+    except OSError as e:
+        if f is not None:
+            f.close()
+        logger.warning(f"无法访问文件: {file_path}, 错误: {e}")
+        raise Http404('文件不存在')
+
+    file_size = st.st_size
+    etag = f'"{st.st_mtime_ns:x}-{file_size:x}"'
+    last_modified = int(st.st_mtime)
+
+    def finish(response):
+        # 设置文件名 (UTF-8编码)，完全符合RFC规范
+        response['Content-Disposition'] = f'inline; filename="{encoded_filename}"; filename*=UTF-8\'\'{encoded_filename}'
+        # 清除X-Frame-Options，允许在iframe中显示
+        if 'X-Frame-Options' in response:
+            del response['X-Frame-Options']
+        # 添加必要的CORS和缓存控制头
+        response['Access-Control-Allow-Origin'] = '*'
+        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        response['Access-Control-Allow-Headers'] = 'Content-Type, Range, If-None-Match, If-Modified-Since'
+        response['Access-Control-Expose-Headers'] = 'Content-Range, Content-Length, ETag'
+        response['Accept-Ranges'] = 'bytes'
+        # 允许缓存但每次校验，文件未变时返回 304，不再重复下载
+        response['Cache-Control'] = 'private, no-cache'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    # 条件请求：ETag/修改时间未变化时返回 304（或 If-Match 不满足时 412）
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        if f is not None:
+            f.close()
+        return finish(conditional)
+
+    if accel_prefix:
+        # 由 nginx 发送文件内容（sendfile 零拷贝，Range 也由 nginx 处理）
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + f'/{media_dir}/' + urllib.parse.quote(rel_path)
+        return finish(response)
+
+    # Range 请求；If-Range 与当前 ETag/修改时间不符时忽略 Range，返回完整文件
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.method == 'GET':
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            byte_range = _parse_range(range_header, file_size)
+
+    if byte_range == 'unsatisfiable':
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{file_size}'
+        return finish(response)
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_file_range(f, start, length), status=206,
+                                         content_type='application/pdf')
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+        return finish(response)
+
+    f.seek(0)
+    response = FileResponse(f, content_type='application/pdf')
+    response['Content-Length'] = str(file_size)
+    return finish(response)
+
 
 def convert_image_to_pdf(file_field, pdf_name):
     """
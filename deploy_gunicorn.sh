@@ -12,8 +12,17 @@ fi
 
 export PYTHONPATH=$(pwd)
 
-# Gunicorn启动参数
-GUNICORN_CMD="nohup gunicorn wsgi:application \
+# 运行模式：wsgi（默认，同步工作进程）或 asgi（uvicorn 工作进程，工单/工序明细轮询接口为 async 视图）
+# 例：SERVER_MODE=asgi ./deploy_gunicorn.sh
+SERVER_MODE=${SERVER_MODE:-wsgi}
+if [ "$SERVER_MODE" = "asgi" ]; then
+  APP_ARGS="asgi:application --worker-class uvicorn.workers.UvicornWorker"
+else
+  APP_ARGS="wsgi:application"
+fi
+
+# Gunicorn启动参数（workers × settings.DB_POOL_SIZE 为数据库连接总数，需小于 MySQL max_connections）
+GUNICORN_CMD="nohup gunicorn $APP_ARGS \
   --bind 127.0.0.1:8900 \
   --workers 4 \
   --timeout 120 \